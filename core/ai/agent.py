@@ -1,15 +1,17 @@
 import asyncio
+import time
 from datetime import timedelta
 from traceback import format_exc
 from typing import Any
 
-import logfire
 from aiobreaker import CircuitBreaker, CircuitBreakerError
 from aiohttp import ClientConnectionError, ClientError
 from core.ai.prompt import Prompt
 from core.ai.provider import LLM_PROVIDER
 from core.logger import get_logger
-from core.schema.ai import AgentDependencies
+from core.metrics import METRICS
+from core.tracing import span
+from core.schema.ai import AgentDependencies, AgentResponse
 from core.schema.ai import LLM
 from core.settings import settings
 from core.bot.message import msg
@@ -17,12 +19,16 @@ from kaioretry import aioretry
 from pydantic_ai import RunContext
 from pydantic_ai.agent import Agent
 
+logger = get_logger(__name__)
 
-logfire.configure(
-    service_name=settings.APP_TITLE, token=settings.model_extra["LOGFIRE_TOKEN"]
+AGENT_CALL_SECONDS = METRICS.histogram(
+    "agent_call_seconds", "Aiko.call latency by outcome", ("outcome",)
+)
+AGENT_IN_FLIGHT = METRICS.gauge("agent_in_flight", "Agent calls in progress")
+AGENT_IN_FLIGHT.set(0)
+POOL_WAIT_SECONDS = METRICS.histogram(
+    "agent_pool_wait_seconds", "Time to get an Aiko instance from the pool"
 )
-logfire.instrument_pydantic_ai()
-logger = get_logger(__name__)
 
 
 class Aiko:
@@ -89,7 +95,7 @@ class Aiko:
             return self.prompt.build_instructions(ctx.deps)
 
     @aioretry(**_ARETRY_CONFIG)
-    async def _run_agent(self, message: str, deps: AgentDependencies) -> str:
+    async def _run_agent(self, message: str, deps: AgentDependencies) -> AgentResponse:
         """Run agent with retry logic."""
         result = await self.agent.run(
             message, deps=deps, message_history=deps.message_history
@@ -101,9 +107,14 @@ class Aiko:
             deps.user_id,
             result.all_messages(),
         )
-        return getattr(result.output, "response", result.output)
+        usage = result.usage()
+        return AgentResponse(
+            text=getattr(result.output, "response", result.output),
+            request_tokens=usage.request_tokens or 0,
+            response_tokens=usage.response_tokens or 0,
+        )
 
-    async def call(self, message: str, deps: AgentDependencies) -> str:
+    async def call(self, message: str, deps: AgentDependencies) -> AgentResponse:
         """
         Call the agent for the given message and dependencies.
 
@@ -112,41 +123,55 @@ class Aiko:
             deps: The dependencies for the agent.
 
         Returns
-            The agent's response.
+            The agent's response with the token usage. On failure the response is
+            the error message and `ok` is False.
         """
-        try:
-            logger.debug(
-                'Running agent for %s (%s). Message: "%s"',
-                deps.username,
-                deps.user_id,
-                message,
-            )
-            return await asyncio.wait_for(
-                self.circuit_breaker.call_async(self._run_agent, message, deps),
-                timeout=settings.AGENT_RESPONSE_TIMEOUT,
-            )
-
-        except TimeoutError:
-            logger.error(
-                "Message processing timed out after %s seconds",
-                settings.AGENT_RESPONSE_TIMEOUT,
-            )
-            return msg.AIKO_ERROR
-        except CircuitBreakerError:
-            logger.error(
-                "Circuit breaker is OPEN for %s (%s). Agent is degraded.",
-                deps.username,
-                deps.user_id,
-            )
-            return msg.AIKO_ERROR
-        except Exception as exc:
-            logger.error(
-                "Message processing failed. %s: %s. Details:\n%s",
-                exc.__class__.__name__,
-                str(exc),
-                format_exc(),
-            )
-            return msg.AIKO_ERROR
+        with span("agent run", user_id=deps.user_id, llm=self.llm.value) as agent_span:
+            outcome = "ok"
+            started = time.perf_counter()
+            AGENT_IN_FLIGHT.inc()
+            try:
+                logger.debug(
+                    'Running agent for %s (%s). Message: "%s"',
+                    deps.username,
+                    deps.user_id,
+                    message,
+                )
+                return await asyncio.wait_for(
+                    self.circuit_breaker.call_async(self._run_agent, message, deps),
+                    timeout=settings.AGENT_RESPONSE_TIMEOUT,
+                )
+
+            except TimeoutError:
+                outcome = "timeout"
+                logger.error(
+                    "Message processing timed out after %s seconds",
+                    settings.AGENT_RESPONSE_TIMEOUT,
+                )
+                return AgentResponse(text=msg.AIKO_ERROR, ok=False)
+            except CircuitBreakerError:
+                outcome = "circuit_open"
+                logger.error(
+                    "Circuit breaker is OPEN for %s (%s). Agent is degraded.",
+                    deps.username,
+                    deps.user_id,
+                )
+                return AgentResponse(text=msg.AIKO_ERROR, ok=False)
+            except Exception as exc:
+                outcome = "error"
+                logger.error(
+                    "Message processing failed. %s: %s. Details:\n%s",
+                    exc.__class__.__name__,
+                    str(exc),
+                    format_exc(),
+                )
+                return AgentResponse(text=msg.AIKO_ERROR, ok=False)
+            finally:
+                AGENT_IN_FLIGHT.dec()
+                AGENT_CALL_SECONDS.observe(
+                    time.perf_counter() - started, outcome=outcome
+                )
+                agent_span.set_attribute("outcome", outcome)
 
 
 class AikoPool:
@@ -160,6 +185,7 @@ class AikoPool:
         pool_size (int): The size of the pool.
         pool (asyncio.Queue): The pool of Aiko instances.
         total_instances (int): The total number of instances in the pool.
+        instances (list[Aiko]): All created instances, idle or in use.
         lock (asyncio.Lock): The lock for the pool.
         timeout (int): The timeout for getting an instance from the pool in seconds.
     """
@@ -172,11 +198,20 @@ class AikoPool:
         self.pool_size = pool_size
         self.pool: asyncio.Queue = asyncio.Queue(maxsize=pool_size)
         self.total_instances = 0
+        self.instances: list[Aiko] = []
         self.lock = asyncio.Lock()
         self.timeout = timeout
 
     async def get_instance(self) -> Aiko:
         """Get Aiko instance from pool."""
+        started = time.perf_counter()
+        try:
+            with span("pool wait"):
+                return await self._get_instance()
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+    async def _get_instance(self) -> Aiko:
         try:
             return self.pool.get_nowait()
         except asyncio.QueueEmpty:
@@ -188,7 +223,9 @@ class AikoPool:
                         self.total_instances,
                         self.pool_size,
                     )
-                    return Aiko()
+                    aiko = Aiko()
+                    self.instances.append(aiko)
+                    return aiko
 
         # Wait for the instance to be released with an optional timeout
         # Early rejection instead of deep queues
@@ -209,3 +246,27 @@ class AikoPool:
 
 
 POOL = AikoPool()
+
+METRICS.gauge(
+    "agent_pool_instances",
+    "Created Aiko instances",
+    callback=lambda: POOL.total_instances,
+)
+METRICS.gauge(
+    "agent_pool_idle_instances",
+    "Idle Aiko instances",
+    callback=lambda: POOL.pool.qsize(),
+)
+METRICS.gauge(
+    "agent_circuit_breaker_instances",
+    "Aiko instances by circuit breaker state",
+    ("state",),
+    callback=lambda: {
+        (state,): sum(
+            1
+            for aiko in POOL.instances
+            if aiko.circuit_breaker.current_state.name.lower() == state
+        )
+        for state in ("closed", "open", "half_open")
+    },
+)
@@ -0,0 +1,215 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from hashlib import blake2b
+
+from core.db.init import get_session
+from core.db.schema import ScoreSubmission
+from core.logger import get_logger
+from core.settings import settings
+from sqlalchemy import select
+
+logger = get_logger(__name__)
+
+BITS = 64
+BANDS = 6  # Bands of 10-11 bits: fingerprints within 5 bits share at least one band
+BAND_WIDTHS = [BITS // BANDS + (band < BITS % BANDS) for band in range(BANDS)]
+BAND_OFFSETS = [sum(BAND_WIDTHS[:band]) for band in range(BANDS)]
+
+# Bit-sliced counting: bit i of a byte is spread to its own 16-bit lane, so one
+# big integer addition per word counts all 64 bits at once (up to 65535 words)
+_LANE_BITS = 16
+_LANE_MASK = (1 << _LANE_BITS) - 1
+_SPREAD = [
+    [
+        sum((value >> bit & 1) << ((byte * 8 + bit) * _LANE_BITS) for bit in range(8))
+        for value in range(256)
+    ]
+    for byte in range(BITS // 8)
+]
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def normalize(text: str) -> list[str]:
+    """Normalize the text to lowercase words without punctuation."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _NON_WORD.sub(" ", text).split()
+
+
+def simhash(words: list[str]) -> int:
+    """
+    Get 64-bit SimHash of the words.
+
+    Every word votes for the bits of its hash, so a few replaced words flip only a
+    few bits of the fingerprint, while unrelated texts differ in ~half of them.
+    """
+    lanes = 0
+    for word in words:
+        h = int.from_bytes(blake2b(word.encode(), digest_size=8).digest(), "big")
+        for byte, spread in enumerate(_SPREAD):
+            lanes += spread[h >> (byte * 8) & 0xFF]
+
+    fingerprint = 0
+    for bit in range(BITS):
+        # Set the bit if most of the words have it set
+        if 2 * (lanes >> (bit * _LANE_BITS) & _LANE_MASK) > len(words):
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def to_signed(fingerprint: int) -> int:
+    """Convert unsigned 64-bit fingerprint to signed (Postgres BIGINT)."""
+    return fingerprint - (1 << BITS) if fingerprint >= 1 << (BITS - 1) else fingerprint
+
+
+def to_unsigned(fingerprint: int) -> int:
+    """Convert signed 64-bit fingerprint (Postgres BIGINT) to unsigned."""
+    return fingerprint + (1 << BITS) if fingerprint < 0 else fingerprint
+
+
+@dataclass(slots=True)
+class Duplicate:
+    """Near-duplicate of a submission."""
+
+    fingerprint: int
+    user_id: int
+    distance: int
+
+
+class EpochDedupIndex:
+    """
+    SimHash index of the epoch submissions with LSH banding.
+
+    A fingerprint is split into 6 bands of 10-11 bits. Two fingerprints within
+    `max_distance` < 6 bits differ in at most 5 bands, so they share at least one
+    band and a lookup checks only the fingerprints in the same band buckets.
+
+    Attributes
+        epoch_id (int): The epoch id.
+        max_distance (int): Max Hamming distance of near-duplicates.
+        buckets (list[dict[int, list[tuple[int, int]]]]): (fingerprint, user id) by band value.
+        size (int): Number of indexed submissions.
+    """
+
+    def __init__(self, epoch_id: int, max_distance: int = settings.DEDUP_MAX_DISTANCE):
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance must be less than {BANDS}")
+
+        self.epoch_id = epoch_id
+        self.max_distance = max_distance
+        self.buckets: list[dict[int, list[tuple[int, int]]]] = [
+            {} for _ in range(BANDS)
+        ]
+        self.size = 0
+
+    @staticmethod
+    def bands(fingerprint: int) -> list[int]:
+        """Split the fingerprint into band values."""
+        return [
+            fingerprint >> offset & ((1 << width) - 1)
+            for offset, width in zip(BAND_OFFSETS, BAND_WIDTHS)
+        ]
+
+    def add(self, fingerprint: int, user_id: int) -> None:
+        """Index the submission fingerprint."""
+        for band, value in enumerate(self.bands(fingerprint)):
+            self.buckets[band].setdefault(value, []).append((fingerprint, user_id))
+        self.size += 1
+
+    def remove(self, fingerprint: int, user_id: int) -> None:
+        """Remove the submission fingerprint, e.g. if it was not scored."""
+        removed = False
+        for band, value in enumerate(self.bands(fingerprint)):
+            bucket = self.buckets[band].get(value)
+            if bucket and (fingerprint, user_id) in bucket:
+                bucket.remove((fingerprint, user_id))
+                if not bucket:
+                    del self.buckets[band][value]
+                removed = True
+        if removed:
+            self.size -= 1
+
+    def find(self, fingerprint: int) -> Duplicate | None:
+        """Find the closest near-duplicate of the fingerprint."""
+        closest = None
+        for band, value in enumerate(self.bands(fingerprint)):
+            for candidate, user_id in self.buckets[band].get(value, ()):
+                distance = (candidate ^ fingerprint).bit_count()
+                if distance <= self.max_distance and (
+                    closest is None or distance < closest.distance
+                ):
+                    closest = Duplicate(candidate, user_id, distance)
+        return closest
+
+
+class DedupIndex:
+    """
+    Near-duplicate detection of user submissions per epoch.
+
+    NOTE: The index is per process. It is rebuilt from the fingerprints stored
+    with the score submissions on startup.
+
+    Attributes
+        epochs (dict[int, EpochDedupIndex]): Indexes by epoch id.
+        min_words (int): Messages with fewer words are not checked (e.g. "hi").
+        keep_epochs (int): Number of recent epochs to keep in memory.
+    """
+
+    def __init__(self, min_words: int = settings.DEDUP_MIN_WORDS, keep_epochs: int = 2):
+        self.epochs: dict[int, EpochDedupIndex] = {}
+        self.min_words = min_words
+        self.keep_epochs = keep_epochs
+
+    def fingerprint(self, message: str) -> int | None:
+        """Get fingerprint of the message, or None if it is too short to check."""
+        words = normalize(message)
+        if len(words) < self.min_words:
+            return None
+        return simhash(words)
+
+    def get(self, epoch_id: int) -> EpochDedupIndex:
+        """Get index of the epoch (empty if there is nothing yet)."""
+        index = self.epochs.get(epoch_id)
+        if index is None:
+            index = self.epochs[epoch_id] = EpochDedupIndex(epoch_id)
+            for old_epoch_id in sorted(self.epochs)[: -self.keep_epochs]:
+                del self.epochs[old_epoch_id]
+        return index
+
+    def find(self, epoch_id: int, fingerprint: int) -> Duplicate | None:
+        """Find a near-duplicate of the fingerprint in the epoch."""
+        return self.get(epoch_id).find(fingerprint)
+
+    def add(self, epoch_id: int, fingerprint: int, user_id: int) -> None:
+        """Index the submission fingerprint in the epoch."""
+        self.get(epoch_id).add(fingerprint, user_id)
+
+    def remove(self, epoch_id: int, fingerprint: int, user_id: int) -> None:
+        """Remove the submission fingerprint from the epoch index."""
+        index = self.epochs.get(epoch_id)
+        if index is not None:
+            index.remove(fingerprint, user_id)
+
+    async def load(self, epoch_id: int) -> EpochDedupIndex:
+        """Rebuild the epoch index from the stored submission fingerprints."""
+        index = EpochDedupIndex(epoch_id)
+
+        async for session in get_session():
+            stmt = select(ScoreSubmission.simhash, ScoreSubmission.user_id).where(
+                ScoreSubmission.epoch_id == epoch_id,
+                ScoreSubmission.simhash.is_not(None),
+            )
+            result = await session.stream(stmt.execution_options(yield_per=10_000))
+
+            async for fingerprint, user_id in result:
+                index.add(to_unsigned(fingerprint), user_id)
+
+        self.epochs[epoch_id] = index
+        logger.info(
+            "Dedup index of epoch %s loaded: %s submission(s)", epoch_id, index.size
+        )
+        return index
+
+
+DEDUP = DedupIndex()
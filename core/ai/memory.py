@@ -0,0 +1,207 @@
+from dataclasses import dataclass, field
+from traceback import format_exc
+from typing import Any
+from uuid import UUID
+
+from aiohttp import ClientConnectionError, ClientError
+from core.ai.prompt import SummarizerPrompt
+from core.ai.provider import LLM_PROVIDER
+from core.ai.retrieval import RETRIEVAL
+from core.db.init import checkpoint
+from core.db.manager import ConversationManager
+from core.db.schema import ConversationMessage
+from core.db.usage import USAGE
+from core.logger import get_logger
+from core.schema.ai import LLM, MessageRole
+from core.settings import settings
+from kaioretry import aioretry
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    UserPromptPart,
+)
+
+logger = get_logger(__name__)
+
+
+def to_model_messages(messages: list[ConversationMessage]) -> list[ModelMessage]:
+    """Convert stored conversation messages (oldest first) to the agent message history."""
+    history: list[ModelMessage] = []
+    for message in messages:
+        if message.role == MessageRole.USER:
+            history.append(
+                ModelRequest(
+                    parts=[
+                        UserPromptPart(
+                            content=message.message, timestamp=message.created_at
+                        )
+                    ]
+                )
+            )
+        elif message.role == MessageRole.AGENT:
+            history.append(
+                ModelResponse(
+                    parts=[TextPart(content=message.message)],
+                    timestamp=message.created_at,
+                )
+            )
+    return history
+
+
+@dataclass
+class ConversationMemory:
+    """Conversation memory sent to the agent with the message."""
+
+    summary: str | None = None
+    message_history: list[ModelMessage] = field(default_factory=list)
+    recalled: list[tuple[str, str]] = field(default_factory=list)
+
+
+async def load_memory(conversation_id: UUID, message: str) -> ConversationMemory:
+    """
+    Load the conversation memory for the agent.
+
+    Parameters
+        conversation_id: The conversation id.
+        message: The user message, to recall the relevant past turns.
+
+    Returns
+        The conversation summary, the recent messages after it and the past turns
+        relevant to the message that are older than the recent messages.
+    """
+    summary, messages = await ConversationManager.get_history(conversation_id)
+    memory = ConversationMemory(summary, to_model_messages(messages))
+
+    if settings.RETRIEVAL_ENABLED:
+        before = messages[0].created_at if messages else None
+        turns = await RETRIEVAL.search(conversation_id, message, before=before)
+        # Texts of the indexed turns are already clipped
+        memory.recalled = [(turn.message, turn.response) for turn in turns]
+
+    return memory
+
+
+class Summarizer:
+    """
+    Rolling summarizer of long conversations.
+
+    Once the messages after the summary take more than the trigger tokens, the
+    older ones are folded into the summary and only the recent ones are sent to
+    the agent verbatim. So the prompt size stays roughly flat as the conversation
+    grows. Runs in the post-response pipeline, off the hot path.
+
+    Attributes
+        llm (LLM): The model writing the summaries.
+        prompt (SummarizerPrompt): The prompt.
+        agent (Agent): The summarizer agent.
+        trigger_tokens (int): Unsummarized tokens that trigger a summary.
+        keep_messages (int): Recent messages left out of the summary.
+        calls (int): Number of written summaries.
+    """
+
+    _ARETRY_CONFIG: dict[str, Any] = {
+        "exceptions": (ClientConnectionError, OSError, ClientError),
+        "tries": 3,  # Max attempts (one attempt + 2 retries)
+        "delay": 1,  # Start with n sec(s) delay
+        "max_delay": 10,  # Max n sec(s) delay
+        "backoff": 2,  # Exponential backoff factor
+        "jitter": (0, 1),  # random jitter to avoid "thundering herd"
+    }
+
+    def __init__(
+        self,
+        llm: LLM = settings.SUMMARIZER_LLM,
+        trigger_tokens: int = settings.SUMMARIZER_TRIGGER_TOKENS,
+        keep_messages: int = settings.SUMMARIZER_KEEP_MESSAGES,
+    ):
+        self.llm = llm
+        self.prompt = SummarizerPrompt()
+        self.agent = Agent(
+            model=LLM_PROVIDER.get_provider(llm),
+            system_prompt=self.prompt.system_prompt,
+        )
+        self.trigger_tokens = trigger_tokens
+        self.keep_messages = keep_messages
+        self.calls = 0
+
+    @staticmethod
+    def format_messages(messages: list[ConversationMessage]) -> str:
+        """Format messages (oldest first) as a transcript."""
+        names = {MessageRole.USER: "User", MessageRole.AGENT: "Aiko"}
+        return "\n".join(
+            f"{names[message.role]}: {message.message}"
+            for message in messages
+            if message.role in names
+        )
+
+    @aioretry(**_ARETRY_CONFIG)
+    async def _run(
+        self, summary: str | None, messages: list[ConversationMessage]
+    ) -> tuple[str, int, int]:
+        result = await self.agent.run(
+            f"Current summary:\n{summary or '(empty)'}\n\n"
+            f"Next messages:\n{self.format_messages(messages)}"
+        )
+        usage = result.usage()
+        return result.output, usage.request_tokens or 0, usage.response_tokens or 0
+
+    async def summarize(
+        self, user_id: int, conversation_id: UUID, epoch_id: int
+    ) -> bool:
+        """
+        Fold older messages of the conversation into its summary if it is too long.
+
+        Parameters
+            user_id: The user id, to meter the token usage.
+            conversation_id: The conversation id.
+            epoch_id: Epoch id of the turn.
+
+        Returns
+            True if the summary was updated.
+        """
+        # NOTE: If a conversation somehow has more unsummarized messages than the
+        # max, the oldest of them are skipped rather than summarized
+        summary, messages = await ConversationManager.get_history(
+            conversation_id,
+            max_messages=settings.SUMMARIZER_MAX_MESSAGES,
+            max_tokens=None,
+        )
+        if len(messages) <= self.keep_messages:
+            return False
+
+        tokens = sum(message.tokens or 0 for message in messages)
+        if (
+            tokens <= self.trigger_tokens
+            and len(messages) < settings.SUMMARIZER_MAX_MESSAGES
+        ):
+            return False
+
+        folded = messages[: -self.keep_messages]
+        # Release the connection of the history read before the LLM call
+        await checkpoint()
+        try:
+            summary, request_tokens, response_tokens = await self._run(summary, folded)
+        except Exception:
+            logger.error(
+                "Error summarizing conversation %s. Details:\n%s",
+                conversation_id,
+                format_exc(),
+            )
+            return False
+
+        USAGE.add(user_id, epoch_id, request_tokens, response_tokens)
+        await ConversationManager.update_summary(
+            conversation_id, summary, until=folded[-1].created_at
+        )
+        self.calls += 1
+
+        logger.debug(
+            "Summarized %s message(s) of conversation %s", len(folded), conversation_id
+        )
+        return True
+
+
+SUMMARIZER = Summarizer()
@@ -55,10 +55,22 @@ class Prompt:
     @staticmethod
     def build_instructions(deps: AgentDependencies, **kwargs) -> str:
         """Build the instructions for the agent."""
-        return (
+        instructions = (
             f"The user's name is {deps.username}.\n"
             f"Current Date and Time is {settings.NOW_DT_UTC()} (UTC).\n\n"
         )
+        if deps.summary:
+            instructions += f"Summary of your earlier conversation with the user:\n{deps.summary}\n\n"
+        if deps.recalled:
+            turns = "\n".join(
+                f'- User: "{message}" Aiko: "{response}"'
+                for message, response in deps.recalled
+            )
+            instructions += (
+                f"Earlier moments of your conversation related to the message:\n"
+                f"{turns}\n\n"
+            )
+        return instructions
 
 
 class SupervisorPrompt:
@@ -104,4 +116,26 @@ class SupervisorPrompt:
             "GRADING RULES:\n"
             "- Always return integers 0–100. Round down if needed; clamp to [0,100].\n"
             "- Keep rationales concrete; reference the evidence.\n"
+            "- Also return confidence from 0 to 1: how sure you are of the score. "
+            "Use lower values for ambiguous, very short or off-topic inputs.\n"
+        )
+
+
+class SummarizerPrompt:
+    """Conversation summarizer prompt."""
+
+    @property
+    def system_prompt(self) -> str:
+        """Build the system prompt for the summarizer."""
+        return (
+            "You keep the memory of Aiko, an AI character who learns what love is "
+            "by talking to a user.\n"
+            "You will be given the current summary of the conversation (may be empty) "
+            "and the next messages of the user and Aiko.\n"
+            "Write an updated summary that keeps:\n"
+            "- facts about the user (name, relationships, events they shared);\n"
+            "- what the user told about love and how Aiko understood it;\n"
+            "- open questions and promises to return to.\n"
+            f"Write in third person, at most {settings.SUMMARIZER_MAX_WORDS} words. "
+            "Return only the summary.\n"
         )
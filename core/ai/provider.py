@@ -27,14 +27,13 @@ class LLMProvider:
         Returns
             Model provider
         """
-        # Check cache
-        provider = Provider(settings.config["llm"][model.value]["provider"])
-
-        if provider in self.provider_cache:
-            return self.provider_cache[provider]
+        # Check cache (one model instance per LLM, not per provider)
+        if model in self.provider_cache:
+            return self.provider_cache[model]
 
-        self.provider_cache[provider] = self.provider_mapping[provider](model)
-        return self.provider_cache[provider]
+        provider = Provider(settings.config["llm"][model.value]["provider"])
+        self.provider_cache[model] = self.provider_mapping[provider](model)
+        return self.provider_cache[model]
 
     def _openai_provider(self, model: LLM) -> OpenAIModel:
         """Create OpenAI model provider."""
@@ -0,0 +1,275 @@
+import asyncio
+import math
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+from zlib import crc32
+
+from core.ai.dedup import normalize
+from core.db.manager import ConversationManager
+from core.db.schema import ConversationMessage
+from core.logger import get_logger
+from core.schema.ai import MessageRole
+from core.settings import settings
+
+logger = get_logger(__name__)
+
+DIM_BITS = 20  # 1M hashed feature buckets, so collisions are rare
+_DIM_MASK = (1 << DIM_BITS) - 1
+
+Vector = dict[int, float]
+
+
+def embed(text: str) -> Vector:
+    """
+    Embed the text as a sparse L2-normalized vector of hashed n-grams.
+
+    Features are words, word bigrams and character trigrams of the longer words
+    (so "loved" and "loving" are still close). Counts are dampened by
+    1 + log(tf), and the top hash bit sets the feature sign, so collisions cancel
+    out on average.
+    """
+    words = normalize(text)
+    features: Counter[str] = Counter(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        if len(word) > 3:
+            padded = f"<{word}>"
+            features.update(f"#{padded[i : i + 3]}" for i in range(len(padded) - 2))
+
+    vector: Vector = {}
+    for feature, count in features.items():
+        h = crc32(feature.encode())
+        weight = 1 + math.log(count)
+        index = h & _DIM_MASK
+        vector[index] = vector.get(index, 0.0) + (-weight if h >> 31 else weight)
+
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    if not norm:
+        return {}
+    return {index: value / norm for index, value in vector.items()}
+
+
+def similarity(a: Vector, b: Vector) -> float:
+    """Cosine similarity of normalized vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+def _clip(text: str, max_chars: int = settings.RETRIEVAL_MAX_CHARS) -> str:
+    return text if len(text) <= max_chars else text[:max_chars] + "…"
+
+
+@dataclass(slots=True)
+class Turn:
+    """
+    Past turn of the conversation.
+
+    Texts are clipped to what is sent to the agent, and the vector is kept as
+    compact arrays of sorted feature indexes and float32 values instead of a
+    dict (about 8 bytes per feature instead of about 100).
+    """
+
+    message: str
+    response: str
+    created_at: datetime
+    indexes: array
+    values: array
+
+    @classmethod
+    def create(cls, message: str, response: str, created_at: datetime) -> "Turn":
+        message, response = _clip(message), _clip(response)
+        vector = embed(f"{message}\n{response}")
+        indexes = sorted(vector)
+        return cls(
+            message,
+            response,
+            created_at,
+            array("I", indexes),
+            array("f", [vector[index] for index in indexes]),
+        )
+
+    def score(self, query: Vector, features: set[int]) -> float:
+        """
+        Cosine similarity with the normalized query vector.
+
+        Parameters
+            query: The query vector.
+            features: Feature indexes of the query (the set intersection with the
+                turn indexes runs in C, only the shared features are looked up).
+        """
+        indexes, values = self.indexes, self.values
+        return sum(
+            query[index] * values[bisect_left(indexes, index)]
+            for index in features.intersection(indexes)
+        )
+
+
+class ConversationIndex:
+    """
+    Retrieval index of the past turns of one conversation.
+
+    Attributes
+        max_turns (int): Max number of indexed turns. The oldest are dropped first.
+        turns (list[Turn]): Indexed turns, oldest first.
+    """
+
+    def __init__(self, max_turns: int = settings.RETRIEVAL_MAX_TURNS):
+        self.max_turns = max_turns
+        self.turns: list[Turn] = []
+
+    def add(self, message: str, response: str, created_at: datetime) -> None:
+        """Index the turn (the user message with Aiko's response)."""
+        self.turns.append(Turn.create(message, response, created_at))
+        if len(self.turns) > self.max_turns:
+            del self.turns[: len(self.turns) - self.max_turns]
+
+    def search(
+        self,
+        query: str,
+        k: int = settings.RETRIEVAL_TOP_K,
+        min_score: float = settings.RETRIEVAL_MIN_SCORE,
+        before: datetime | None = None,
+    ) -> list[tuple[Turn, float]]:
+        """
+        Find the turns most relevant to the query.
+
+        Parameters
+            query: The user message.
+            k: Max number of turns.
+            min_score: Min cosine similarity of a turn.
+            before: Search only turns created before it (e.g. the recent history).
+
+        Returns
+            Turns with their similarity, oldest first.
+        """
+        vector = embed(query)
+        if not vector:
+            return []
+
+        features = set(vector)
+        scored = []
+        # Snapshot: searches run in a worker thread while turns may be added
+        for turn in self.turns.copy():
+            if before is not None and turn.created_at >= before:
+                break
+            score = turn.score(vector, features)
+            if score >= min_score:
+                scored.append((turn, score))
+
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return sorted(scored[:k], key=lambda item: item[0].created_at)
+
+    @classmethod
+    def build(
+        cls, messages: list[ConversationMessage], max_turns: int
+    ) -> "ConversationIndex":
+        """Build the index from the conversation messages (newest first)."""
+        index = cls(max_turns)
+        # Newest first, so a user message is paired with the response before it
+        response = None
+        for message in messages:
+            if message.role == MessageRole.AGENT:
+                response = message.message
+            elif message.role == MessageRole.USER and response is not None:
+                index.add(message.message, response, message.created_at)
+                response = None
+        index.turns.reverse()
+        return index
+
+
+class RetrievalIndex:
+    """
+    Local CPU-only retrieval over the past turns of conversations.
+
+    NOTE: Indexes are per process and kept for the most recently active
+    conversations only, up to `max_turns` turns in total (indexes differ a lot in
+    size, so they are not bounded by count). A missing index is rebuilt from the
+    conversation messages of the current epoch on the next search.
+
+    Attributes
+        max_turns (int): Max number of indexed turns of all conversations.
+        max_turns_per_conversation (int): Max number of indexed turns of one conversation.
+        conversations (OrderedDict[UUID, ConversationIndex]): Indexes by conversation id (LRU).
+        total_turns (int): Number of indexed turns of all conversations.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = settings.RETRIEVAL_CACHE_MAX_TURNS,
+        max_turns_per_conversation: int = settings.RETRIEVAL_MAX_TURNS,
+    ):
+        self.max_turns = max_turns
+        self.max_turns_per_conversation = max_turns_per_conversation
+        self.conversations: OrderedDict[UUID, ConversationIndex] = OrderedDict()
+        self.total_turns = 0
+
+    def _set(self, conversation_id: UUID, index: ConversationIndex) -> None:
+        previous = self.conversations.pop(conversation_id, None)
+        if previous is not None:
+            self.total_turns -= len(previous.turns)
+        self.conversations[conversation_id] = index
+        self.total_turns += len(index.turns)
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop the least recently used indexes over the turn limit."""
+        while self.total_turns > self.max_turns and len(self.conversations) > 1:
+            _, index = self.conversations.popitem(last=False)
+            self.total_turns -= len(index.turns)
+
+    def add(
+        self,
+        conversation_id: UUID,
+        message: str,
+        response: str,
+        created_at: datetime | None = None,
+    ) -> None:
+        """Index the turn if the conversation index is loaded (otherwise it is loaded later)."""
+        index = self.conversations.get(conversation_id)
+        if index is None:
+            return
+
+        turns = len(index.turns)
+        index.add(message, response, created_at or settings.NOW_DT_UTC())
+        self.total_turns += len(index.turns) - turns
+        self._evict()
+
+    async def load(self, conversation_id: UUID) -> ConversationIndex:
+        """Rebuild the conversation index from its messages."""
+        messages = await ConversationManager.get_messages(
+            conversation_id, limit=2 * self.max_turns_per_conversation
+        )
+        # Embedding is CPU-bound, keep it off the event loop
+        index = await asyncio.to_thread(
+            ConversationIndex.build, messages, self.max_turns_per_conversation
+        )
+
+        self._set(conversation_id, index)
+        logger.debug(
+            "Retrieval index of conversation %s loaded: %s turn(s)",
+            conversation_id,
+            len(index.turns),
+        )
+        return index
+
+    async def search(
+        self, conversation_id: UUID, query: str, before: datetime | None = None
+    ) -> list[Turn]:
+        """Find the past turns of the conversation most relevant to the query."""
+        index = self.conversations.get(conversation_id)
+        if index is None:
+            index = await self.load(conversation_id)
+        else:
+            self.conversations.move_to_end(conversation_id)
+
+        # Scoring is CPU-bound (a few ms for hundreds of long turns)
+        scored = await asyncio.to_thread(index.search, query, before=before)
+        return [turn for turn, _ in scored]
+
+
+RETRIEVAL = RetrievalIndex()
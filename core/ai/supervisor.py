@@ -1,28 +1,49 @@
+import time
 from traceback import format_exc
 from typing import Any
 from aiohttp import ClientConnectionError, ClientError
 
 from pydantic_ai import Agent
-from core.ai.prompt import Prompt
+from core.ai.prompt import SupervisorPrompt
 from core.settings import settings
 from core.ai.provider import LLM_PROVIDER
-from core.schema.ai import SupervisorResponseModel
+from core.db.leaderboard import LEADERBOARD
+from core.db.usage import USAGE
+from core.epoch import get_epoch_id
+from core.schema.ai import LLM, SupervisorResponseModel
 from core.logger import get_logger
+from core.metrics import METRICS
+from core.tracing import span
 from kaioretry import aioretry
 
 
 logger = get_logger(__name__)
 
+SUPERVISOR_CALL_SECONDS = METRICS.histogram(
+    "supervisor_call_seconds",
+    "Supervisor latency by model and outcome",
+    ("model", "outcome"),
+)
+
 
 class Supervisor:
     """
     Aiko supervisor.
 
+    Scores every submission by a fast model. Borderline results (low confidence
+    or a score that could get into the leaderboard top) are re-scored by a
+    stronger model.
+
     Attributes
-        llm (LLM): The LLM provider.
-        prompt (Prompt): The prompt.
+        llm (LLM): The fast model scoring every submission.
+        escalation_llm (LLM | None): The strong model re-scoring borderline results.
+        prompt (SupervisorPrompt): The prompt.
         system_prompt (str): The system prompt.
-        agent (Agent): The agent.
+        agent (Agent): The fast agent.
+        escalation_agent (Agent | None): The strong agent.
+        calls (int): Number of scored submissions.
+        escalations (int): Number of submissions re-scored by the strong agent.
+        failures (int): Number of submissions that could not be scored.
     """
 
     _ARETRY_CONFIG: dict[str, Any] = {
@@ -34,27 +55,153 @@ class Supervisor:
         "jitter": (0, 1),  # random jitter to avoid "thundering herd"
     }
 
-    def __init__(self):
+    def __init__(
+        self,
+        llm: LLM = settings.SUPERVISOR_LLM,
+        escalation_llm: LLM | None = settings.SUPERVISOR_ESCALATION_LLM,
+    ):
         """Initialize the supervisor."""
-        self.llm = LLM_PROVIDER.get_provider(settings.AGENT_LLM)
-        self.prompt = Prompt()
+        self.llm = llm
+        self.escalation_llm = escalation_llm if escalation_llm != llm else None
+        self.prompt = SupervisorPrompt()
         self.system_prompt = self.prompt.system_prompt
 
-        self.agent = Agent(
-            model=self.llm,
+        self.agent = self._create_agent(self.llm)
+        self.escalation_agent = (
+            self._create_agent(self.escalation_llm) if self.escalation_llm else None
+        )
+
+        self.calls = 0
+        self.escalations = 0
+        self.failures = 0
+
+    def _create_agent(self, llm: LLM) -> Agent:
+        return Agent(
+            model=LLM_PROVIDER.get_provider(llm),
             system_prompt=self.system_prompt,
             output_type=SupervisorResponseModel,
         )
 
     @aioretry(**_ARETRY_CONFIG)
-    async def call(self, user: str, aiko: str) -> int:
-        """Call supervisor."""
+    async def _run(
+        self, agent: Agent, user: str, aiko: str, user_id: int | None, epoch_id: int
+    ) -> SupervisorResponseModel:
+        outcome = "error"
+        started = time.perf_counter()
         try:
-            result = await self.agent.run(f"User: {user}\nAiko: {aiko}")
-            return result.output.score
+            result = await agent.run(f"User: {user}\nAiko: {aiko}")
+            outcome = "ok"
+        finally:
+            SUPERVISOR_CALL_SECONDS.observe(
+                time.perf_counter() - started,
+                model=agent.model.model_name,
+                outcome=outcome,
+            )
+
+        usage = result.usage()
+        if user_id is not None:
+            USAGE.add(
+                user_id, epoch_id, usage.request_tokens or 0, usage.response_tokens or 0
+            )
+        return result.output
+
+    @staticmethod
+    def is_borderline(
+        result: SupervisorResponseModel, user_id: int | None, epoch_id: int
+    ) -> bool:
+        """Check if the fast score should be re-scored by the strong model."""
+        if result.confidence < settings.SUPERVISOR_ESCALATION_MIN_CONFIDENCE:
+            return True
+        if user_id is None:
+            return False
+
+        margin = settings.SUPERVISOR_ESCALATION_MARGIN
+        board = LEADERBOARD.get(epoch_id)
+
+        # A score that does not beat the user's best can not change the leaderboard
+        if result.score + margin <= board.best.get(user_id, -1):
+            return False
+
+        cutoff = board.cutoff
+        return cutoff is None or result.score + margin >= cutoff
+
+    async def call(
+        self,
+        user: str,
+        aiko: str,
+        user_id: int | None = None,
+        epoch_id: int | None = None,
+    ) -> int | None:
+        """
+        Score the user message and Aiko's reply.
+
+        Parameters
+            user: The user message.
+            aiko: Aiko's reply.
+            user_id: The user id, to escalate scores near the leaderboard cutoff.
+            epoch_id: Epoch id of the submission. Current epoch if not set.
+
+        Returns
+            Score from 0 to 100, or None if scoring failed.
+        """
+        if epoch_id is None:
+            epoch_id = get_epoch_id()
+
+        with span("supervisor", user_id=user_id, epoch_id=epoch_id):
+            return await self._score(user, aiko, user_id, epoch_id)
+
+    async def _score(
+        self, user: str, aiko: str, user_id: int | None, epoch_id: int
+    ) -> int | None:
+        try:
+            result = await self._run(self.agent, user, aiko, user_id, epoch_id)
         except Exception:
+            # No score rather than a 0 counted as a real submission
+            self.failures += 1
             logger.error("Error calling supervisor. Details:\n%s", format_exc())
-            return SupervisorResponseModel(score=0)
+            return None
+
+        self.calls += 1
+        if self.escalation_agent is None or not self.is_borderline(
+            result, user_id, epoch_id
+        ):
+            return result.score
+
+        self.escalations += 1
+        try:
+            escalated = await self._run(
+                self.escalation_agent, user, aiko, user_id, epoch_id
+            )
+        except Exception:
+            # The fast score is still better than no score
+            logger.error(
+                "Error calling escalation supervisor. Details:\n%s", format_exc()
+            )
+            return result.score
+
+        logger.debug(
+            "Supervisor score escalated for user %s: %d (%s) -> %d (%s)",
+            user_id,
+            result.score,
+            self.llm.value,
+            escalated.score,
+            self.escalation_llm.value,
+        )
+        return escalated.score
 
 
 SUPERVISOR = Supervisor()
+
+METRICS.counter(
+    "supervisor_calls_total", "Scored submissions", callback=lambda: SUPERVISOR.calls
+)
+METRICS.counter(
+    "supervisor_escalations_total",
+    "Submissions re-scored by the strong model",
+    callback=lambda: SUPERVISOR.escalations,
+)
+METRICS.counter(
+    "supervisor_failures_total",
+    "Submissions that could not be scored",
+    callback=lambda: SUPERVISOR.failures,
+)
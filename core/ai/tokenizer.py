@@ -0,0 +1,82 @@
+import math
+from traceback import format_exc
+
+from core.logger import get_logger
+from core.schema.ai import LLM
+from core.settings import settings
+
+logger = get_logger(__name__)
+
+# Average characters per token, used when the encoding can not be loaded
+CHARS_PER_TOKEN = 4
+
+
+class Tokenizer:
+    """
+    Local token counter with the encoding of each model from `config.yml`.
+
+    NOTE: tiktoken downloads the encoding files on first use (cached in
+    TIKTOKEN_CACHE_DIR). If an encoding can not be loaded, tokens are estimated
+    by the text length.
+
+    Attributes
+        encodings (dict[str, Encoding | None]): Loaded encodings by name (None if failed).
+    """
+
+    def __init__(self):
+        self.encodings: dict = {}
+
+    @staticmethod
+    def encoding_name(model: LLM) -> str:
+        """Get encoding name of the model."""
+        return settings.config["llm"][model.value].get(
+            "encoding", settings.TOKENIZER_DEFAULT_ENCODING
+        )
+
+    def get_encoding(self, model: LLM):
+        """Get (and load once) the encoding of the model, or None if it is unavailable."""
+        name = self.encoding_name(model)
+        if name not in self.encodings:
+            try:
+                import tiktoken
+
+                self.encodings[name] = tiktoken.get_encoding(name)
+            except Exception:
+                logger.warning(
+                    "Failed to load encoding %s, tokens will be estimated. Details:\n%s",
+                    name,
+                    format_exc(),
+                )
+                self.encodings[name] = None
+        return self.encodings[name]
+
+    def warm_up(self) -> None:
+        """
+        Load the encodings of all configured models.
+
+        Blocking (tiktoken may download the encoding files), so it runs at startup
+        in a worker thread instead of on the first message in the event loop.
+        """
+        for model in LLM:
+            if model.value in settings.config["llm"]:
+                self.get_encoding(model)
+
+    def count(self, text: str, model: LLM = settings.AGENT_LLM) -> int:
+        """
+        Count tokens of the text.
+
+        Parameters
+            text: The text.
+            model: The model whose encoding is used.
+
+        Returns
+            Number of tokens.
+        """
+        encoding = self.get_encoding(model)
+        if encoding is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        # Special tokens in user text are counted as plain text
+        return len(encoding.encode(text, disallowed_special=()))
+
+
+TOKENIZER = Tokenizer()
@@ -1,19 +1,62 @@
+import asyncio
+
+from core.ai.dedup import DEDUP
+from core.ai.tokenizer import TOKENIZER
 from core.bot.command import add_commands
 from core.bot.handler import add_handlers
+from core.bot.pipeline import PIPELINE
 from core.build import build
+from core.db.buffer import MESSAGE_BUFFER
+from core.db.init import ping
+from core.db.leaderboard import LEADERBOARD
+from core.db.partition import PARTITIONS
+from core.db.stats import SCORE_STATS
+from core.db.usage import USAGE
+from core.epoch import get_epoch_id
 from core.logger import get_logger
+from core.metrics import METRICS_SERVER
 from core.settings import settings
 from telegram.ext import Application, ApplicationBuilder
 
 logger = get_logger(__name__)
 
 
+async def post_init(app: Application):
+    """Prepare the application before it starts polling."""
+    if settings.METRICS_ENABLED:
+        METRICS_SERVER.add_check("database", ping)
+        await METRICS_SERVER.start()
+    await add_commands(app)
+    await asyncio.to_thread(TOKENIZER.warm_up)
+    await LEADERBOARD.load(get_epoch_id())
+    await SCORE_STATS.load(get_epoch_id())
+    if settings.DEDUP_ENABLED:
+        await DEDUP.load(get_epoch_id())
+    PARTITIONS.start()
+    SCORE_STATS.start()
+    USAGE.start()
+    METRICS_SERVER.ready = True
+
+
+async def post_shutdown(app: Application):
+    """Finish background work before the application exits."""
+    # Not ready anymore, but still serving the probes while draining
+    METRICS_SERVER.ready = False
+    await PIPELINE.close()
+    await MESSAGE_BUFFER.close()
+    await SCORE_STATS.close()
+    await USAGE.close()
+    await PARTITIONS.close()
+    await METRICS_SERVER.close()
+
+
 def run():
     """Run the application."""
     app: Application = (
         ApplicationBuilder()
         .token(settings.model_extra["TG_BOT_TOKEN"])
-        .post_init(add_commands)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
         .build()
     )
     add_handlers(app)
@@ -1,6 +1,10 @@
 from core.bot.message import msg
 from core.bot.utils import send_message
-from core.bot.wrapper import register_user
+from core.bot.wrapper import admin_required, get_current_user, register_user
+from core.db.leaderboard import LEADERBOARD
+from core.db.manager import ConversationManager, UserManager
+from core.db.stats import SCORE_STATS
+from core.epoch import get_epoch_id
 from core.schema.bot import FAQ
 from core.logger import get_logger
 from core.settings import settings
@@ -8,6 +12,7 @@ from core.schema.bot import Command
 from core.schema.db import UserStatus
 from telegram import BotCommand, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, ContextTypes
+from telegram.helpers import escape_markdown
 
 logger = get_logger(__name__)
 
@@ -20,7 +25,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     logger.debug("User %s (%s) started the bot", username, user_id)
 
-    user_model = context.user_data.get("user_model")
+    user_model = get_current_user()
     if user_model and user_model.status == UserStatus.ACTIVE:
         welcome_msg = msg.CALL
     else:
@@ -39,7 +44,7 @@ async def call(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     logger.debug("User %s (%s) called Aiko", username, user_id)
 
-    user_model = context.user_data.get("user_model")
+    user_model = get_current_user()
     if user_model and user_model.status == UserStatus.ACTIVE:
         welcome_msg = msg.CALL
     else:
@@ -70,10 +75,235 @@ async def faq(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+@register_user
+async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Respond to /leaderboard command."""
+    user_id = update.effective_user.id
+    username = update.effective_user.username
+
+    logger.debug("User %s (%s) called leaderboard", username, user_id)
+
+    epoch_id = get_epoch_id()
+    board = LEADERBOARD.get(epoch_id)
+
+    lines = [msg.LEADERBOARD_TITLE.format(epoch_id=epoch_id), ""]
+    for rank, entry in enumerate(board.get_top(), start=1):
+        lines.append(
+            msg.LEADERBOARD_ROW.format(
+                rank=rank,
+                username=escape_markdown(entry.username or "unknown", version=2),
+                score=entry.best_score,
+            )
+        )
+    if not board.participants:
+        lines.append(msg.LEADERBOARD_EMPTY)
+
+    user_model = get_current_user()
+    rank = board.rank(user_model.id) if user_model else None
+    lines.append("")
+    if rank:
+        lines.append(
+            msg.LEADERBOARD_USER_RANK.format(
+                rank=rank,
+                participants=board.participants,
+                score=board.best[user_model.id],
+            )
+        )
+        if board.participants > 1:
+            lines.append(
+                msg.LEADERBOARD_USER_PERCENTILE.format(
+                    percentile=round(board.percentile(user_model.id))
+                )
+            )
+    else:
+        lines.append(msg.LEADERBOARD_USER_UNRANKED)
+
+    await send_message(update, "\n".join(lines))
+
+
+async def _send_user_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send the next page of the username search kept in user data."""
+    query, after = context.user_data["user_search"]
+    users = await UserManager.find_users_by_username(query, after=after)
+
+    if not users:
+        await send_message(update, msg.USERS_EMPTY)
+        return
+
+    lines = [
+        msg.USERS_ROW.format(
+            username=escape_markdown(user.tg_username or "unknown", version=2),
+            user_id=user.id,
+            tg_id=user.tg_id,
+            status=user.status.name.lower(),
+        )
+        for user, _ in users
+    ]
+
+    reply_markup = None
+    if len(users) == settings.USER_SEARCH_LIMIT:
+        last_user, last_similarity = users[-1]
+        context.user_data["user_search"] = (query, (last_similarity, last_user.id))
+        reply_markup = InlineKeyboardMarkup(
+            [[InlineKeyboardButton(msg.USERS_MORE_BUTTON, callback_data="users_next")]]
+        )
+
+    await send_message(update, "\n".join(lines), reply_markup=reply_markup)
+
+
+@admin_required
+async def users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Respond to /users command (admin): find users by username."""
+    query = " ".join(context.args or [])
+    if not query:
+        await send_message(update, msg.USERS_USAGE)
+        return
+
+    logger.debug("Admin %s searched users: %s", update.effective_user.id, query)
+
+    context.user_data["user_search"] = (query, None)
+    await _send_user_search(update, context)
+
+
+@admin_required
+async def users_next(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the next page button of the username search (admin)."""
+    await update.callback_query.answer()
+    if "user_search" not in context.user_data:
+        return
+    await _send_user_search(update, context)
+
+
+async def _send_message_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send the next page of the message search kept in user data."""
+    query, filters, after = context.user_data["message_search"]
+    messages = await ConversationManager.search_messages(query, after=after, **filters)
+
+    if not messages:
+        await send_message(update, msg.SEARCH_EMPTY)
+        return
+
+    lines = []
+    for message, user_id, _ in messages:
+        text = message.message
+        if len(text) > settings.MESSAGE_SEARCH_PREVIEW_LENGTH:
+            text = text[: settings.MESSAGE_SEARCH_PREVIEW_LENGTH] + "…"
+        lines.append(
+            msg.SEARCH_ROW.format(
+                epoch_id=message.epoch_id,
+                user_id=user_id,
+                role=message.role.value,
+                created_at=escape_markdown(
+                    message.created_at.strftime("%Y-%m-%d %H:%M"), version=2
+                ),
+                message=escape_markdown(text, version=2),
+            )
+        )
+
+    reply_markup = None
+    if len(messages) == settings.MESSAGE_SEARCH_LIMIT:
+        last_message, _, last_rank = messages[-1]
+        context.user_data["message_search"] = (
+            query,
+            filters,
+            (last_rank, last_message.id),
+        )
+        reply_markup = InlineKeyboardMarkup(
+            [
+                [
+                    InlineKeyboardButton(
+                        msg.SEARCH_MORE_BUTTON, callback_data="search_next"
+                    )
+                ]
+            ]
+        )
+
+    await send_message(update, "\n\n".join(lines), reply_markup=reply_markup)
+
+
+@admin_required
+async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Respond to /search command (admin): full-text search over messages."""
+    filters = {}
+    words = []
+    for arg in context.args or []:
+        name, _, value = arg.partition("=")
+        if name in ("epoch", "user") and value.isdigit():
+            filters[f"{name}_id"] = int(value)
+        else:
+            words.append(arg)
+
+    query = " ".join(words)
+    if not query:
+        await send_message(update, msg.SEARCH_USAGE)
+        return
+
+    logger.debug(
+        "Admin %s searched messages: %s %s", update.effective_user.id, query, filters
+    )
+
+    context.user_data["message_search"] = (query, filters, None)
+    await _send_message_search(update, context)
+
+
+@admin_required
+async def search_next(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the next page button of the message search (admin)."""
+    await update.callback_query.answer()
+    if "message_search" not in context.user_data:
+        return
+    await _send_message_search(update, context)
+
+
+@admin_required
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Respond to /stats command (admin): score distribution of the epoch."""
+    epoch_id = get_epoch_id()
+    for arg in context.args or []:
+        name, _, value = arg.partition("=")
+        if name == "epoch" and value.isdigit():
+            epoch_id = int(value)
+
+    logger.debug(
+        "Admin %s called stats of epoch %s", update.effective_user.id, epoch_id
+    )
+
+    submissions = SCORE_STATS.epochs.get(epoch_id)
+    if submissions is None:
+        submissions = await SCORE_STATS.load(epoch_id)
+
+    lines = [
+        msg.STATS_TITLE.format(epoch_id=epoch_id),
+        msg.STATS_ROW.format(
+            name="Submissions",
+            total=submissions.total,
+            p50=submissions.quantile(0.5),
+            p90=submissions.quantile(0.9),
+            p99=submissions.quantile(0.99),
+        ),
+    ]
+
+    # Best scores are kept only for the epochs loaded into the leaderboard
+    board = LEADERBOARD.epochs.get(epoch_id)
+    if board is not None:
+        lines.append(
+            msg.STATS_ROW.format(
+                name="Best scores",
+                total=board.histogram.total,
+                p50=board.histogram.quantile(0.5),
+                p90=board.histogram.quantile(0.9),
+                p99=board.histogram.quantile(0.99),
+            )
+        )
+
+    await send_message(update, "\n".join(lines))
+
+
 async def add_commands(app: Application):
     """Add bot commands menu."""
     commands = [
         BotCommand(Command.CALL.value, Command.CALL.desc),
+        BotCommand(Command.LEADERBOARD.value, Command.LEADERBOARD.desc),
         BotCommand(Command.FAQ.value, Command.FAQ.desc),
     ]
     await app.bot.set_my_commands(commands)
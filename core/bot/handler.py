@@ -1,14 +1,40 @@
 from traceback import format_exc
 from uuid import NAMESPACE_OID, uuid5
 
-from core.bot.command import call, start, faq, FAQ
+from core.bot.command import (
+    call,
+    start,
+    faq,
+    leaderboard,
+    users,
+    users_next,
+    search,
+    search_next,
+    stats,
+    FAQ,
+)
 from core.ai.agent import POOL, AgentDependencies
+from core.schema.ai import AgentResponse
+from core.ai.dedup import DEDUP, to_signed
+from core.ai.memory import SUMMARIZER, load_memory
+from core.ai.retrieval import RETRIEVAL
 from core.ai.supervisor import SUPERVISOR
 from core.bot.message import msg
-from core.bot.wrapper import access_required, typing_action, register_user
-from core.bot.utils import send_message, add_message, answer_callback_query_with_error
-from core.db.manager import ScoreManager, UserManager
+from core.bot.pipeline import PIPELINE
+from core.bot.prefilter import PREFILTER
+from core.bot.wrapper import (
+    access_required,
+    get_current_user,
+    typing_action,
+    register_user,
+)
+from core.bot.utils import send_message, answer_callback_query_with_error
+from core.db.init import checkpoint, unit_of_work
+from core.db.manager import ScoreManager, TurnManager, UserManager
+from core.db.usage import USAGE
+from core.epoch import get_epoch_id
 from core.logger import get_logger
+from core.settings import settings
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
@@ -34,7 +60,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     chat_id = update.effective_chat.id
     message = update.message.text
 
-    user_model = context.user_data.get("user_model")
+    user_model = get_current_user()
     if not user_model:
         logger.error("User model not found in context for user %s", tg_user_id)
         await send_message(update, msg.ERROR)
@@ -51,17 +77,67 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         chat_id,
     )
 
+    # Junk messages are answered locally without a pool slot or provider tokens
+    if settings.PREFILTER_ENABLED:
+        reason = PREFILTER.check(message)
+        if reason is not None:
+            logger.debug(
+                "Message from user %s (user_id=%s) rejected by prefilter: %s",
+                username,
+                user_id,
+                reason.value,
+            )
+            await send_message(update, msg.PREFILTER_REJECTED)
+            return
+
+    # Near-duplicates of a story told in this epoch are not called and scored again
+    epoch_id = get_epoch_id()
+    fingerprint = DEDUP.fingerprint(message) if settings.DEDUP_ENABLED else None
+    if fingerprint is not None:
+        duplicate = DEDUP.find(epoch_id, fingerprint)
+        if duplicate:
+            logger.info(
+                "Near-duplicate message from user %s (user_id=%s) skipped: "
+                "%s bit(s) from a submission of user %s",
+                username,
+                user_id,
+                duplicate.distance,
+                duplicate.user_id,
+            )
+            await send_message(update, msg.DUPLICATE)
+            return
+
+    # Single use: concurrent updates of the user (in this or another process) both
+    # pass the cached access check, but only one of them claims the access
+    if not await UserManager.claim_access(user_id):
+        logger.debug("Access already used by user %s (user_id=%s)", username, user_id)
+        await send_message(
+            update, msg.START.format(token_url=settings.APP_TOKEN_BUY_URL)
+        )
+        return
+    # Committed right away, the row lock is not held during the reply
+    await checkpoint()
+
+    aiko = None
     try:
+        # Conversation summary, recent messages and relevant past turns
+        memory = await load_memory(conversation_id, message)
+        # Not idle in transaction for the whole LLM call
+        await checkpoint()
+
         aiko = await POOL.get_instance()
-        response: str = await aiko.call(
+        response: AgentResponse = await aiko.call(
             message,
             AgentDependencies(
                 user_id=user_id,
                 username=username,
                 conversation_id=conversation_id,
+                message_history=memory.message_history,
+                summary=memory.summary,
+                recalled=memory.recalled,
             ),
         )
-        await send_message(update, response)
+        await send_message(update, response.text)
     except Exception:
         logger.error(
             "Error handling message from user %s (tg_id=%s, user_id=%s). Details: %s",
@@ -71,14 +147,76 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             format_exc(),
         )
         await send_message(update, msg.ERROR)
+        # The access is given back for the reply the user did not get
+        async with unit_of_work(new=True):
+            await UserManager.release_access(user_id)
     else:
-        await UserManager.revoke_access(user_id)
-        await add_message(user_id, conversation_id, message, response)
+        if response.request_tokens or response.response_tokens:
+            USAGE.add(
+                user_id, epoch_id, response.request_tokens, response.response_tokens
+            )
+        # A failed agent run is neither a submission nor worth scoring
+        if fingerprint is not None and response.ok:
+            DEDUP.add(epoch_id, fingerprint, user_id)
+        if settings.RETRIEVAL_ENABLED and response.ok:
+            RETRIEVAL.add(conversation_id, message, response.text)
 
-        score: int = await SUPERVISOR.call(message, response)
-        await ScoreManager.update_score(user_id, score)
+        # Side effects run after the user already has the reply
+        await PIPELINE.submit(
+            TurnManager.commit_turn(
+                user_id,
+                conversation_id,
+                message,
+                response.text,
+            ),
+            name="commit_turn",
+            key=conversation_id,
+        )
+        if settings.SUMMARIZER_ENABLED:
+            # Same key, so it runs after the turn is committed
+            await PIPELINE.submit(
+                SUMMARIZER.summarize(user_id, conversation_id, epoch_id),
+                name="summarize",
+                key=conversation_id,
+            )
+        if response.ok:
+            await PIPELINE.submit(
+                score_message(
+                    user_id, username, message, response.text, epoch_id, fingerprint
+                ),
+                name="score",
+                key=("score", user_id),
+            )
     finally:
-        await POOL.return_instance(aiko)
+        if aiko is not None:
+            await POOL.return_instance(aiko)
+
+
+async def score_message(
+    user_id: int,
+    username: str,
+    message: str,
+    response: str,
+    epoch_id: int,
+    fingerprint: int | None = None,
+) -> None:
+    """Score the user message and Aiko's response by the supervisor."""
+    score = await SUPERVISOR.call(message, response, user_id, epoch_id)
+    if score is None:
+        # Not a submission: the story can be sent again
+        if fingerprint is not None:
+            DEDUP.remove(epoch_id, fingerprint, user_id)
+        logger.warning(
+            "Submission of user %s (user_id=%s) was not scored", username, user_id
+        )
+        return
+    await ScoreManager.update_score(
+        user_id,
+        score,
+        epoch_id=epoch_id,
+        username=username,
+        simhash=to_signed(fingerprint) if fingerprint is not None else None,
+    )
 
 
 @register_user
@@ -150,8 +288,14 @@ def add_handlers(app: Application):
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("call", call))
     app.add_handler(CommandHandler("faq", faq))
+    app.add_handler(CommandHandler("leaderboard", leaderboard))
+    app.add_handler(CommandHandler("users", users))
+    app.add_handler(CommandHandler("search", search))
+    app.add_handler(CommandHandler("stats", stats))
 
     app.add_handler(CallbackQueryHandler(handler_faq_callback, pattern="^faq_"))
+    app.add_handler(CallbackQueryHandler(users_next, pattern="^users_next$"))
+    app.add_handler(CallbackQueryHandler(search_next, pattern="^search_next$"))
     app.add_handler(
         MessageHandler(
             (filters.TEXT | filters.VOICE | filters.AUDIO) & ~filters.COMMAND,
@@ -10,10 +10,41 @@ class Messages:
     FAQ_TITLE = "💡 *FAQ*. Select the question ↓"
     FAQ_BACK_BUTTON = "← Back to questions"
 
+    # LEADERBOARD
+    LEADERBOARD_TITLE = "🏆 *Epoch {epoch_id} leaderboard*"
+    LEADERBOARD_ROW = "{rank}\\. `{username}` — {score}"
+    LEADERBOARD_EMPTY = "No scores yet\\. Be the first to share your story with Aiko 💫"
+    LEADERBOARD_USER_RANK = (
+        "Your rank: *{rank}* of {participants} \\(best score: {score}\\)"
+    )
+    LEADERBOARD_USER_UNRANKED = "You have no score in this epoch yet\\."
+    LEADERBOARD_USER_PERCENTILE = "Better than {percentile}% of participants"
+
+    # ADMIN
+    USERS_USAGE = "Usage: `/users <username>`"
+    USERS_ROW = "`{username}` — id {user_id}, tg {tg_id}, {status}"
+    USERS_EMPTY = "No users found\\."
+    USERS_MORE_BUTTON = "More →"
+    SEARCH_USAGE = 'Usage: `/search [epoch=N] [user=ID] <words or "phrase">`'
+    SEARCH_ROW = "*E{epoch_id}* user {user_id}, {role}, {created_at}\n{message}"
+    SEARCH_EMPTY = "No messages found\\."
+    SEARCH_MORE_BUTTON = "More →"
+    STATS_TITLE = "📊 *Epoch {epoch_id} score distribution*"
+    STATS_ROW = "{name}: {total}, p50 {p50}, p90 {p90}, p99 {p99}"
+
+    # QUOTA
+    QUOTA_SOFT = "Let's take a short breath 💭 You can write to me again in a minute\\."
+    QUOTA_HARD = "We've talked so much this epoch\\! Let's continue in the next one 💫"
+    SLOW_DOWN = "You're writing too fast for me 🌸 Please slow down a little\\."
+
     # SYSTEM
     ERROR = "An system error occurred while processing your request\\. Please try again later\\.\\.\\."
 
     # AIKO
+    PREFILTER_REJECTED = (
+        "Hmm\\.\\.\\. I didn't quite catch that\\. Could you tell me a bit more\\?"
+    )
+    DUPLICATE = "I've already heard this story\\.\\.\\. Tell me something new 💭"
     AIKO_ERROR = "I got a little tangled in my thoughts\\.\\.\\.\nCould you please call me again in a few minutes\\?"
 
 
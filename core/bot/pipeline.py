@@ -0,0 +1,194 @@
+import asyncio
+from collections.abc import Coroutine, Hashable
+from traceback import format_exc
+from typing import Any
+
+from core.db.init import unit_of_work
+from core.logger import get_logger
+from core.metrics import METRICS
+from core.settings import settings
+
+logger = get_logger(__name__)
+
+
+class PostResponsePipeline:
+    """
+    Post-response stage for side effects that run after the reply is sent.
+
+    Handlers submit side effects (DB writes, scoring, etc.) as tasks and return
+    right away. Each task runs in its own database unit of work. Tasks with
+    different keys run concurrently up to the concurrency limit. Tasks with the
+    same key run in submission order, so e.g. messages of one conversation are
+    still persisted in the order they were sent.
+
+    The number of unfinished tasks is bounded too: once `max_pending` tasks are
+    waiting, `submit` waits for one of them to finish. The handler keeps its
+    agent slot meanwhile, so replies slow down to the pace of the side effects
+    instead of queueing them (and their texts) in memory without limit.
+
+    Attributes
+        concurrency (int): Max number of tasks running at the same time.
+        max_pending (int): Max number of submitted tasks that are not finished yet.
+        timeout (int): Timeout for a single task in seconds.
+        semaphore (asyncio.Semaphore): Semaphore bounding the parallelism.
+        tasks (set[asyncio.Task]): Submitted tasks that are not finished yet.
+        tails (dict[Hashable, asyncio.Task]): Last submitted task for each key.
+        completed (int): Number of successfully completed tasks.
+        failures (int): Number of failed tasks.
+        throttled (int): Number of submissions that waited for a free place.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = settings.PIPELINE_CONCURRENCY,
+        max_pending: int = settings.PIPELINE_MAX_PENDING,
+        timeout: int = settings.PIPELINE_TASK_TIMEOUT,
+    ):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.tasks: set[asyncio.Task] = set()
+        self.tails: dict[Hashable, asyncio.Task] = {}
+        self.completed = 0
+        self.failures = 0
+        self.throttled = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of submitted tasks that are not finished yet."""
+        return len(self.tasks)
+
+    async def submit(
+        self, coro: Coroutine[Any, Any, Any], name: str, key: Hashable | None = None
+    ) -> asyncio.Task:
+        """
+        Submit a side effect to the pipeline.
+
+        Waits while `max_pending` tasks are not finished yet (backpressure).
+
+        Parameters
+            coro: The coroutine to run.
+            name: Task name used in logs.
+            key: Optional ordering key. Tasks with the same key run one after another.
+
+        Returns
+            The scheduled task.
+        """
+        if len(self.tasks) >= self.max_pending:
+            self.throttled += 1
+            logger.warning(
+                "Post-response pipeline is full (%s task(s)), %s waits",
+                len(self.tasks),
+                name,
+            )
+            try:
+                while len(self.tasks) >= self.max_pending:
+                    await asyncio.wait(
+                        set(self.tasks), return_when=asyncio.FIRST_COMPLETED
+                    )
+            except asyncio.CancelledError:
+                coro.close()
+                raise
+
+        previous = self.tails.get(key) if key is not None else None
+        task = asyncio.create_task(self._run(coro, name, previous), name=name)
+
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+        if key is not None:
+            self.tails[key] = task
+            task.add_done_callback(lambda t: self._release_key(key, t))
+
+        return task
+
+    def _release_key(self, key: Hashable, task: asyncio.Task) -> None:
+        """Forget the key once its last submitted task is finished."""
+        if self.tails.get(key) is task:
+            del self.tails[key]
+
+    async def _run(
+        self,
+        coro: Coroutine[Any, Any, Any],
+        name: str,
+        previous: asyncio.Task | None,
+    ) -> None:
+        """Run the task after the previous task with the same key is finished."""
+        started = False
+        try:
+            if previous is not None:
+                # Wait without propagating failures of the previous task
+                await asyncio.wait([previous])
+
+            async with self.semaphore:
+                started = True
+                # The request-scoped session is closed by now, so start a new one
+                async with unit_of_work(new=True):
+                    await asyncio.wait_for(coro, timeout=self.timeout)
+
+            self.completed += 1
+        except asyncio.CancelledError:
+            if not started:
+                coro.close()
+            raise
+        except TimeoutError:
+            self.failures += 1
+            logger.error(
+                "Post-response task %s timed out after %s seconds", name, self.timeout
+            )
+        except Exception as exc:
+            self.failures += 1
+            logger.error(
+                "Post-response task %s failed. %s: %s. Details:\n%s",
+                name,
+                exc.__class__.__name__,
+                str(exc),
+                format_exc(),
+            )
+
+    async def close(self, timeout: int = settings.PIPELINE_SHUTDOWN_TIMEOUT) -> None:
+        """Wait for pending tasks and cancel the ones that did not finish in time."""
+        if not self.tasks:
+            return
+
+        logger.info("Draining %s post-response task(s)...", len(self.tasks))
+        _, not_done = await asyncio.wait(set(self.tasks), timeout=timeout)
+
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            logger.warning(
+                "Cancelled %s post-response task(s) on shutdown", len(not_done)
+            )
+            await asyncio.gather(*not_done, return_exceptions=True)
+
+        logger.info(
+            "Post-response pipeline closed. Completed: %s. Failed: %s",
+            self.completed,
+            self.failures,
+        )
+
+
+PIPELINE = PostResponsePipeline()
+
+METRICS.gauge(
+    "pipeline_pending_tasks",
+    "Post-response tasks not finished yet",
+    callback=lambda: PIPELINE.pending,
+)
+METRICS.counter(
+    "pipeline_completed_total",
+    "Completed post-response tasks",
+    callback=lambda: PIPELINE.completed,
+)
+METRICS.counter(
+    "pipeline_failures_total",
+    "Failed post-response tasks",
+    callback=lambda: PIPELINE.failures,
+)
+METRICS.counter(
+    "pipeline_throttled_total",
+    "Post-response submissions that waited for a free place",
+    callback=lambda: PIPELINE.throttled,
+)
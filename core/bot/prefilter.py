@@ -0,0 +1,217 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+
+from core.logger import get_logger
+from core.metrics import METRICS
+from core.schema.bot import FilterReason
+from core.settings import settings
+
+logger = get_logger(__name__)
+
+_REPEATED = re.compile(r"(\S)\1{2,}")  # Runs of 3+ identical characters
+_VOWELS = frozenset("aeiouyаеёиоуыэюя")
+_ALPHABETIC_SCRIPTS = frozenset(("LATIN", "CYRILLIC"))
+
+
+@lru_cache(maxsize=4096)
+def get_script(char: str) -> str:
+    """Get Unicode script of the letter by its name, e.g. LATIN or CYRILLIC."""
+    name = unicodedata.name(char, "")
+    return name.split(" ", 1)[0] if name else "UNKNOWN"
+
+
+@dataclass(slots=True)
+class MessageFeatures:
+    """
+    Features of a message computed in one pass and shared by all checks.
+
+    Attributes
+        chars (int): Number of non-space characters.
+        letters (int): Number of letters.
+        entropy (float): Shannon entropy of non-space characters in bits.
+        repeated (int): Number of characters in runs of 3+ identical characters.
+        scripts (Counter[str]): Number of letters by script.
+        words (list[str]): Lowercase words.
+    """
+
+    chars: int
+    letters: int
+    entropy: float
+    repeated: int
+    scripts: Counter[str]
+    words: list[str]
+
+    @classmethod
+    def from_text(cls, text: str) -> "MessageFeatures":
+        """Compute features of the text."""
+        counts = Counter(text)
+        for space in (" ", "\n", "\t"):
+            counts.pop(space, None)
+        chars = sum(counts.values())
+
+        scripts: Counter[str] = Counter()
+        for char, count in counts.items():
+            if char.isalpha():
+                scripts[get_script(char)] += count
+
+        entropy = 0.0
+        for count in counts.values():
+            p = count / chars
+            entropy -= p * math.log2(p)
+
+        return cls(
+            chars=chars,
+            letters=sum(scripts.values()),
+            entropy=entropy,
+            repeated=sum(len(match.group()) for match in _REPEATED.finditer(text)),
+            scripts=scripts,
+            words=text.lower().split(),
+        )
+
+
+Check = Callable[[MessageFeatures], FilterReason | None]
+
+
+def check_letters(features: MessageFeatures) -> FilterReason | None:
+    """Reject messages made mostly of emoji, digits or symbols."""
+    if features.letters < settings.PREFILTER_MIN_LETTER_RATIO * features.chars:
+        return FilterReason.NO_LETTERS
+    return None
+
+
+def check_length(features: MessageFeatures) -> FilterReason | None:
+    """Reject one-word messages like "ok" or "?"."""
+    if features.letters < settings.PREFILTER_MIN_LETTERS:
+        return FilterReason.TOO_SHORT
+    return None
+
+
+def check_repeated_chars(features: MessageFeatures) -> FilterReason | None:
+    """Reject messages made mostly of repeated characters ("aaaaaa!!!!!")."""
+    if features.repeated > settings.PREFILTER_MAX_REPEATED_RATIO * features.chars:
+        return FilterReason.REPEATED_CHARS
+    return None
+
+
+def check_entropy(features: MessageFeatures) -> FilterReason | None:
+    """Reject long messages with too few distinct characters ("hahahahaha")."""
+    if (
+        features.chars >= settings.PREFILTER_ENTROPY_MIN_CHARS
+        and features.entropy < settings.PREFILTER_MIN_ENTROPY
+    ):
+        return FilterReason.LOW_ENTROPY
+    return None
+
+
+def check_script(features: MessageFeatures) -> FilterReason | None:
+    """Reject messages written mostly in scripts Aiko does not speak."""
+    if not settings.PREFILTER_SCRIPTS or not features.scripts:
+        return None
+
+    script, _ = features.scripts.most_common(1)[0]
+    if script not in settings.PREFILTER_SCRIPTS:
+        return FilterReason.UNSUPPORTED_SCRIPT
+    return None
+
+
+def check_junk(features: MessageFeatures) -> FilterReason | None:
+    """
+    Reject keyboard mashing and copy-pasted word spam by a tiny logistic model.
+
+    Features: share of alphabetic words without vowels ("sdfghj"), share of
+    repeated words ("buy buy buy") and share of very long words. The weights are
+    set by hand, so the model only catches obvious junk.
+    """
+    words = features.words
+    if len(words) < 3:
+        return None
+
+    alphabetic = [
+        word
+        for word in words
+        if word.isalpha() and get_script(word[0]) in _ALPHABETIC_SCRIPTS
+    ]
+    no_vowels = (
+        sum(1 for word in alphabetic if _VOWELS.isdisjoint(word)) / len(alphabetic)
+        if alphabetic
+        else 0.0
+    )
+    repeated_words = 1 - len(set(words)) / len(words)
+    long_words = sum(1 for word in words if len(word) > 20) / len(words)
+
+    z = -6.0 + 9.0 * no_vowels + 6.0 * repeated_words + 5.0 * long_words
+    if 1 / (1 + math.exp(-z)) >= settings.PREFILTER_JUNK_THRESHOLD:
+        return FilterReason.JUNK
+    return None
+
+
+class Prefilter:
+    """
+    Cheap local checks run before a message reaches the agent pool.
+
+    Checks run in order, cheapest first, and the first rejection wins. New checks
+    are plugged in with `register`.
+
+    Attributes
+        checks (list[Check]): Checks of the message features.
+        checked (int): Number of checked messages.
+        rejected (Counter[FilterReason]): Number of rejected messages by reason.
+    """
+
+    def __init__(self, checks: list[Check] | None = None):
+        self.checks: list[Check] = list(checks or [])
+        self.checked = 0
+        self.rejected: Counter[FilterReason] = Counter()
+
+    def register(self, check: Check) -> Check:
+        """Add the check (can be used as a decorator)."""
+        self.checks.append(check)
+        return check
+
+    def check(self, text: str) -> FilterReason | None:
+        """
+        Check the message.
+
+        Returns
+            Reason to reject the message, or None if it passed all checks.
+        """
+        self.checked += 1
+        features = MessageFeatures.from_text(text)
+
+        for check in self.checks:
+            reason = check(features)
+            if reason is not None:
+                self.rejected[reason] += 1
+                return reason
+        return None
+
+
+PREFILTER = Prefilter(
+    [
+        check_letters,
+        check_length,
+        check_repeated_chars,
+        check_entropy,
+        check_script,
+        check_junk,
+    ]
+)
+
+METRICS.counter(
+    "prefilter_checked_total",
+    "Messages checked by the prefilter",
+    callback=lambda: PREFILTER.checked,
+)
+METRICS.counter(
+    "prefilter_rejected_total",
+    "Messages rejected by the prefilter by reason",
+    ("reason",),
+    callback=lambda: {
+        (reason.value,): count for reason, count in PREFILTER.rejected.items()
+    },
+)
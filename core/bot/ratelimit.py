@@ -0,0 +1,155 @@
+import time
+from typing import Protocol
+
+from core.db.cache import TTLCache
+from core.db.init import commit, get_session
+from core.db.schema import RateLimit
+from core.logger import get_logger
+from core.schema.db import RateLimitBackend
+from core.settings import settings
+from sqlalchemy import func, literal
+from sqlalchemy.dialects.postgresql import insert
+
+logger = get_logger(__name__)
+
+
+class Backend(Protocol):
+    """Storage of the token buckets."""
+
+    async def acquire(self, key: int) -> bool:
+        """Take a token from the bucket of the key if there is one."""
+        ...
+
+
+class MemoryBackend:
+    """
+    Token buckets kept in the process memory.
+
+    A bucket left alone for `capacity / rate` seconds is full again, so it simply
+    expires from the cache after that time.
+
+    Attributes
+        capacity (int): Max number of tokens in a bucket (burst of requests).
+        rate (float): Tokens added to a bucket per second.
+        buckets (TTLCache): (tokens, updated at) by key.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        rate: float,
+        maxsize: int = settings.RATE_LIMIT_CACHE_MAX_SIZE,
+    ):
+        self.capacity = capacity
+        self.rate = rate
+        self.buckets = TTLCache(maxsize=maxsize, ttl=capacity / rate)
+
+    async def acquire(self, key: int) -> bool:
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+
+        if bucket is None:
+            tokens = float(self.capacity)
+        else:
+            tokens, updated_at = bucket
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+        if tokens < 1:
+            return False
+
+        self.buckets.set(key, (tokens - 1, now))
+        return True
+
+
+class PostgresBackend:
+    """
+    Token buckets shared by all bot processes in the `rate_limits` table.
+
+    One atomic upsert refills the bucket, takes a token and tells whether it was
+    taken, so concurrent requests of the same user cannot overdraw the bucket.
+
+    Attributes
+        capacity (int): Max number of tokens in a bucket (burst of requests).
+        rate (float): Tokens added to a bucket per second.
+    """
+
+    def __init__(self, capacity: int, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+
+    async def acquire(self, key: int) -> bool:
+        # Wall clock time, not the transaction start time (now())
+        now = func.clock_timestamp()
+        elapsed = func.extract("epoch", now - RateLimit.updated_at)
+        tokens = func.least(
+            literal(float(self.capacity)), RateLimit.tokens + elapsed * self.rate
+        )
+
+        stmt = insert(RateLimit).values(
+            tg_id=key, tokens=float(self.capacity - 1), updated_at=now
+        )
+        # The row is left as is when the bucket is empty, so nothing is returned
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RateLimit.tg_id],
+            set_={"tokens": tokens - 1, "updated_at": now},
+            where=tokens >= 1,
+        ).returning(RateLimit.tg_id)
+
+        async for session in get_session():
+            result = await session.execute(stmt)
+            acquired = result.scalar_one_or_none() is not None
+            await commit(session)
+            return acquired
+
+
+class RateLimiter:
+    """
+    Per-user request rate limiter (token bucket).
+
+    A user can send `capacity` requests at once and then `rate` requests per
+    second in the long run.
+
+    NOTE: The check must run outside the update's unit of work with the Postgres
+    backend, otherwise the bucket row stays locked until the update is handled.
+
+    Attributes
+        backend (Backend): Storage of the token buckets.
+        notified (TTLCache): Users recently told to slow down.
+    """
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self.notified = TTLCache(
+            maxsize=settings.RATE_LIMIT_CACHE_MAX_SIZE,
+            ttl=settings.RATE_LIMIT_NOTIFY_INTERVAL,
+        )
+
+    async def allow(self, tg_id: int) -> bool:
+        """Check if the user can make one more request."""
+        return await self.backend.acquire(tg_id)
+
+    def should_notify(self, tg_id: int) -> bool:
+        """
+        Check if the user should be told to slow down.
+
+        A flooding user gets one reply per notify interval, so the replies do not
+        hit the Telegram limits themselves.
+        """
+        if self.notified.get(tg_id):
+            return False
+        self.notified.set(tg_id, True)
+        return True
+
+
+def create_backend(
+    backend: RateLimitBackend = settings.RATE_LIMIT_BACKEND,
+    capacity: int = settings.RATE_LIMIT_CAPACITY,
+    rate: float = settings.RATE_LIMIT_REFILL_RATE,
+) -> Backend:
+    """Create the rate limiter backend."""
+    if backend == RateLimitBackend.POSTGRES:
+        return PostgresBackend(capacity, rate)
+    return MemoryBackend(capacity, rate)
+
+
+RATE_LIMITER = RateLimiter(create_backend())
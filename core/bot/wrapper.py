@@ -1,18 +1,25 @@
 import asyncio
 from traceback import format_exc
 from collections.abc import Callable
+from contextvars import ContextVar
 from functools import wraps
 
 from core.bot.message import msg
+from core.bot.ratelimit import RATE_LIMITER
 from core.bot.utils import send_message
-from core.db.init import get_session
-from core.schema.db import UserStatus
-from core.db.schema import User
+from core.db.cache import USER_CACHE, UserState
+from core.db.init import checkpoint, unit_of_work
+from core.db.manager import UserManager
+from core.db.usage import USAGE
+from core.epoch import get_epoch_id
+from core.schema.db import QuotaStatus, UserStatus
 from core.logger import get_logger
 from core.schema.bot import ChatAction
 from telegram import Update
 from telegram.ext import ContextTypes
 from core.settings import settings
+from core.profiler import PROFILER
+from core.tracing import span, traced
 
 logger = get_logger(__name__)
 
@@ -93,47 +100,95 @@ class TypingIndicator:
         return TypingIndicator.chat_action()(func)
 
 
+# Compact state of the user whose update is being handled
+CURRENT_USER: ContextVar[UserState | None] = ContextVar("current_user", default=None)
+
+
+def get_current_user() -> UserState | None:
+    """Get the user of the update being handled (set by the access decorators)."""
+    return CURRENT_USER.get()
+
+
+def trace_update(func: Callable) -> Callable:
+    """Run the update handler in the root span of the update trace (and profile it)."""
+
+    @wraps(func)
+    async def wrapper(
+        update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs
+    ):
+        with (
+            span(
+                "telegram update {handler}",
+                handler=func.__name__,
+                update_id=update.update_id,
+                tg_id=update.effective_user.id if update.effective_user else None,
+            ),
+            PROFILER.profile(func.__name__, update.update_id),
+        ):
+            return await func(update, context, *args, **kwargs)
+
+    return wrapper
+
+
 class AccessControl:
     """Access control for users to the bot."""
 
     @staticmethod
-    async def get_or_create_user(tg_id: int, tg_username: str | None = None) -> User:
-        """Get or create user."""
-        async for session in get_session():
-            # Try to find existing user
-            from sqlalchemy import select
-
-            stmt = select(User).where(User.tg_id == tg_id)
-            result = await session.execute(stmt)
-            user = result.scalar_one_or_none()
-
-            if user:
-                # Update username if changed
-                if user.tg_username != tg_username:
-                    user.tg_username = tg_username
-                    await session.commit()
-                    logger.debug("Updated username for user %s: %s", tg_id, tg_username)
-
-                return user
-
-            # Create new user with default subscription
-            user = User(tg_id=tg_id, tg_username=tg_username)
-            session.add(user)
-            await session.commit()
-            await session.refresh(user)
-
-            logger.info(
-                "Created new user %s (%s) with inactive status", tg_id, tg_username
-            )
+    @traced("access control")
+    async def get_or_create_user(
+        tg_id: int, tg_username: str | None = None
+    ) -> UserState:
+        """
+        Get or create user (cached, so steady-state updates cost no user query).
+
+        Parameters
+            tg_id: Telegram user id.
+            tg_username: Telegram username.
+
+        Returns
+            The user state.
+        """
+        user = USER_CACHE.get(tg_id)
+        if user and user.tg_username == tg_username:
             return user
 
+        user = await UserManager.upsert_user(tg_id, tg_username)
+        # Commit right away: the user must exist even if the handler fails, and the
+        # connection is released before the handler's slow path (e.g. LLM call)
+        await checkpoint()
+        return USER_CACHE.set(user)
+
     @staticmethod
-    async def check_user_access(user: User) -> bool:
+    async def check_user_access(user: UserState) -> bool:
         """Check user access to the bot."""
         # Administrators (subscription = -1) have full access
         # Users with active status (1) have access
         return user.status == UserStatus.ACTIVE
 
+    @staticmethod
+    @traced("rate limit")
+    async def check_rate_limit(update: Update) -> bool:
+        """
+        Check the request rate limit of the user and ask them to slow down.
+
+        NOTE: Must be called before the unit of work, see `RateLimiter`.
+        """
+        if not settings.RATE_LIMIT_ENABLED:
+            return True
+
+        user_id = update.effective_user.id
+        if await RATE_LIMITER.allow(user_id):
+            return True
+
+        logger.info(
+            "Rate limit exceeded for user %s (%s)",
+            user_id,
+            update.effective_user.username,
+        )
+        if RATE_LIMITER.should_notify(user_id):
+            await send_message(update, msg.SLOW_DOWN)
+        return False
+
     @staticmethod
     def access_required(func: Callable) -> Callable:
         """Check user access to the bot."""
@@ -150,33 +205,68 @@ class AccessControl:
             username = update.effective_user.username
 
             try:
-                # Get or create user
-                user: User = await AccessControl.get_or_create_user(user_id, username)
+                # Cheap check before any DB lookup of the user
+                if not await AccessControl.check_rate_limit(update):
+                    return
+
+                # One DB session for the whole update, committed once at the end
+                async with unit_of_work():
+                    # Get or create user
+                    user = await AccessControl.get_or_create_user(user_id, username)
+
+                    # Check access. The cached status may lag a grant made by
+                    # another process, so a denial reads it again. A granted
+                    # access is claimed atomically by the handler before use
+                    if not await AccessControl.check_user_access(user):
+                        status = await UserManager.get_user_status(user.id)
+                        if status is not None:
+                            user.status = status
+                    if not await AccessControl.check_user_access(user):
+                        logger.debug(
+                            "Access denied for user %s (%s). Status: %s",
+                            user_id,
+                            username,
+                            user.status,
+                        )
+                        await send_message(
+                            update,
+                            msg.START.format(token_url=settings.APP_TOKEN_BUY_URL),
+                        )
+                        return
+
+                    # Check token quota before any LLM work
+                    quota = await USAGE.check_quota(user.id, get_epoch_id())
+                    if quota != QuotaStatus.OK:
+                        logger.info(
+                            "Token quota (%s) exceeded for user %s (%s)",
+                            quota.value,
+                            user_id,
+                            username,
+                        )
+                        await send_message(
+                            update,
+                            msg.QUOTA_HARD
+                            if quota == QuotaStatus.HARD
+                            else msg.QUOTA_SOFT,
+                        )
+                        return
 
-                # Check access
-                if not await AccessControl.check_user_access(user):
                     logger.debug(
-                        "Access denied for user %s (%s). Status: %s",
+                        "Access granted for user %s (%s). Status: %s",
                         user_id,
                         username,
                         user.status,
                     )
-                    await send_message(
-                        update,
-                        msg.START.format(token_url=settings.APP_TOKEN_BUY_URL),
-                    )
-                    return
+                    # Release the connection of the access reads before the handler
+                    await checkpoint()
 
-                logger.debug(
-                    "Access granted for user %s (%s). Status: %s",
-                    user_id,
-                    username,
-                    user.status,
-                )
-
-                # Add user to context for further use
-                context.user_data["user_model"] = user
-                return await func(update, context, *args, **kwargs)
+                    # Current user for the handler (not kept in PTB user data,
+                    # which lives as long as the process)
+                    token = CURRENT_USER.set(user)
+                    try:
+                        return await func(update, context, *args, **kwargs)
+                    finally:
+                        CURRENT_USER.reset(token)
 
             except Exception as exc:
                 logger.error(
@@ -190,7 +280,7 @@ class AccessControl:
                 await send_message(update, msg.ERROR)
                 return
 
-        return wrapper
+        return trace_update(wrapper)
 
     @staticmethod
     def register_user(func: Callable) -> Callable:
@@ -208,12 +298,22 @@ class AccessControl:
             username = update.effective_user.username
 
             try:
-                # Get or create user
-                user: User = await AccessControl.get_or_create_user(user_id, username)
+                # Cheap check before any DB lookup of the user
+                if not await AccessControl.check_rate_limit(update):
+                    return
 
-                # Add user to context
-                context.user_data["user_model"] = user
-                return await func(update, context, *args, **kwargs)
+                # One DB session for the whole update, committed once at the end
+                async with unit_of_work():
+                    # Get or create user
+                    user = await AccessControl.get_or_create_user(user_id, username)
+
+                    # Current user for the handler (not kept in PTB user data,
+                    # which lives as long as the process)
+                    token = CURRENT_USER.set(user)
+                    try:
+                        return await func(update, context, *args, **kwargs)
+                    finally:
+                        CURRENT_USER.reset(token)
 
             except Exception as exc:
                 logger.error(
@@ -227,12 +327,52 @@ class AccessControl:
                 await send_message(update, msg.ERROR)
                 return
 
-        return wrapper
+        return trace_update(wrapper)
+
+    @staticmethod
+    def admin_required(func: Callable) -> Callable:
+        """Allow the command only to bot administrators (APP_ADMIN_IDS)."""
+
+        @wraps(func)
+        async def wrapper(
+            update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs
+        ):
+            if not update.effective_user:
+                logger.warning("No effective user in update")
+                return
+
+            user_id = update.effective_user.id
+            username = update.effective_user.username
+
+            if user_id not in settings.APP_ADMIN_IDS:
+                logger.warning(
+                    "Admin command denied for user %s (%s)", user_id, username
+                )
+                return
+
+            try:
+                async with unit_of_work():
+                    return await func(update, context, *args, **kwargs)
+
+            except Exception as exc:
+                logger.error(
+                    "%s error in admin command for user %s (%s): %s. Details:\n%s",
+                    exc.__class__.__name__,
+                    user_id,
+                    username,
+                    str(exc),
+                    format_exc(),
+                )
+                await send_message(update, msg.ERROR)
+                return
+
+        return trace_update(wrapper)
 
 
 # Aliases for easy use
 access_required = AccessControl.access_required
 register_user = AccessControl.register_user
+admin_required = AccessControl.admin_required
 
 # Chat action indicators
 typing_action = TypingIndicator.typing_action
@@ -2,6 +2,7 @@ import time
 
 from core.db.init import init_db
 from core.settings import settings
+from core.tracing import setup_tracing
 from halo import Halo
 
 
@@ -41,6 +42,10 @@ def build():
             spinner.fail("Environment check failed.")
             raise
 
+        spinner.start("Configuring tracing...")
+        setup_tracing()
+        spinner.succeed("Tracing configured.")
+
         spinner.start("Initializing database...")
         try:
             init_db()
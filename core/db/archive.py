@@ -0,0 +1,251 @@
+import gzip
+import json
+from collections.abc import Iterator
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+
+from core.db import init
+from core.db.init import commit, get_session
+from core.db.partition import PARTITIONS
+from core.db.schema import Conversation, ConversationMessage
+from core.epoch import get_epoch_id
+from core.logger import get_logger
+from core.settings import settings
+from sqlalchemy import Column, Table, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+logger = get_logger(__name__)
+
+
+class Archiver:
+    """
+    Cold archival of closed epochs to compressed JSONL files.
+
+    Rows are streamed through a server-side cursor and written to gzip-compressed
+    chunks of `chunk_rows` rows:
+
+        <archive_dir>/epoch=<epoch_id>/
+            manifest.json
+            conversations-00000.jsonl.gz
+            conversation_messages-00000.jsonl.gz
+            ...
+
+    Attributes
+        archive_dir (Path): Root directory of the archive.
+        chunk_rows (int): Max number of rows in one file.
+        batch_size (int): Number of rows fetched or restored at once.
+    """
+
+    def __init__(
+        self,
+        archive_dir: Path = settings.DATABASE_ARCHIVE_DIR,
+        chunk_rows: int = settings.DATABASE_ARCHIVE_CHUNK_ROWS,
+        batch_size: int = settings.DATABASE_ARCHIVE_BATCH_SIZE,
+    ):
+        self.archive_dir = archive_dir
+        self.chunk_rows = chunk_rows
+        self.batch_size = batch_size
+
+    def epoch_dir(self, epoch_id: int) -> Path:
+        """Get archive directory of the epoch."""
+        return Path(self.archive_dir, f"epoch={epoch_id}")
+
+    @staticmethod
+    def _columns(table: Table) -> list[Column]:
+        """Get stored columns of the table (generated columns are skipped)."""
+        return [column for column in table.columns if column.computed is None]
+
+    @staticmethod
+    def _encode(value: Any) -> Any:
+        if isinstance(value, UUID):
+            return str(value)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, Enum):
+            return value.value
+        raise TypeError(f"Can not encode {type(value).__name__} to JSON")
+
+    @staticmethod
+    def _decode(columns: list[Column], row: dict[str, Any]) -> dict[str, Any]:
+        decoded = {}
+        for column in columns:
+            value = row.get(column.name)
+            python_type = column.type.python_type
+
+            if value is not None and python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value is not None and python_type not in (str, int, float, bool):
+                value = python_type(value)
+
+            decoded[column.name] = value
+        return decoded
+
+    async def archive(self, epoch_id: int, prune: bool = True) -> dict[str, Any]:
+        """
+        Archive conversations and messages of the closed epoch.
+
+        Parameters
+            epoch_id: The epoch id.
+            prune: Drop the message partition after the row counts are verified.
+
+        Returns
+            Archive manifest.
+        """
+        if epoch_id >= get_epoch_id():
+            raise ValueError(f"Epoch {epoch_id} is not closed yet")
+
+        epoch_dir = self.epoch_dir(epoch_id)
+        epoch_dir.mkdir(parents=True, exist_ok=True)
+
+        messages = ConversationMessage.__table__
+        conversations = Conversation.__table__
+        conversation_ids = (
+            select(messages.c.conversation_id)
+            .where(messages.c.epoch_id == epoch_id)
+            .distinct()
+        )
+
+        manifest = {
+            "epoch_id": epoch_id,
+            "archived_at": settings.NOW_DT_UTC().isoformat(),
+            "tables": {
+                conversations.name: await self._export(
+                    epoch_dir,
+                    conversations,
+                    select(*self._columns(conversations))
+                    .where(conversations.c.id.in_(conversation_ids))
+                    .order_by(conversations.c.id),
+                ),
+                messages.name: await self._export(
+                    epoch_dir,
+                    messages,
+                    select(*self._columns(messages))
+                    .where(messages.c.epoch_id == epoch_id)
+                    .order_by(messages.c.id),
+                ),
+            },
+        }
+
+        # Verify that every row of the epoch got to the archive
+        async for session in get_session():
+            expected = await session.scalar(
+                select(func.count())
+                .select_from(messages)
+                .where(messages.c.epoch_id == epoch_id)
+            )
+        archived = manifest["tables"][messages.name]["rows"]
+        if archived != expected:
+            raise RuntimeError(
+                f"Archive of epoch {epoch_id} is incomplete: "
+                f"{archived} of {expected} message(s) archived"
+            )
+
+        with Path(epoch_dir, "manifest.json").open("w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=2)
+
+        logger.info(
+            "Epoch %s archived to %s: %s message(s)", epoch_id, epoch_dir, archived
+        )
+
+        if prune:
+            await self.prune(epoch_id)
+        return manifest
+
+    async def _export(self, epoch_dir: Path, table: Table, stmt) -> dict[str, Any]:
+        """Stream query rows to compressed JSONL chunks."""
+        files: list[str] = []
+        rows = 0
+        file = None
+
+        try:
+            async for session in get_session():
+                result = await session.stream(
+                    stmt.execution_options(yield_per=self.batch_size)
+                )
+                async for row in result.mappings():
+                    if rows % self.chunk_rows == 0:
+                        if file is not None:
+                            file.close()
+                        name = f"{table.name}-{len(files):05d}.jsonl.gz"
+                        file = gzip.open(Path(epoch_dir, name), "wt", encoding="utf-8")
+                        files.append(name)
+
+                    file.write(json.dumps(dict(row), default=self._encode) + "\n")
+                    rows += 1
+        finally:
+            if file is not None:
+                file.close()
+
+        return {"rows": rows, "files": files}
+
+    async def prune(self, epoch_id: int) -> None:
+        """
+        Drop the message partition of the archived epoch.
+
+        Conversations are kept: their ids are fixed per chat, so they span epochs
+        and keep the rolling summary.
+        """
+        messages = ConversationMessage.__table__
+        # DETACH ... CONCURRENTLY can not run inside a transaction block
+        async with init.DB_ENGINE.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.run_sync(
+                PARTITIONS.detach_partitions, epoch_id, drop=True, tables=(messages,)
+            )
+
+        logger.info("Epoch %s pruned: message partition dropped", epoch_id)
+
+    def _read(self, epoch_dir: Path, files: list[str]) -> Iterator[dict[str, Any]]:
+        for name in files:
+            with gzip.open(Path(epoch_dir, name), "rt", encoding="utf-8") as file:
+                for line in file:
+                    yield json.loads(line)
+
+    async def restore(self, epoch_id: int) -> dict[str, int]:
+        """
+        Reload archived conversations and messages of the epoch.
+
+        Rows that already exist are skipped.
+
+        Returns
+            Number of restored rows by table.
+        """
+        epoch_dir = self.epoch_dir(epoch_id)
+        with Path(epoch_dir, "manifest.json").open(encoding="utf-8") as file:
+            manifest = json.load(file)
+
+        # The partition may be detached or dropped when the epoch was closed
+        async with init.DB_ENGINE.begin() as conn:
+            await conn.run_sync(PARTITIONS.attach_partitions, [epoch_id])
+
+        restored = {}
+        # Conversations first: messages reference them
+        for table in (Conversation.__table__, ConversationMessage.__table__):
+            columns = self._columns(table)
+            restored[table.name] = 0
+            batch = []
+
+            for row in self._read(epoch_dir, manifest["tables"][table.name]["files"]):
+                batch.append(self._decode(columns, row))
+                if len(batch) >= self.batch_size:
+                    restored[table.name] += await self._insert(table, batch)
+                    batch = []
+            if batch:
+                restored[table.name] += await self._insert(table, batch)
+
+        logger.info("Epoch %s restored from %s: %s", epoch_id, epoch_dir, restored)
+        return restored
+
+    async def _insert(self, table: Table, rows: list[dict[str, Any]]) -> int:
+        async for session in get_session():
+            result = await session.execute(
+                insert(table).values(rows).on_conflict_do_nothing()
+            )
+            await commit(session)
+        return result.rowcount
+
+
+ARCHIVER = Archiver()
@@ -0,0 +1,200 @@
+import asyncio
+from contextvars import Context
+from traceback import format_exc
+from typing import Any
+from uuid import UUID
+
+from core.db.init import commit, get_session
+from core.db.schema import ConversationMessage
+from core.logger import get_logger
+from core.settings import settings
+from sqlalchemy.dialects.postgresql import insert
+
+logger = get_logger(__name__)
+
+
+class MessageBuffer:
+    """
+    Write-behind buffer for conversation messages.
+
+    Messages of all users are accumulated in memory and written as one multi-row
+    insert every `flush_interval_ms` or as soon as `batch_size` rows are buffered.
+    Producers wait when the buffer is full (backpressure). Buffered messages stay
+    visible through `pending_messages` until they are committed, so the history
+    loader still reads its own writes.
+
+    Attributes
+        batch_size (int): Max number of rows written by one insert.
+        flush_interval (float): Time between flushes in seconds.
+        max_size (int): Max number of buffered rows.
+        queue (asyncio.Queue): Rows waiting to be written.
+        pending (dict[UUID, list[dict]]): Not yet committed rows by conversation id.
+        retry_batch (list[dict]): Rows taken from the queue but not written yet.
+        flush_task (asyncio.Task | None): Background flush task.
+        wakeup (asyncio.Event): Event to trigger an early flush.
+        flush_lock (asyncio.Lock): Lock to run one flush at a time.
+        failed_attempts (int): Number of failed inserts of the current retry batch.
+
+        _MAX_ATTEMPTS (int): Max number of attempts to write a batch. The last one
+            bisects it, so only the rows that still fail are dropped.
+    """
+
+    _MAX_ATTEMPTS: int = 5
+
+    def __init__(
+        self,
+        batch_size: int = settings.DATABASE_MESSAGE_BUFFER_BATCH_SIZE,
+        flush_interval_ms: int = settings.DATABASE_MESSAGE_BUFFER_FLUSH_INTERVAL_MS,
+        max_size: int = settings.DATABASE_MESSAGE_BUFFER_MAX_SIZE,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_size = max_size
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=max_size)
+        self.pending: dict[UUID, list[dict[str, Any]]] = {}
+        self.retry_batch: list[dict[str, Any]] = []
+        self.flush_task: asyncio.Task | None = None
+        self.wakeup = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.failed_attempts = 0
+
+    async def put(self, rows: list[dict[str, Any]]) -> None:
+        """
+        Add message rows to the buffer.
+
+        Waits while the buffer is full.
+
+        Parameters
+            rows: `ConversationMessage` column values, `id` and `created_at` included.
+        """
+        self._ensure_started()
+
+        for row in rows:
+            await self.queue.put(row)
+            self.pending.setdefault(row["conversation_id"], []).append(row)
+
+        if self.queue.qsize() >= self.batch_size:
+            self.wakeup.set()
+
+    def pending_messages(self, conversation_id: UUID) -> list[ConversationMessage]:
+        """Get buffered messages of the conversation that are not committed yet."""
+        return [
+            ConversationMessage(**row) for row in self.pending.get(conversation_id, [])
+        ]
+
+    def _ensure_started(self) -> None:
+        """Start the background flush task if it is not running."""
+        if self.flush_task is None or self.flush_task.done():
+            # Empty context: the loop must not reuse the request-scoped session
+            self.flush_task = asyncio.create_task(
+                self._flush_loop(), name="message_buffer_flush", context=Context()
+            )
+
+    async def _flush_loop(self) -> None:
+        """Flush the buffer periodically or when enough rows are buffered."""
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write all buffered rows to the database."""
+        async with self.flush_lock:
+            while self.retry_batch or not self.queue.empty():
+                # Rows stay in `retry_batch` until they are written, so a failed
+                # or cancelled insert is retried on the next flush
+                batch = self.retry_batch
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+
+                if self.failed_attempts + 1 >= self._MAX_ATTEMPTS:
+                    # Last attempt: do not let one broken row (e.g. of a pruned
+                    # conversation) block the buffer or drop the whole batch
+                    dropped = await self._write_split(batch)
+                    if dropped:
+                        logger.error(
+                            "Dropped %s of %s buffered message(s) after %s attempts",
+                            dropped,
+                            len(batch),
+                            self._MAX_ATTEMPTS,
+                        )
+                elif not await self._write(batch):
+                    self.failed_attempts += 1
+                    return
+
+                self._release(batch)
+                self.retry_batch = []
+                self.failed_attempts = 0
+
+    async def _write(self, batch: list[dict[str, Any]]) -> bool:
+        """Write one batch of rows as a multi-row insert."""
+        try:
+            async for session in get_session():
+                await session.execute(insert(ConversationMessage).values(batch))
+                await commit(session)
+        except Exception as exc:
+            logger.error(
+                "Failed to flush %s buffered message(s). %s: %s. Details:\n%s",
+                len(batch),
+                exc.__class__.__name__,
+                str(exc),
+                format_exc(),
+            )
+            return False
+
+        logger.debug("Flushed %s buffered message(s)", len(batch))
+        return True
+
+    async def _write_split(self, batch: list[dict[str, Any]]) -> int:
+        """
+        Write the batch, bisecting it on failure until the failing rows are isolated.
+
+        Returns
+            Number of dropped rows.
+        """
+        if await self._write(batch):
+            return 0
+        if len(batch) == 1:
+            logger.error(
+                "Dropped buffered message %s of conversation %s",
+                batch[0].get("id"),
+                batch[0]["conversation_id"],
+            )
+            return 1
+
+        middle = len(batch) // 2
+        return await self._write_split(batch[:middle]) + await self._write_split(
+            batch[middle:]
+        )
+
+    def _release(self, batch: list[dict[str, Any]]) -> None:
+        """Remove written (or dropped) rows from the pending messages."""
+        for row in batch:
+            rows = self.pending.get(row["conversation_id"])
+            if rows is not None:
+                rows.remove(row)
+                if not rows:
+                    del self.pending[row["conversation_id"]]
+
+    async def close(self) -> None:
+        """Stop the background flush task and write the remaining rows."""
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+
+        await self.flush()
+
+        lost = len(self.retry_batch) + self.queue.qsize()
+        if lost:
+            logger.error("%s buffered message(s) were not written on shutdown", lost)
+
+
+MESSAGE_BUFFER = MessageBuffer()
@@ -0,0 +1,140 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from typing import Any
+
+from core.db.schema import User
+from core.schema.db import UserStatus
+from core.settings import settings
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache with a time to live for each entry.
+
+    Attributes
+        maxsize (int): Max number of entries. The least recently used entry is evicted first.
+        ttl (float): Time to live of an entry in seconds.
+        data (OrderedDict): Cached values with their expiration time.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def get(self, key: Hashable) -> Any | None:
+        """Get value by key or None if it is missing or expired."""
+        item = self.data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self.data[key]
+            return None
+
+        self.data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Set value by key."""
+        self.data[key] = (time.monotonic() + self.ttl, value)
+        self.data.move_to_end(key)
+
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Any | None:
+        """Remove value by key and return it."""
+        item = self.data.pop(key, None)
+        return item[1] if item else None
+
+    def clear(self) -> None:
+        """Remove all values."""
+        self.data.clear()
+
+
+@dataclass(slots=True)
+class UserState:
+    """
+    Compact per-user state kept in memory instead of the ORM object.
+
+    Attributes
+        id (int): User id.
+        tg_id (int): Telegram user id.
+        tg_username (str | None): Telegram username.
+        status (UserStatus): User status.
+    """
+
+    id: int
+    tg_id: int
+    tg_username: str | None
+    status: UserStatus
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserState":
+        return cls(
+            id=user.id,
+            tg_id=user.tg_id,
+            tg_username=user.tg_username,
+            status=user.status,
+        )
+
+
+class UserCache:
+    """
+    Bounded cache of compact user states keyed by Telegram ID.
+
+    NOTE: The cache is per process. Changes made by other processes become
+    visible after the TTL expires, so a denial re-reads the status and a granted
+    access is claimed atomically in the database (see `UserManager.claim_access`).
+
+    Attributes
+        users (TTLCache): User states by Telegram ID.
+        tg_ids (TTLCache): Telegram IDs by user ID, used for invalidation.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = settings.USER_CACHE_MAX_SIZE,
+        ttl: int = settings.USER_CACHE_TTL,
+    ):
+        self.users = TTLCache(maxsize, ttl)
+        self.tg_ids = TTLCache(maxsize, ttl)
+
+    def get(self, tg_id: int) -> UserState | None:
+        """Get cached user state by Telegram ID."""
+        return self.users.get(tg_id)
+
+    def set(self, user: User | UserState) -> UserState:
+        """Cache the user state."""
+        state = user if isinstance(user, UserState) else UserState.from_user(user)
+        self.users.set(state.tg_id, state)
+        self.tg_ids.set(state.id, state.tg_id)
+        return state
+
+    def update_status(self, user_id: int, status: UserStatus) -> None:
+        """Update the cached user status by user ID (before the change is committed)."""
+        tg_id = self.tg_ids.get(user_id)
+        state = self.users.get(tg_id) if tg_id is not None else None
+        if state is not None:
+            state.status = status
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop the cached user by user ID."""
+        tg_id = self.tg_ids.pop(user_id)
+        if tg_id is not None:
+            self.users.pop(tg_id)
+
+
+USER_CACHE = UserCache()
+
+# Recent username search results by (query, limit, cursor)
+USER_SEARCH_CACHE = TTLCache(
+    settings.USER_SEARCH_CACHE_MAX_SIZE, settings.USER_SEARCH_CACHE_TTL
+)
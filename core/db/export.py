@@ -0,0 +1,184 @@
+from collections.abc import AsyncIterator
+from enum import Enum
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+
+from core.db.init import get_session
+from core.db.schema import Conversation, ConversationMessage, Score, User
+from core.epoch import get_epoch_id
+from core.logger import get_logger
+from core.settings import settings
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    ColumnElement,
+    DateTime,
+    Integer,
+    Table,
+    select,
+)
+
+logger = get_logger(__name__)
+
+
+class Exporter:
+    """
+    Columnar analytics export of the database to Parquet files.
+
+    Tables are read with keyset pagination (by primary key), so memory use is
+    bounded by one page no matter how big the tables are. Epoch tables are
+    partitioned by epoch (Hive-style), others are split into parts:
+
+        <export_dir>/users/part-00000.parquet
+        <export_dir>/conversation_messages/epoch_id=12/part-00000.parquet
+
+    NOTE: Requires the optional `pyarrow` dependency (`analytics` extra).
+
+    Attributes
+        export_dir (Path): Root directory of the export.
+        page_size (int): Number of rows read and written at once (Parquet row group).
+    """
+
+    TABLES: tuple[Table, ...] = (User.__table__, Conversation.__table__)
+    EPOCH_TABLES: tuple[Table, ...] = (ConversationMessage.__table__, Score.__table__)
+
+    def __init__(
+        self,
+        export_dir: Path = settings.DATABASE_EXPORT_DIR,
+        page_size: int = settings.DATABASE_EXPORT_PAGE_SIZE,
+    ):
+        self.export_dir = export_dir
+        self.page_size = page_size
+
+    @staticmethod
+    def _columns(table: Table) -> list[Column]:
+        """Get stored columns of the table (generated columns are skipped)."""
+        return [column for column in table.columns if column.computed is None]
+
+    @staticmethod
+    def _schema(columns: list[Column]):
+        """Build Arrow schema from the table columns."""
+        import pyarrow as pa
+
+        fields = []
+        for column in columns:
+            if isinstance(column.type, BigInteger):
+                arrow_type = pa.int64()
+            elif isinstance(column.type, Integer):
+                arrow_type = pa.int32()
+            elif isinstance(column.type, Boolean):
+                arrow_type = pa.bool_()
+            elif isinstance(column.type, DateTime):
+                arrow_type = pa.timestamp("us", tz="UTC")
+            else:
+                # Text, String, UUID and Enum columns are exported as strings
+                arrow_type = pa.string()
+            fields.append(pa.field(column.name, arrow_type, nullable=column.nullable))
+        return pa.schema(fields)
+
+    @staticmethod
+    def _convert(row: dict[str, Any]) -> dict[str, Any]:
+        converted = {}
+        for name, value in row.items():
+            if isinstance(value, UUID):
+                value = str(value)
+            elif isinstance(value, Enum):
+                value = value.value
+            converted[name] = value
+        return converted
+
+    async def _pages(
+        self, table: Table, columns: list[Column], where: ColumnElement | None = None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Read the table page by page with keyset pagination on `id`."""
+        last_id = None
+
+        while True:
+            stmt = select(*columns).order_by(table.c.id).limit(self.page_size)
+            if where is not None:
+                stmt = stmt.where(where)
+            if last_id is not None:
+                stmt = stmt.where(table.c.id > last_id)
+
+            async for session in get_session():
+                result = await session.execute(stmt)
+                rows = result.mappings().all()
+
+            if not rows:
+                return
+
+            yield [self._convert(row) for row in rows]
+
+            if len(rows) < self.page_size:
+                return
+            last_id = rows[-1]["id"]
+
+    async def _write(
+        self,
+        path: Path,
+        table: Table,
+        where: ColumnElement | None = None,
+    ) -> int:
+        """Write the table (or its filtered part) to one Parquet file."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = self._columns(table)
+        schema = self._schema(columns)
+        writer = None
+        rows = 0
+
+        try:
+            async for page in self._pages(table, columns, where):
+                if writer is None:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    writer = pq.ParquetWriter(path, schema, compression="zstd")
+
+                writer.write_table(pa.Table.from_pylist(page, schema=schema))
+                rows += len(page)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        return rows
+
+    async def export(self) -> dict[str, int]:
+        """
+        Export users, conversations, messages and scores to Parquet.
+
+        Returns
+            Number of exported rows by table.
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as exc:
+            raise RuntimeError(
+                "Parquet export requires pyarrow. Install the `analytics` extra."
+            ) from exc
+
+        exported = {}
+        for table in self.TABLES:
+            path = Path(self.export_dir, table.name, "part-00000.parquet")
+            exported[table.name] = await self._write(path, table)
+
+        # One query per epoch, each served by the epoch partition
+        for table in self.EPOCH_TABLES:
+            exported[table.name] = 0
+            for epoch_id in range(1, get_epoch_id() + 1):
+                path = Path(
+                    self.export_dir,
+                    table.name,
+                    f"epoch_id={epoch_id}",
+                    "part-00000.parquet",
+                )
+                exported[table.name] += await self._write(
+                    path, table, where=table.c.epoch_id == epoch_id
+                )
+
+        logger.info("Analytics export to %s completed: %s", self.export_dir, exported)
+        return exported
+
+
+EXPORTER = Exporter()
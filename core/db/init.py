@@ -1,11 +1,16 @@
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from inspect import isawaitable
+from typing import Any
 
 # Import all models to register them
 from core.db.schema import *  # noqa: F403
 from core.schema.db.fields import DBInitStrategy
 from core.logger import get_logger
+from core.metrics import METRICS
 from core.settings import settings
-from sqlalchemy import create_engine, text
+from sqlalchemy import Engine, create_engine, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
@@ -14,18 +19,101 @@ logger = get_logger(__name__)
 DB_ENGINE = None
 ASESSION = None
 
+# Request-scoped session shared by all manager calls of one unit of work
+UNIT_OF_WORK: ContextVar[AsyncSession | None] = ContextVar("unit_of_work", default=None)
 
-async def get_session() -> AsyncGenerator[AsyncSession, None]:
+
+def _session_factory() -> sessionmaker:
     if ASESSION is None:
         raise RuntimeError("Database is not initialized. Please build the app first.")
+    return ASESSION
+
 
-    async with ASESSION() as session:
+async def get_session() -> AsyncGenerator[AsyncSession, None]:
+    """Get the session of the current unit of work or a new session."""
+    session = UNIT_OF_WORK.get()
+    if session is not None:
         yield session
+        return
 
+    async with _session_factory()() as session:
+        yield session
+
+
+async def commit(session: AsyncSession) -> None:
+    """
+    Commit the session.
+
+    Inside a unit of work the changes are only flushed. They are committed once
+    when the unit of work ends.
+    """
+    if session is UNIT_OF_WORK.get():
+        await session.flush()
+    else:
+        await session.commit()
+
+
+async def after_commit(
+    session: AsyncSession, callback: Callable[[], Awaitable[Any] | None]
+) -> None:
+    """Run the callback after the session changes are committed."""
+    if session is UNIT_OF_WORK.get():
+        session.info.setdefault("after_commit", []).append(callback)
+    else:
+        await _run_callbacks([callback])
 
-def init_db():
-    global DB_ENGINE, ASESSION
 
+async def _run_callbacks(callbacks: list[Callable[[], Awaitable[Any] | None]]) -> None:
+    for callback in callbacks:
+        result = callback()
+        if isawaitable(result):
+            await result
+
+
+async def checkpoint() -> None:
+    """
+    Commit the current unit of work early.
+
+    Releases the pooled connection (e.g. before a long LLM call). The session
+    stays usable and starts a new transaction on the next query.
+    """
+    session = UNIT_OF_WORK.get()
+    if session is None:
+        return
+
+    await session.commit()
+    await _run_callbacks(session.info.pop("after_commit", []))
+
+
+@asynccontextmanager
+async def unit_of_work(new: bool = False) -> AsyncIterator[AsyncSession]:
+    """
+    Request-scoped session reused by manager calls with a single commit point.
+
+    Parameters
+        new: Start a new unit of work even if there is one in the current context
+            (e.g. for background tasks that outlive the request).
+    """
+    current = UNIT_OF_WORK.get()
+    if current is not None and not new:
+        yield current
+        return
+
+    async with _session_factory()() as session:
+        token = UNIT_OF_WORK.set(session)
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            UNIT_OF_WORK.reset(token)
+
+    await _run_callbacks(session.info.pop("after_commit", []))
+
+
+def init_db():
     if (
         settings.ENV == "prod"
         and settings.DATABASE_INIT_STRATEGY == DBInitStrategy.RECREATE
@@ -34,6 +122,21 @@ def init_db():
             "RECREATE strategy is not allowed in production environment."
         )
 
+    init_engine()
+    engine = create_sync_engine()
+
+    with engine.connect() as conn:
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS raw;"))
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+        conn.commit()
+
+    _apply_db_strategy(engine, settings.DATABASE_INIT_STRATEGY)
+
+
+def init_engine():
+    """Create the async engine and session factory without touching the schema."""
+    global DB_ENGINE, ASESSION
+
     DB_ENGINE = create_async_engine(
         url=settings.model_extra["DATABASE_URI"],
         echo=settings.SQL_ECHO,
@@ -51,22 +154,46 @@ def init_db():
         autocommit=False,
     )
 
-    engine = create_engine(
+
+async def ping() -> bool:
+    """Check the database connection (readiness probe)."""
+    async with _session_factory()() as session:
+        await session.execute(text("SELECT 1"))
+    return True
+
+
+def _pool_status() -> dict[tuple[str, ...], float]:
+    pool = DB_ENGINE.pool if DB_ENGINE is not None else None
+    if pool is None:
+        return {}
+    return {
+        ("checked_out",): pool.checkedout(),
+        ("idle",): pool.checkedin(),
+        ("overflow",): max(pool.overflow(), 0),
+    }
+
+
+METRICS.gauge(
+    "db_pool_connections",
+    "Database pool connections by state",
+    ("state",),
+    callback=_pool_status,
+)
+
+
+def create_sync_engine() -> Engine:
+    """Create a sync engine for schema management and maintenance commands."""
+    return create_engine(
         url=settings.model_extra["DATABASE_URI"],
         echo=settings.SQL_ECHO,
         connect_args=settings.DATABASE_CONNECT_ARGS,
     )
 
-    with engine.connect() as conn:
-        conn.execute(text("CREATE SCHEMA IF NOT EXISTS raw;"))
-        conn.commit()
-
-    _apply_db_strategy(engine, settings.DATABASE_INIT_STRATEGY)
-
 
 def _apply_db_strategy(engine, strategy: DBInitStrategy):
     """Apply the selected database initialization strategy."""
     from core.db.base import DBase
+    from core.db.partition import PARTITIONS
 
     if strategy == DBInitStrategy.CREATE:
         # Default SQLAlchemy behavior - create tables only if they don't exist
@@ -75,3 +202,8 @@ def _apply_db_strategy(engine, strategy: DBInitStrategy):
         # Drop all tables and recreate them
         DBase.metadata.drop_all(engine)
         DBase.metadata.create_all(engine)
+
+    # Partitioned tables need partitions of the current and upcoming epochs
+    with engine.begin() as conn:
+        PARTITIONS.check_partitioned(conn)
+        PARTITIONS.create_partitions(conn, PARTITIONS.upcoming_epochs())
@@ -0,0 +1,183 @@
+from bisect import insort
+from dataclasses import dataclass, field
+from itertools import count
+
+from core.db.init import get_session
+from core.db.schema import Score, User
+from core.db.stats import ScoreHistogram
+from core.logger import get_logger
+from core.settings import settings
+from sqlalchemy import select
+
+logger = get_logger(__name__)
+
+
+@dataclass(order=True, slots=True)
+class LeaderboardEntry:
+    """Top-K leaderboard entry ordered by best score desc, then by who reached it first."""
+
+    sort_key: tuple[int, int]
+    user_id: int = field(compare=False)
+    best_score: int = field(compare=False)
+    username: str | None = field(compare=False, default=None)
+
+
+class EpochLeaderboard:
+    """
+    Incrementally maintained leaderboard of one epoch.
+
+    Scores are integers in [0, 100], so a histogram of best scores gives the rank
+    of any user in constant time. The top K entries are kept as a sorted list.
+    Best scores never decrease, so a user that dropped out of the top K can only
+    get back in through an update of their own score.
+
+    Attributes
+        epoch_id (int): The epoch id.
+        size (int): Number of top entries to keep (K).
+        best (dict[int, int]): Best score by user id.
+        histogram (ScoreHistogram): Number of users by best score.
+        top (list[LeaderboardEntry]): Top K entries, best first.
+        sequence (count): Counter to break ties by who reached the score first.
+    """
+
+    def __init__(self, epoch_id: int, size: int = settings.APP_LEADERBOARD_SIZE):
+        self.epoch_id = epoch_id
+        self.size = size
+        self.best: dict[int, int] = {}
+        self.histogram = ScoreHistogram()
+        self.top: list[LeaderboardEntry] = []
+        self.sequence = count()
+
+    @property
+    def participants(self) -> int:
+        """Number of users with a score in the epoch."""
+        return len(self.best)
+
+    @property
+    def cutoff(self) -> int | None:
+        """Best score of the last top K entry, or None if the top K is not full yet."""
+        if len(self.top) < self.size:
+            return None
+        return self.top[-1].best_score
+
+    def update(self, user_id: int, best_score: int, username: str | None = None):
+        """
+        Update the user best score.
+
+        Parameters
+            user_id: The user id.
+            best_score: The user best score in the epoch.
+            username: Telegram username to display in the top K.
+        """
+        best_score = ScoreHistogram.clamp(best_score)
+        previous = self.best.get(user_id)
+
+        if previous is not None and best_score <= previous:
+            return
+
+        self.best[user_id] = best_score
+        if previous is not None:
+            self.histogram.remove(previous)
+        self.histogram.add(best_score)
+
+        self._update_top(user_id, best_score, username)
+
+    def _update_top(self, user_id: int, best_score: int, username: str | None):
+        """Put the user to the top K if the new best score is high enough."""
+        for i, entry in enumerate(self.top):
+            if entry.user_id == user_id:
+                username = username or entry.username
+                del self.top[i]
+                break
+        else:
+            cutoff = self.cutoff
+            if cutoff is not None and best_score <= cutoff:
+                return
+
+        insort(
+            self.top,
+            LeaderboardEntry(
+                sort_key=(-best_score, next(self.sequence)),
+                user_id=user_id,
+                best_score=best_score,
+                username=username,
+            ),
+        )
+        del self.top[self.size :]
+
+    def rank(self, user_id: int) -> int | None:
+        """Get user rank (users with equal best score share the rank)."""
+        best_score = self.best.get(user_id)
+        if best_score is None:
+            return None
+        return self.histogram.count_above(best_score) + 1
+
+    def percentile(self, user_id: int) -> float | None:
+        """Get percentage of participants with a lower best score than the user."""
+        best_score = self.best.get(user_id)
+        if best_score is None:
+            return None
+        return self.histogram.percentile(best_score)
+
+    def get_top(self, limit: int | None = None) -> list[LeaderboardEntry]:
+        """Get top entries, best first."""
+        return self.top[:limit]
+
+
+class Leaderboard:
+    """
+    Leaderboards of the recent epochs.
+
+    NOTE: The leaderboard is per process. It is rebuilt from Postgres on startup
+    and then maintained by the score writes of this process.
+
+    Attributes
+        epochs (dict[int, EpochLeaderboard]): Leaderboards by epoch id.
+        keep_epochs (int): Number of recent epochs to keep in memory.
+    """
+
+    def __init__(self, keep_epochs: int = 2):
+        self.epochs: dict[int, EpochLeaderboard] = {}
+        self.keep_epochs = keep_epochs
+
+    def get(self, epoch_id: int) -> EpochLeaderboard:
+        """Get leaderboard of the epoch (empty if there is nothing yet)."""
+        board = self.epochs.get(epoch_id)
+        if board is None:
+            board = self.epochs[epoch_id] = EpochLeaderboard(epoch_id)
+            for old_epoch_id in sorted(self.epochs)[: -self.keep_epochs]:
+                del self.epochs[old_epoch_id]
+        return board
+
+    def update(
+        self, epoch_id: int, user_id: int, best_score: int, username: str | None = None
+    ) -> None:
+        """Update the user best score in the epoch leaderboard."""
+        self.get(epoch_id).update(user_id, best_score, username)
+
+    async def load(self, epoch_id: int) -> EpochLeaderboard:
+        """Rebuild the epoch leaderboard from the database with one indexed query."""
+        board = EpochLeaderboard(epoch_id)
+
+        async for session in get_session():
+            stmt = (
+                select(Score.user_id, Score.best_score, User.tg_username)
+                .join(User, User.id == Score.user_id)
+                .where(Score.epoch_id == epoch_id)
+                .order_by(Score.best_score.desc(), Score.updated_at)
+            )
+            result = await session.execute(stmt)
+
+            for user_id, best_score, username in result:
+                board.update(user_id, best_score, username)
+
+        self.epochs[epoch_id] = board
+        logger.info(
+            "Leaderboard of epoch %s loaded: %s participant(s)",
+            epoch_id,
+            board.participants,
+        )
+        return board
+
+
+LEADERBOARD = Leaderboard()
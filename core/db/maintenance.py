@@ -0,0 +1,98 @@
+"""
+Database maintenance commands.
+
+Usage
+    python -m core.db.maintenance partitions
+    python -m core.db.maintenance close-epoch --epoch 12 [--drop]
+    python -m core.db.maintenance archive --epoch 12 [--no-prune]
+    python -m core.db.maintenance restore --epoch 12
+    python -m core.db.maintenance export
+
+NOTE: Archive an epoch before its partitions are detached by `close-epoch`.
+"""
+
+import asyncio
+from argparse import ArgumentParser, Namespace
+
+from core.db.archive import ARCHIVER
+from core.db.export import EXPORTER
+from core.db.init import create_sync_engine, init_engine
+from core.db.partition import PARTITIONS
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def create_partitions(args: Namespace) -> None:
+    """Create partitions of the current and upcoming epochs."""
+    engine = create_sync_engine()
+    with engine.begin() as conn:
+        PARTITIONS.create_partitions(conn, PARTITIONS.upcoming_epochs())
+
+
+def close_epoch(args: Namespace) -> None:
+    """Detach (and optionally drop) partitions of a closed epoch."""
+    PARTITIONS.close_epoch(create_sync_engine(), args.epoch, drop=args.drop)
+
+
+def archive(args: Namespace) -> None:
+    """Archive a closed epoch to compressed files and drop its messages."""
+    init_engine()
+    asyncio.run(ARCHIVER.archive(args.epoch, prune=not args.no_prune))
+
+
+def restore(args: Namespace) -> None:
+    """Reload an archived epoch."""
+    init_engine()
+    asyncio.run(ARCHIVER.restore(args.epoch))
+
+
+def export(args: Namespace) -> None:
+    """Export the database to Parquet files for analytics."""
+    init_engine()
+    asyncio.run(EXPORTER.export())
+
+
+def get_parser() -> ArgumentParser:
+    """Build the command line parser."""
+    parser = ArgumentParser(prog="python -m core.db.maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser(
+        "partitions", help="Create partitions of the current and upcoming epochs"
+    )
+    command.set_defaults(func=create_partitions)
+
+    command = commands.add_parser(
+        "close-epoch", help="Detach partitions of a closed epoch"
+    )
+    command.add_argument("--epoch", type=int, required=True, help="Epoch id")
+    command.add_argument(
+        "--drop", action="store_true", help="Drop the detached partitions"
+    )
+    command.set_defaults(func=close_epoch)
+
+    command = commands.add_parser(
+        "archive", help="Archive a closed epoch to compressed JSONL files"
+    )
+    command.add_argument("--epoch", type=int, required=True, help="Epoch id")
+    command.add_argument(
+        "--no-prune", action="store_true", help="Keep archived messages in the database"
+    )
+    command.set_defaults(func=archive)
+
+    command = commands.add_parser("restore", help="Reload an archived epoch")
+    command.add_argument("--epoch", type=int, required=True, help="Epoch id")
+    command.set_defaults(func=restore)
+
+    command = commands.add_parser(
+        "export", help="Export the database to Parquet files partitioned by epoch"
+    )
+    command.set_defaults(func=export)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    args.func(args)
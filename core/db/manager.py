@@ -1,12 +1,28 @@
-from datetime import UTC, datetime
-from uuid import UUID
+from datetime import UTC, datetime, timedelta
+from typing import Any
+from uuid import UUID, uuid4
 
-from core.db.init import get_session
-from core.db.schema import Conversation, ConversationMessage, Score, User
+from core.ai.tokenizer import TOKENIZER
+from core.db.buffer import MESSAGE_BUFFER
+from core.db.cache import USER_CACHE, USER_SEARCH_CACHE
+from core.db.init import after_commit, commit, get_session
+from core.db.leaderboard import LEADERBOARD
+from core.db.schema import (
+    Conversation,
+    ConversationMessage,
+    Score,
+    ScoreSubmission,
+    User,
+)
+from core.db.stats import SCORE_STATS
+from core.epoch import get_epoch_id
 from core.logger import get_logger
 from core.schema.ai import MessageRole
 from core.schema.db.fields import UserStatus
-from sqlalchemy import select, update
+from core.settings import settings
+from core.tracing import traced
+from sqlalchemy import case, cast, func, literal_column, select, update
+from sqlalchemy.dialects.postgresql import REGCONFIG, insert
 
 logger = get_logger(__name__)
 
@@ -15,6 +31,7 @@ class UserManager:
     """Manager for managing users and subscriptions."""
 
     @staticmethod
+    @traced()
     async def get_user_by_tg_id(tg_id: int) -> User | None:
         """Get user by Telegram ID."""
         async for session in get_session():
@@ -23,12 +40,64 @@ class UserManager:
             return result.scalar_one_or_none()
 
     @staticmethod
+    @traced()
+    async def get_user_status(user_id: int) -> UserStatus | None:
+        """Get the current user status by user ID (one primary key lookup)."""
+        async for session in get_session():
+            stmt = select(User.status).where(User.id == user_id)
+            result = await session.execute(stmt)
+            return result.scalar_one_or_none()
+
+    @staticmethod
+    @traced()
+    async def upsert_user(tg_id: int, tg_username: str | None = None) -> User:
+        """
+        Get or create user by Telegram ID in one statement.
+
+        Parameters
+            tg_id: Telegram user id.
+            tg_username: Telegram username. Updated if it has changed.
+
+        Returns
+            The user.
+        """
+        username_changed = User.tg_username.is_distinct_from(tg_username)
+        stmt = (
+            insert(User)
+            .values(tg_id=tg_id, tg_username=tg_username)
+            .on_conflict_do_update(
+                index_elements=[User.tg_id],
+                set_={
+                    "tg_username": tg_username,
+                    "updated_at": case(
+                        (username_changed, func.now()), else_=User.updated_at
+                    ),
+                },
+            )
+            # xmax is 0 only for the freshly inserted row version
+            .returning(User, literal_column("xmax = 0").label("inserted"))
+        )
+
+        async for session in get_session():
+            result = await session.execute(stmt)
+            user, inserted = result.one()
+            await commit(session)
+
+        if inserted:
+            logger.info(
+                "Created new user %s (%s) with inactive status", tg_id, tg_username
+            )
+        return user
+
+    @staticmethod
+    @traced()
     async def update_user_status(user_id: int, status: UserStatus) -> bool:
         """Update user status."""
         async for session in get_session():
             stmt = update(User).where(User.id == user_id).values(status=status)
             result = await session.execute(stmt)
-            await session.commit()
+            await commit(session)
+            await after_commit(session, lambda: USER_CACHE.invalidate(user_id))
 
             if result.rowcount > 0:
                 logger.debug("Updated status for user %s to %s", user_id, status.value)
@@ -40,28 +109,122 @@ class UserManager:
                 return False
 
     @staticmethod
+    @traced()
     async def grant_access(user_id: int) -> bool:
         """Grant access to user."""
         return await UserManager.update_user_status(user_id, UserStatus.ACTIVE)
 
     @staticmethod
+    @traced()
     async def revoke_access(user_id: int) -> bool:
         """Revoke access to user."""
         return await UserManager.update_user_status(user_id, UserStatus.INACTIVE)
 
     @staticmethod
-    async def find_users_by_username(username: str) -> list[User]:
-        """Find users by username."""
+    @traced()
+    async def claim_access(user_id: int) -> bool:
+        """
+        Use up the user access atomically (ACTIVE -> INACTIVE).
+
+        Concurrent updates of the user, in this or another process, can not both
+        claim it: the conditional update waits for the row lock and then finds the
+        status already changed.
+
+        Returns
+            True if the access was claimed.
+        """
+        async for session in get_session():
+            stmt = (
+                update(User)
+                .where(User.id == user_id, User.status == UserStatus.ACTIVE)
+                .values(status=UserStatus.INACTIVE)
+                .returning(User.id)
+            )
+            claimed = (await session.execute(stmt)).scalar_one_or_none() is not None
+            await commit(session)
+
+        USER_CACHE.update_status(user_id, UserStatus.INACTIVE)
+        return claimed
+
+    @staticmethod
+    @traced()
+    async def release_access(user_id: int) -> bool:
+        """
+        Give a claimed access back, e.g. when the reply failed (INACTIVE -> ACTIVE).
+
+        A user banned in the meantime stays banned.
+        """
         async for session in get_session():
-            stmt = select(User).where(User.tg_username.ilike(f"%{username}%"))
+            stmt = (
+                update(User)
+                .where(User.id == user_id, User.status == UserStatus.INACTIVE)
+                .values(status=UserStatus.ACTIVE)
+            )
             result = await session.execute(stmt)
-            return list(result.scalars().all())
+            await commit(session)
+            await after_commit(session, lambda: USER_CACHE.invalidate(user_id))
+        return result.rowcount > 0
+
+    @staticmethod
+    @traced()
+    async def find_users_by_username(
+        query: str,
+        limit: int = settings.USER_SEARCH_LIMIT,
+        after: tuple[float, int] | None = None,
+    ) -> list[tuple[User, float]]:
+        """
+        Find users by username, most similar first.
+
+        Substring and fuzzy (trigram) matches are both served by the trigram GIN
+        index on `tg_username`, so the lookup does not scan the whole table.
+
+        Parameters
+            query: Username or its part (with or without @).
+            limit: Max number of users to return.
+            after: Keyset cursor, (similarity, id) of the last user of the previous page.
+
+        Returns
+            Users with their similarity to the query.
+        """
+        query = query.strip().lstrip("@").lower()
+        if not query:
+            return []
+
+        key = (query, limit, after)
+        cached = USER_SEARCH_CACHE.get(key)
+        if cached is not None:
+            return cached
+
+        similarity = func.similarity(User.tg_username, query)
+        stmt = (
+            select(User, similarity.label("similarity"))
+            .where(
+                User.tg_username.icontains(query, autoescape=True)
+                | User.tg_username.op("%")(query)
+            )
+            .order_by(similarity.desc(), User.id)
+            .limit(limit)
+        )
+        if after is not None:
+            after_similarity, after_id = after
+            stmt = stmt.where(
+                (similarity < after_similarity)
+                | ((similarity == after_similarity) & (User.id > after_id))
+            )
+
+        async for session in get_session():
+            result = await session.execute(stmt)
+            users = [(user, float(score)) for user, score in result.all()]
+
+        USER_SEARCH_CACHE.set(key, users)
+        return users
 
 
 class ConversationManager:
     """Manager for conversation operations."""
 
     @staticmethod
+    @traced()
     async def get_conversation(
         user_id: int, conversation_id: UUID, create_if_not_exists: bool = True
     ) -> Conversation:
@@ -78,12 +241,13 @@ class ConversationManager:
         raise ValueError(f"Conversation {conversation_id} does not exist")
 
     @staticmethod
+    @traced()
     async def create_conversation(user_id: int, conversation_id: UUID) -> Conversation:
         """Create a new conversation."""
         async for session in get_session():
             conversation = Conversation(id=conversation_id, user_id=user_id)
             session.add(conversation)
-            await session.commit()
+            await commit(session)
             await session.refresh(conversation)
 
         logger.debug(
@@ -92,54 +256,227 @@ class ConversationManager:
         return conversation
 
     @staticmethod
+    @traced()
     async def get_messages(
-        conversation_id: UUID, limit: int = 15
+        conversation_id: UUID,
+        limit: int = 15,
+        epoch_id: int | None = None,
+        after: datetime | None = None,
     ) -> list[ConversationMessage]:
-        """Get messages for conversation."""
+        """
+        Get messages of the conversation in the epoch (current by default), newest first.
+
+        Parameters
+            conversation_id: The conversation id.
+            limit: Max number of messages to return.
+            epoch_id: Epoch id. Current epoch if not set.
+            after: Return only messages created after it (e.g. the summary watermark).
+        """
+        if epoch_id is None:
+            epoch_id = get_epoch_id()
+
+        # Taken before the query so a row flushed in between is not missed
+        buffered = [
+            message
+            for message in MESSAGE_BUFFER.pending_messages(conversation_id)
+            if message.epoch_id == epoch_id
+            and (after is None or message.created_at > after)
+        ]
+
         async for session in get_session():
             stmt = (
                 select(ConversationMessage)
-                .where(ConversationMessage.conversation_id == conversation_id)
+                .where(
+                    ConversationMessage.conversation_id == conversation_id,
+                    ConversationMessage.epoch_id == epoch_id,
+                )
                 .order_by(ConversationMessage.created_at.desc())
                 .limit(limit)
             )
+            if after is not None:
+                stmt = stmt.where(ConversationMessage.created_at > after)
 
             result = await session.execute(stmt)
-            messages = result.scalars().all()
+            messages = list(result.scalars().all())
+
+        if buffered:
+            # Merge messages that are still in the write-behind buffer
+            ids = {message.id for message in messages}
+            messages.extend(message for message in buffered if message.id not in ids)
+            messages.sort(key=lambda message: message.created_at, reverse=True)
+            messages = messages[:limit]
 
         return messages
 
     @staticmethod
-    async def add_message(
-        conversation_id: UUID, role: MessageRole, message: str, tokens: int = 0
-    ) -> ConversationMessage:
-        """Add a message to the conversation."""
+    @traced()
+    async def get_history(
+        conversation_id: UUID,
+        max_messages: int = settings.AGENT_MEMORY_MAX_MESSAGES,
+        max_tokens: int | None = settings.AGENT_MEMORY_MAX_TOKENS,
+    ) -> tuple[str | None, list[ConversationMessage]]:
+        """
+        Get the conversation memory for the agent.
+
+        Parameters
+            conversation_id: The conversation id.
+            max_messages: Max number of recent messages.
+            max_tokens: Max stored tokens of the recent messages. No limit if None.
+
+        Returns
+            The conversation summary and the recent messages after it, oldest first.
+        """
+        summary, summary_until = None, None
         async for session in get_session():
-            # Create message
-            msg = ConversationMessage(
-                conversation_id=conversation_id,
-                role=role,
-                message=message,
-                tokens=tokens,
+            result = await session.execute(
+                select(Conversation.summary, Conversation.summary_until).where(
+                    Conversation.id == conversation_id
+                )
+            )
+            row = result.one_or_none()
+            if row is not None:
+                summary, summary_until = row
+
+        messages = await ConversationManager.get_messages(
+            conversation_id, limit=max_messages, after=summary_until
+        )
+
+        # Keep the newest messages that fit into the token budget
+        history: list[ConversationMessage] = []
+        tokens = 0
+        for message in messages:
+            tokens += message.tokens or 0
+            if history and max_tokens is not None and tokens > max_tokens:
+                break
+            history.append(message)
+
+        history.reverse()
+        return summary, history
+
+    @staticmethod
+    @traced()
+    async def search_messages(
+        query: str,
+        epoch_id: int | None = None,
+        user_id: int | None = None,
+        limit: int = settings.MESSAGE_SEARCH_LIMIT,
+        after: tuple[float, UUID] | None = None,
+    ) -> list[tuple[ConversationMessage, int, float]]:
+        """
+        Full-text search over conversation messages, most relevant first.
+
+        Served by the GIN index on the generated `message_tsv` column. The epoch
+        filter also prunes the scan to one partition.
+
+        Parameters
+            query: Search query in web search syntax ("exact phrase", -word, or).
+            epoch_id: Search only messages of the epoch.
+            user_id: Search only messages of the user's conversations.
+            limit: Max number of messages to return.
+            after: Keyset cursor, (rank, id) of the last message of the previous page.
+
+        Returns
+            Messages with the user id of their conversation and the search rank.
+        """
+        # Same text search config as the generated column
+        tsquery = func.websearch_to_tsquery(cast("simple", REGCONFIG), query)
+        rank = func.ts_rank(ConversationMessage.message_tsv, tsquery)
+
+        stmt = (
+            select(ConversationMessage, Conversation.user_id, rank.label("rank"))
+            .join(Conversation, Conversation.id == ConversationMessage.conversation_id)
+            .where(ConversationMessage.message_tsv.op("@@")(tsquery))
+            .order_by(rank.desc(), ConversationMessage.id)
+            .limit(limit)
+        )
+        if epoch_id is not None:
+            stmt = stmt.where(ConversationMessage.epoch_id == epoch_id)
+        if user_id is not None:
+            stmt = stmt.where(Conversation.user_id == user_id)
+        if after is not None:
+            after_rank, after_id = after
+            stmt = stmt.where(
+                (rank < after_rank)
+                | ((rank == after_rank) & (ConversationMessage.id > after_id))
             )
-            session.add(msg)
-            await session.commit()
-            await session.refresh(msg)
+
+        async for session in get_session():
+            result = await session.execute(stmt)
+            return [
+                (message, message_user_id, float(message_rank))
+                for message, message_user_id, message_rank in result.all()
+            ]
+
+    @staticmethod
+    def message_row(
+        conversation_id: UUID,
+        role: MessageRole,
+        message: str,
+        tokens: int | None = None,
+        created_at: datetime | None = None,
+    ) -> dict[str, Any]:
+        """Build column values of a new conversation message (tokens are counted if not set)."""
+        created_at = created_at or settings.NOW_DT_UTC()
+        return dict(
+            id=uuid4(),
+            epoch_id=get_epoch_id(created_at),
+            conversation_id=conversation_id,
+            role=role,
+            message=message,
+            tokens=TOKENIZER.count(message) if tokens is None else tokens,
+            created_at=created_at,
+        )
+
+    @staticmethod
+    @traced()
+    async def add_message(
+        conversation_id: UUID,
+        role: MessageRole,
+        message: str,
+        tokens: int | None = None,
+    ) -> ConversationMessage:
+        """Add a message to the conversation (tokens are counted if not set)."""
+        row = ConversationManager.message_row(conversation_id, role, message, tokens)
+
+        if settings.DATABASE_MESSAGE_BUFFER_ENABLED:
+            await MESSAGE_BUFFER.put([row])
+            msg = ConversationMessage(**row)
+        else:
+            async for session in get_session():
+                # Create message
+                msg = ConversationMessage(**row)
+                session.add(msg)
+                await commit(session)
+                await session.refresh(msg)
 
         logger.debug("Message %s added to conversation %s", msg.id, conversation_id)
         return msg
 
     @staticmethod
-    async def update_summary(conversation_id: UUID, summary: str) -> bool:
-        """Update conversation summary."""
+    @traced()
+    async def update_summary(
+        conversation_id: UUID, summary: str, until: datetime | None = None
+    ) -> bool:
+        """
+        Update conversation summary.
+
+        Parameters
+            conversation_id: The conversation id.
+            summary: The new summary.
+            until: Created at of the last message folded into the summary.
+        """
+        values: dict[str, Any] = dict(summary=summary, updated_at=datetime.now(UTC))
+        if until is not None:
+            values["summary_until"] = until
+
         async for session in get_session():
             stmt = (
                 update(Conversation)
                 .where(Conversation.id == conversation_id)
-                .values(summary=summary, updated_at=datetime.now(UTC))
+                .values(**values)
             )
             await session.execute(stmt)
-            await session.commit()
+            await commit(session)
 
         logger.debug("Updated summary for conversation %s", conversation_id)
         return True
@@ -149,35 +486,164 @@ class ScoreManager:
     """Manager for score operations."""
 
     @staticmethod
-    async def create_score(user_id: int) -> bool:
-        """Create score for user."""
-        async for session in get_session():
-            score = Score(user_id=user_id)
-            session.add(score)
-            await session.commit()
-
-        logger.debug("Created score for user %s", user_id)
-        return True
+    @traced()
+    async def get_score(user_id: int, epoch_id: int | None = None) -> Score | None:
+        """Get user score aggregate for the epoch (current epoch by default)."""
+        if epoch_id is None:
+            epoch_id = get_epoch_id()
 
-    @staticmethod
-    async def get_score(user_id: int) -> Score:
-        """Get score for user."""
         async for session in get_session():
-            stmt = select(Score).where(Score.user_id == user_id)
+            stmt = select(Score).where(
+                Score.user_id == user_id, Score.epoch_id == epoch_id
+            )
             result = await session.execute(stmt)
             return result.scalar_one_or_none()
 
     @staticmethod
-    async def update_score(user_id: int, score: int) -> bool:
-        """Update score for user."""
-        existing_score = await ScoreManager.get_score(user_id)
-        if not existing_score:
-            await ScoreManager.create_score(user_id)
+    @traced()
+    async def update_score(
+        user_id: int,
+        score: int,
+        epoch_id: int | None = None,
+        username: str | None = None,
+        simhash: int | None = None,
+    ) -> Score:
+        """
+        Record a scored submission and update the user score aggregate.
+
+        The submission is appended to `score_submissions` and the per-(user, epoch)
+        aggregate is maintained by one atomic INSERT ... ON CONFLICT DO UPDATE.
+
+        Parameters
+            user_id: The user id.
+            score: Supervisor score of the submission.
+            epoch_id: Epoch id. Current epoch if not set.
+            username: Telegram username to display in the leaderboard.
+            simhash: Signed 64-bit SimHash of the submission message.
+
+        Returns
+            The updated score aggregate.
+        """
+        if epoch_id is None:
+            epoch_id = get_epoch_id()
+
+        stmt = insert(Score).values(
+            user_id=user_id,
+            epoch_id=epoch_id,
+            best_score=score,
+            score_sum=score,
+            score_count=1,
+            last_score=score,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Score.user_id, Score.epoch_id],
+            set_={
+                "best_score": func.greatest(Score.best_score, stmt.excluded.best_score),
+                "score_sum": Score.score_sum + stmt.excluded.score_sum,
+                "score_count": Score.score_count + 1,
+                "last_score": stmt.excluded.last_score,
+                "updated_at": func.now(),
+            },
+        ).returning(Score)
 
         async for session in get_session():
-            stmt = update(Score).where(Score.user_id == user_id).values(score=score)
-            await session.execute(stmt)
-            await session.commit()
+            await session.execute(
+                insert(ScoreSubmission).values(
+                    user_id=user_id, epoch_id=epoch_id, score=score, simhash=simhash
+                )
+            )
+            result = await session.execute(
+                stmt, execution_options={"populate_existing": True}
+            )
+            aggregate = result.scalar_one()
+            await commit(session)
+            await after_commit(
+                session,
+                lambda: ScoreManager._on_score_committed(
+                    epoch_id, user_id, score, aggregate.best_score, username
+                ),
+            )
 
-        logger.debug("Updated score for user %s to %d", user_id, score)
-        return True
+        logger.debug(
+            "Recorded score %d for user %s in epoch %s (best: %d)",
+            score,
+            user_id,
+            epoch_id,
+            aggregate.best_score,
+        )
+        return aggregate
+
+    @staticmethod
+    def _on_score_committed(
+        epoch_id: int,
+        user_id: int,
+        score: int,
+        best_score: int,
+        username: str | None,
+    ) -> None:
+        """Update in-process leaderboard and score distribution."""
+        LEADERBOARD.update(epoch_id, user_id, best_score, username)
+        SCORE_STATS.add(epoch_id, score)
+
+
+class TurnManager:
+    """Manager for persisting a whole conversation turn."""
+
+    @staticmethod
+    @traced()
+    async def commit_turn(
+        user_id: int,
+        conversation_id: UUID,
+        message: str,
+        response: str,
+    ) -> None:
+        """
+        Persist one turn of the conversation in a single transaction.
+
+        Creates the conversation if it does not exist and inserts the user message
+        with Aiko's response as one multi-row insert. User access is revoked by the
+        handler itself, not here, since this runs in the background.
+        If the message buffer is enabled, the messages are handed to it instead
+        and written by the next group commit.
+
+        Tokens of both messages are counted locally from the stored text. Provider
+        completion tokens include reasoning and every request of the agent run, so
+        they are only used for usage metering.
+
+        Parameters
+            user_id: The user id.
+            conversation_id: The conversation id.
+            message: The user message.
+            response: Aiko's response.
+        """
+        # The response is stamped 1 microsecond later to keep the messages ordered
+        created_at = settings.NOW_DT_UTC()
+        rows = [
+            ConversationManager.message_row(
+                conversation_id, MessageRole.USER, message, created_at=created_at
+            ),
+            ConversationManager.message_row(
+                conversation_id,
+                MessageRole.AGENT,
+                response,
+                created_at=created_at + timedelta(microseconds=1),
+            ),
+        ]
+
+        async for session in get_session():
+            await session.execute(
+                insert(Conversation)
+                .values(id=conversation_id, user_id=user_id)
+                .on_conflict_do_nothing(index_elements=[Conversation.id])
+            )
+            if not settings.DATABASE_MESSAGE_BUFFER_ENABLED:
+                await session.execute(insert(ConversationMessage).values(rows))
+            await commit(session)
+
+            if settings.DATABASE_MESSAGE_BUFFER_ENABLED:
+                # Buffered after the commit so the conversation row already exists
+                await after_commit(session, lambda: MESSAGE_BUFFER.put(rows))
+
+        logger.debug(
+            "Turn committed to conversation %s for user %s", conversation_id, user_id
+        )
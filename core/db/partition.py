@@ -0,0 +1,239 @@
+import asyncio
+from collections.abc import Iterable
+from contextvars import Context
+from traceback import format_exc
+
+from core.db import init
+from core.db.schema import ConversationMessage, Score, ScoreSubmission
+from core.epoch import get_epoch_id
+from core.logger import get_logger
+from core.schema.db import PartitionState
+from core.settings import settings
+from sqlalchemy import Connection, Engine, Table, text
+
+logger = get_logger(__name__)
+
+# Tables partitioned by RANGE (epoch_id), one partition per epoch
+PARTITIONED_TABLES: tuple[Table, ...] = (
+    ConversationMessage.__table__,
+    Score.__table__,
+    ScoreSubmission.__table__,
+)
+
+
+class PartitionManager:
+    """
+    Manager for epoch partitions of the partitioned tables.
+
+    Partitions are created ahead of time, so inserts never miss a partition.
+    Closing an epoch detaches its partitions (and optionally drops them)
+    instead of deleting rows one by one.
+
+    Attributes
+        ahead (int): Number of future epochs with pre-created partitions.
+        check_interval (int): Time between partition checks in seconds.
+        task (asyncio.Task | None): Background task creating upcoming partitions.
+    """
+
+    def __init__(
+        self,
+        ahead: int = settings.DATABASE_PARTITIONS_AHEAD,
+        check_interval: int = settings.DATABASE_PARTITION_CHECK_INTERVAL,
+    ):
+        self.ahead = ahead
+        self.check_interval = check_interval
+        self.task: asyncio.Task | None = None
+
+    @staticmethod
+    def partition_name(table: Table, epoch_id: int) -> str:
+        """Get partition table name (without schema)."""
+        return f"{table.name}_e{epoch_id}"
+
+    def upcoming_epochs(self) -> range:
+        """Get ids of the current and the next `ahead` epochs."""
+        current = get_epoch_id()
+        return range(current, current + self.ahead + 1)
+
+    def create_partitions(self, conn: Connection, epoch_ids: Iterable[int]) -> None:
+        """Create partitions of all partitioned tables for the epochs if missing."""
+        for epoch_id in epoch_ids:
+            for table in PARTITIONED_TABLES:
+                conn.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {table.schema}."
+                        f"{self.partition_name(table, epoch_id)} "
+                        f"PARTITION OF {table.fullname} "
+                        f"FOR VALUES FROM ({epoch_id}) TO ({epoch_id + 1})"
+                    )
+                )
+
+    @staticmethod
+    def check_partitioned(conn: Connection) -> None:
+        """
+        Check that the partitioned tables are really partitioned.
+
+        `create_all` skips existing tables, so tables created before epoch
+        partitioning stay plain tables and partitions can not be attached to them.
+
+        Raises
+            RuntimeError: If any of the tables is not partitioned.
+        """
+        plain = [
+            table.fullname
+            for table in PARTITIONED_TABLES
+            if not conn.execute(
+                text(
+                    "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                    "WHERE partrelid = to_regclass(:table))"
+                ),
+                {"table": table.fullname},
+            ).scalar()
+        ]
+        if plain:
+            raise RuntimeError(
+                f"Tables {', '.join(plain)} are not partitioned by epoch_id. "
+                "The CREATE strategy does not convert existing tables: rename them "
+                "(ALTER TABLE ... RENAME TO ..._old), restart to create the "
+                "partitioned tables and copy the rows back with INSERT ... SELECT "
+                "(messages need an epoch_id), or use the RECREATE strategy on a "
+                "database whose data can be dropped."
+            )
+
+    @staticmethod
+    def partition_state(
+        conn: Connection, table: Table, partition: str
+    ) -> PartitionState | None:
+        """Get the state of the partition table or None if it does not exist."""
+        exists, attached = conn.execute(
+            text(
+                "SELECT to_regclass(:partition) IS NOT NULL, EXISTS ("
+                "SELECT 1 FROM pg_inherits "
+                "WHERE inhrelid = to_regclass(:partition) "
+                "AND inhparent = to_regclass(:parent))"
+            ),
+            {"partition": partition, "parent": table.fullname},
+        ).one()
+        if attached:
+            return PartitionState.ATTACHED
+        return PartitionState.DETACHED if exists else None
+
+    def attach_partitions(self, conn: Connection, epoch_ids: Iterable[int]) -> None:
+        """
+        Attach partitions of the epochs back, e.g. to restore a closed epoch.
+
+        A partition detached without drop still exists as a standalone table, so
+        `CREATE TABLE IF NOT EXISTS` would skip it and inserts would find no
+        partition. It is attached back with its rows instead. Dropped partitions
+        are created again.
+        """
+        for epoch_id in epoch_ids:
+            for table in PARTITIONED_TABLES:
+                partition = f"{table.schema}.{self.partition_name(table, epoch_id)}"
+                if (
+                    self.partition_state(conn, table, partition)
+                    == PartitionState.DETACHED
+                ):
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {table.fullname} "
+                            f"ATTACH PARTITION {partition} "
+                            f"FOR VALUES FROM ({epoch_id}) TO ({epoch_id + 1})"
+                        )
+                    )
+                    logger.info("Attached partition %s", partition)
+
+        self.create_partitions(conn, epoch_ids)
+
+    def close_epoch(self, engine: Engine, epoch_id: int, drop: bool = False) -> None:
+        """
+        Detach (and optionally drop) partitions of the closed epoch.
+
+        Detached partitions stay as standalone tables, e.g. for archival.
+
+        Parameters
+            engine: Sync database engine.
+            epoch_id: The epoch id to close.
+            drop: Drop the detached partitions.
+        """
+        # DETACH ... CONCURRENTLY can not run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            self.detach_partitions(conn, epoch_id, drop=drop)
+
+    def detach_partitions(
+        self,
+        conn: Connection,
+        epoch_id: int,
+        drop: bool = False,
+        tables: Iterable[Table] = PARTITIONED_TABLES,
+    ) -> None:
+        """
+        Detach (and optionally drop) partitions of the closed epoch.
+
+        Parameters
+            conn: Connection in autocommit mode.
+            epoch_id: The epoch id to close.
+            drop: Drop the detached partitions.
+            tables: Partitioned tables to detach the partitions from.
+        """
+        if epoch_id >= get_epoch_id():
+            raise ValueError(f"Epoch {epoch_id} is not closed yet")
+
+        for table in tables:
+            partition = f"{table.schema}.{self.partition_name(table, epoch_id)}"
+            if self.partition_state(conn, table, partition) == PartitionState.ATTACHED:
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table.fullname} "
+                        f"DETACH PARTITION {partition} CONCURRENTLY"
+                    )
+                )
+                logger.info("Detached partition %s", partition)
+
+            if drop:
+                conn.execute(text(f"DROP TABLE IF EXISTS {partition}"))
+                logger.info("Dropped partition %s", partition)
+
+    async def ensure_upcoming(self) -> None:
+        """Create partitions of the current and upcoming epochs if missing."""
+        if init.DB_ENGINE is None:
+            raise RuntimeError(
+                "Database is not initialized. Please build the app first."
+            )
+
+        epoch_ids = self.upcoming_epochs()
+        async with init.DB_ENGINE.begin() as conn:
+            await conn.run_sync(self.create_partitions, epoch_ids)
+
+        logger.debug(
+            "Partitions ensured for epochs %s-%s", epoch_ids.start, epoch_ids.stop - 1
+        )
+
+    def start(self) -> None:
+        """Start the background task creating upcoming partitions."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(
+                self._maintenance_loop(),
+                name="partition_maintenance",
+                context=Context(),
+            )
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            try:
+                await self.ensure_upcoming()
+            except Exception:
+                logger.error("Partition maintenance failed. Details:\n%s", format_exc())
+            await asyncio.sleep(self.check_interval)
+
+    async def close(self) -> None:
+        """Stop the background task."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+PARTITIONS = PartitionManager()
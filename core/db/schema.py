@@ -2,7 +2,19 @@ from uuid import UUID, uuid4
 
 from core.schema.ai import MessageRole
 from core.schema.db.fields import UserStatus
-from sqlalchemy import DateTime, Enum, ForeignKey, Integer, Text, text
+from sqlalchemy import (
+    Computed,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    Text,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -17,7 +29,16 @@ class User(DBase):
     """User model."""
 
     __tablename__ = "users"
-    __table_args__ = {"schema": "raw"}
+    __table_args__ = (
+        # Trigram index for substring and fuzzy username search (pg_trgm)
+        Index(
+            "ix_users_tg_username_trgm",
+            "tg_username",
+            postgresql_using="gin",
+            postgresql_ops={"tg_username": "gin_trgm_ops"},
+        ),
+        {"schema": "raw"},
+    )
 
     id: Mapped[int] = mapped_column(
         primary_key=True, autoincrement=True, comment="Unique user id"
@@ -51,7 +72,7 @@ class User(DBase):
     conversation: Mapped[list["Conversation"]] = relationship(
         "Conversation", back_populates="user", cascade="all, delete-orphan"
     )
-    score: Mapped["Score"] = relationship(
+    scores: Mapped[list["Score"]] = relationship(
         "Score", back_populates="user", cascade="all, delete-orphan"
     )
 
@@ -78,6 +99,11 @@ class Conversation(DBase):
     summary: Mapped[str | None] = mapped_column(
         Text, nullable=True, comment="Conversation summary"
     )
+    summary_until: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="Created at of the last message folded into the summary (UTC)",
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=text("CURRENT_TIMESTAMP"),
@@ -107,7 +133,15 @@ class ConversationMessage(DBase):
     """Database model for conversation message."""
 
     __tablename__ = "conversation_messages"
-    __table_args__ = {"schema": "raw"}
+    __table_args__ = (
+        Index(
+            "ix_conversation_messages_message_tsv",
+            "message_tsv",
+            postgresql_using="gin",
+        ),
+        # Partitioned by epoch, see core.db.partition
+        {"schema": "raw", "postgresql_partition_by": "RANGE (epoch_id)"},
+    )
 
     id: Mapped[UUID] = mapped_column(
         PGUUID(as_uuid=True),
@@ -115,6 +149,9 @@ class ConversationMessage(DBase):
         default=uuid4,
         comment="Unique message id",
     )
+    epoch_id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, comment="Epoch id (partition key)"
+    )
     conversation_id: Mapped[UUID] = mapped_column(
         PGUUID(as_uuid=True),
         ForeignKey("raw.conversations.id"),
@@ -128,6 +165,12 @@ class ConversationMessage(DBase):
     message: Mapped[str] = mapped_column(
         Text, nullable=False, comment="Message content"
     )
+    message_tsv: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed("to_tsvector('simple', message)", persisted=True),
+        deferred=True,
+        comment="Full-text search vector of the message (generated)",
+    )
     tokens: Mapped[int] = mapped_column(
         Integer, default=0, comment="Conversation used tokens"
     )
@@ -144,14 +187,19 @@ class ConversationMessage(DBase):
     )
 
     def __repr__(self) -> str:
-        return f"ConversationMessage(id={self.id}, conversation_id={self.conversation_id}, role={self.role}, created_at={self.created_at})"
+        return f"ConversationMessage(id={self.id}, conversation_id={self.conversation_id}, epoch_id={self.epoch_id}, role={self.role}, created_at={self.created_at})"
 
 
 class Score(DBase):
-    """Database model for score."""
+    """Database model for user score aggregate per epoch."""
 
     __tablename__ = "scores"
-    __table_args__ = {"schema": "raw"}
+    __table_args__ = (
+        UniqueConstraint("user_id", "epoch_id", name="uq_scores_user_id_epoch_id"),
+        Index("ix_scores_epoch_id_best_score", "epoch_id", text("best_score DESC")),
+        # Partitioned by epoch, see core.db.partition
+        {"schema": "raw", "postgresql_partition_by": "RANGE (epoch_id)"},
+    )
 
     id: Mapped[int] = mapped_column(
         primary_key=True, autoincrement=True, comment="Unique score id"
@@ -163,7 +211,21 @@ class Score(DBase):
         index=True,
         comment="User id from users table",
     )
-    score: Mapped[int] = mapped_column(Integer, default=0, comment="Score value")
+    epoch_id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, comment="Epoch id the score belongs to"
+    )
+    best_score: Mapped[int] = mapped_column(
+        Integer, default=0, comment="Best submission score in the epoch"
+    )
+    score_sum: Mapped[int] = mapped_column(
+        BigInteger, default=0, comment="Sum of submission scores in the epoch"
+    )
+    score_count: Mapped[int] = mapped_column(
+        Integer, default=0, comment="Number of submissions in the epoch"
+    )
+    last_score: Mapped[int] = mapped_column(
+        Integer, default=0, comment="Last submission score in the epoch"
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=text("CURRENT_TIMESTAMP"),
@@ -178,7 +240,129 @@ class Score(DBase):
     )
 
     # Relationships
-    user: Mapped["User"] = relationship("User", back_populates="score")
+    user: Mapped["User"] = relationship("User", back_populates="scores")
+
+    def __repr__(self) -> str:
+        return f"Score(id={self.id}, user_id={self.user_id}, epoch_id={self.epoch_id}, best_score={self.best_score}, last_score={self.last_score})"
+
+
+class ScoreSubmission(DBase):
+    """Database model for a single scored submission (append-only)."""
+
+    __tablename__ = "score_submissions"
+    # Partitioned by epoch, see core.db.partition
+    __table_args__ = {"schema": "raw", "postgresql_partition_by": "RANGE (epoch_id)"}
+
+    id: Mapped[int] = mapped_column(
+        BigInteger, primary_key=True, autoincrement=True, comment="Unique submission id"
+    )
+    user_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("raw.users.id"),
+        nullable=False,
+        index=True,
+        comment="User id from users table",
+    )
+    epoch_id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, comment="Epoch id of the submission"
+    )
+    score: Mapped[int] = mapped_column(
+        Integer, nullable=False, comment="Supervisor score"
+    )
+    simhash: Mapped[int | None] = mapped_column(
+        BigInteger,
+        nullable=True,
+        comment="SimHash of the normalized message (near-duplicate detection)",
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=text("CURRENT_TIMESTAMP"),
+        comment="Submission created at (UTC)",
+    )
+
+    def __repr__(self) -> str:
+        return f"ScoreSubmission(id={self.id}, user_id={self.user_id}, epoch_id={self.epoch_id}, score={self.score})"
+
+
+class ScoreDistribution(DBase):
+    """Database model for number of scored submissions by epoch and score."""
+
+    __tablename__ = "score_distribution"
+    __table_args__ = {"schema": "raw"}
+
+    epoch_id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, comment="Epoch id of the submissions"
+    )
+    score: Mapped[int] = mapped_column(
+        Integer, primary_key=True, comment="Supervisor score"
+    )
+    submissions: Mapped[int] = mapped_column(
+        BigInteger, default=0, comment="Number of submissions with the score"
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=text("CURRENT_TIMESTAMP"),
+        onupdate=text("CURRENT_TIMESTAMP"),
+        comment="Distribution updated at (UTC)",
+    )
+
+    def __repr__(self) -> str:
+        return f"ScoreDistribution(epoch_id={self.epoch_id}, score={self.score}, submissions={self.submissions})"
+
+
+class TokenUsage(DBase):
+    """Database model for LLM token usage per user and epoch."""
+
+    __tablename__ = "token_usage"
+    __table_args__ = {"schema": "raw"}
+
+    user_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("raw.users.id"),
+        primary_key=True,
+        comment="User id from users table",
+    )
+    epoch_id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, comment="Epoch id of the usage"
+    )
+    requests: Mapped[int] = mapped_column(
+        Integer, default=0, comment="Number of LLM requests"
+    )
+    request_tokens: Mapped[int] = mapped_column(
+        BigInteger, default=0, comment="Prompt tokens used"
+    )
+    response_tokens: Mapped[int] = mapped_column(
+        BigInteger, default=0, comment="Completion tokens used"
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=text("CURRENT_TIMESTAMP"),
+        onupdate=text("CURRENT_TIMESTAMP"),
+        comment="Usage updated at (UTC)",
+    )
+
+    def __repr__(self) -> str:
+        return f"TokenUsage(user_id={self.user_id}, epoch_id={self.epoch_id}, request_tokens={self.request_tokens}, response_tokens={self.response_tokens})"
+
+
+class RateLimit(DBase):
+    """Database model for token buckets of the request rate limiter."""
+
+    __tablename__ = "rate_limits"
+    # Buckets are short-lived state, so they skip the WAL
+    __table_args__ = {"schema": "raw", "prefixes": ["UNLOGGED"]}
+
+    tg_id: Mapped[int] = mapped_column(
+        BigInteger, primary_key=True, autoincrement=False, comment="Telegram user id"
+    )
+    tokens: Mapped[float] = mapped_column(
+        Float, nullable=False, comment="Tokens left in the bucket"
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=text("CURRENT_TIMESTAMP"),
+        comment="Bucket updated at (UTC)",
+    )
 
     def __repr__(self) -> str:
-        return f"Score(id={self.id}, user_id={self.user_id}, score={self.score}, created_at={self.created_at})"
+        return f"RateLimit(tg_id={self.tg_id}, tokens={self.tokens})"
@@ -0,0 +1,215 @@
+import asyncio
+import math
+from collections import Counter
+from contextvars import Context
+from traceback import format_exc
+
+from core.db.init import commit, get_session
+from core.db.schema import ScoreDistribution
+from core.logger import get_logger
+from core.settings import settings
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+logger = get_logger(__name__)
+
+MAX_SCORE = 100
+
+
+class ScoreHistogram:
+    """
+    Exact distribution of integer scores in [0, 100].
+
+    Scores have only 101 possible values, so a histogram is exact and as small as
+    a quantile sketch (e.g. t-digest). Any quantile or percentile is one pass over
+    101 buckets.
+
+    Attributes
+        counts (list[int]): Number of values by score.
+        total (int): Number of values.
+    """
+
+    def __init__(self):
+        self.counts: list[int] = [0] * (MAX_SCORE + 1)
+        self.total = 0
+
+    @staticmethod
+    def clamp(score: int) -> int:
+        """Clamp the score to [0, 100]."""
+        return max(0, min(MAX_SCORE, score))
+
+    def add(self, score: int, n: int = 1) -> None:
+        """Add n values of the score."""
+        self.counts[self.clamp(score)] += n
+        self.total += n
+
+    def remove(self, score: int, n: int = 1) -> None:
+        """Remove n values of the score."""
+        self.counts[self.clamp(score)] -= n
+        self.total -= n
+
+    def count_above(self, score: int) -> int:
+        """Number of values greater than the score."""
+        return sum(self.counts[self.clamp(score) + 1 :])
+
+    def quantile(self, q: float) -> int | None:
+        """
+        Get the q-quantile (nearest rank), e.g. q=0.9 for p90.
+
+        Returns
+            The smallest score with at least q of the values at or below it,
+            or None if there are no values.
+        """
+        if not self.total:
+            return None
+
+        target = max(1, math.ceil(q * self.total))
+        cumulative = 0
+        for score, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return score
+        return MAX_SCORE
+
+    def percentile(self, score: int) -> float | None:
+        """Get percentage of values below the score, or None if there are no values."""
+        if not self.total:
+            return None
+        below = sum(self.counts[: self.clamp(score)])
+        return 100 * below / self.total
+
+
+class ScoreStats:
+    """
+    Distribution of supervisor scores per epoch.
+
+    Every scored submission is added in memory. Increments are persisted
+    periodically as deltas (`submissions = submissions + delta`), so several
+    processes can write to the same distribution.
+
+    Attributes
+        epochs (dict[int, ScoreHistogram]): Score distribution by epoch id.
+        pending (Counter): Increments by (epoch id, score) not persisted yet.
+        flush_interval (int): Time between flushes in seconds.
+        lock (asyncio.Lock): Serializes flushes and loads.
+        task (asyncio.Task | None): Background task flushing the increments.
+    """
+
+    def __init__(self, flush_interval: int = settings.SCORE_STATS_FLUSH_INTERVAL):
+        self.epochs: dict[int, ScoreHistogram] = {}
+        self.pending: Counter[tuple[int, int]] = Counter()
+        self.flush_interval = flush_interval
+        self.lock = asyncio.Lock()
+        self.task: asyncio.Task | None = None
+
+    def get(self, epoch_id: int) -> ScoreHistogram:
+        """Get score distribution of the epoch (empty if there is nothing yet)."""
+        histogram = self.epochs.get(epoch_id)
+        if histogram is None:
+            histogram = self.epochs[epoch_id] = ScoreHistogram()
+        return histogram
+
+    def add(self, epoch_id: int, score: int) -> None:
+        """Add a scored submission."""
+        score = ScoreHistogram.clamp(score)
+        self.get(epoch_id).add(score)
+        self.pending[(epoch_id, score)] += 1
+
+    async def load(self, epoch_id: int) -> ScoreHistogram:
+        """Load score distribution of the epoch from the database."""
+        async with self.lock:
+            histogram = ScoreHistogram()
+
+            async for session in get_session():
+                stmt = select(
+                    ScoreDistribution.score, ScoreDistribution.submissions
+                ).where(ScoreDistribution.epoch_id == epoch_id)
+                result = await session.execute(stmt)
+
+                for score, submissions in result:
+                    histogram.add(score, submissions)
+
+            # Increments of this process that are not persisted yet
+            for (pending_epoch_id, score), n in self.pending.items():
+                if pending_epoch_id == epoch_id:
+                    histogram.add(score, n)
+
+            self.epochs[epoch_id] = histogram
+
+        logger.info(
+            "Score distribution of epoch %s loaded: %s submission(s)",
+            epoch_id,
+            histogram.total,
+        )
+        return histogram
+
+    async def flush(self) -> None:
+        """Persist pending increments."""
+        async with self.lock:
+            if not self.pending:
+                return
+            deltas, self.pending = self.pending, Counter()
+
+            try:
+                stmt = insert(ScoreDistribution).values(
+                    [
+                        {"epoch_id": epoch_id, "score": score, "submissions": n}
+                        for (epoch_id, score), n in sorted(deltas.items())
+                    ]
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[
+                        ScoreDistribution.epoch_id,
+                        ScoreDistribution.score,
+                    ],
+                    set_={
+                        "submissions": ScoreDistribution.submissions
+                        + stmt.excluded.submissions,
+                        "updated_at": func.now(),
+                    },
+                )
+
+                async for session in get_session():
+                    await session.execute(stmt)
+                    await commit(session)
+            except Exception:
+                # Keep the increments for the next flush
+                self.pending.update(deltas)
+                raise
+
+        logger.debug("Score distribution flushed: %s bucket(s)", len(deltas))
+
+    def start(self) -> None:
+        """Start the background task flushing the increments."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(
+                self._flush_loop(), name="score_stats_flush", context=Context()
+            )
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.error(
+                    "Score distribution flush failed. Details:\n%s", format_exc()
+                )
+
+    async def close(self) -> None:
+        """Stop the background task and persist the rest of the increments."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        try:
+            await self.flush()
+        except Exception:
+            logger.error("Score distribution flush failed. Details:\n%s", format_exc())
+
+
+SCORE_STATS = ScoreStats()
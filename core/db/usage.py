@@ -0,0 +1,243 @@
+import asyncio
+import time
+from contextvars import Context
+from dataclasses import dataclass
+from traceback import format_exc
+
+from core.db.cache import TTLCache
+from core.db.init import commit, get_session
+from core.db.schema import TokenUsage
+from core.logger import get_logger
+from core.schema.db import QuotaStatus
+from core.settings import settings
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+logger = get_logger(__name__)
+
+
+@dataclass(slots=True)
+class Usage:
+    """Token usage counters."""
+
+    requests: int = 0
+    request_tokens: int = 0
+    response_tokens: int = 0
+
+    @property
+    def tokens(self) -> int:
+        """Total number of tokens."""
+        return self.request_tokens + self.response_tokens
+
+    def add(self, other: "Usage") -> None:
+        self.requests += other.requests
+        self.request_tokens += other.request_tokens
+        self.response_tokens += other.response_tokens
+
+
+class UsageMeter:
+    """
+    Metering of LLM token usage per user and epoch with quotas.
+
+    Usage is counted in memory and flushed to Postgres in batches as deltas
+    (`tokens = tokens + delta`), so several processes can meter the same user.
+    Totals are loaded from Postgres on the first quota check and reloaded after
+    the TTL, so the usage of other processes becomes visible too.
+
+    Attributes
+        totals (TTLCache): Total usage by (user id, epoch id).
+        pending (dict[tuple[int, int], Usage]): Usage not flushed yet.
+        last_request (TTLCache): Monotonic time of the last request by user id.
+        flush_interval (int): Time between flushes in seconds.
+        lock (asyncio.Lock): Serializes flushes.
+        flushes (int): Number of started flushes.
+        flushed (asyncio.Event): Set while no flush is running.
+        loading (dict[tuple[int, int], asyncio.Future]): Loads in progress, so
+            concurrent quota checks of one user share a single query.
+        task (asyncio.Task | None): Background task flushing the usage.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = settings.USAGE_CACHE_MAX_SIZE,
+        ttl: int = settings.USAGE_CACHE_TTL,
+        flush_interval: int = settings.USAGE_FLUSH_INTERVAL,
+    ):
+        self.totals = TTLCache(maxsize, ttl)
+        self.pending: dict[tuple[int, int], Usage] = {}
+        self.last_request = TTLCache(maxsize, settings.USAGE_SOFT_QUOTA_COOLDOWN)
+        self.flush_interval = flush_interval
+        self.lock = asyncio.Lock()
+        self.flushes = 0
+        self.flushed = asyncio.Event()
+        self.flushed.set()
+        self.loading: dict[tuple[int, int], asyncio.Future] = {}
+        self.task: asyncio.Task | None = None
+
+    def add(
+        self, user_id: int, epoch_id: int, request_tokens: int, response_tokens: int
+    ) -> None:
+        """Count usage of one LLM request."""
+        usage = Usage(1, request_tokens, response_tokens)
+        self.pending.setdefault((user_id, epoch_id), Usage()).add(usage)
+
+        total = self.totals.get((user_id, epoch_id))
+        if total is not None:
+            total.add(usage)
+
+    async def get_usage(self, user_id: int, epoch_id: int) -> Usage:
+        """Get total usage of the user in the epoch."""
+        key = (user_id, epoch_id)
+        total = self.totals.get(key)
+        while total is None and key in self.loading:
+            # Another update is loading the same usage, wait for it instead
+            await asyncio.wait([self.loading[key]])
+            total = self.totals.get(key)
+        if total is not None:
+            return total
+
+        done = self.loading[key] = asyncio.get_running_loop().create_future()
+        try:
+            return await self._load(user_id, epoch_id)
+        finally:
+            del self.loading[key]
+            done.set_result(None)
+
+    async def _load(self, user_id: int, epoch_id: int) -> Usage:
+        """Load total usage from the database without blocking other users or flushes."""
+        while True:
+            # Deltas of a flush running during the read could be counted twice or
+            # missed, so the read is repeated if a flush started meanwhile
+            await self.flushed.wait()
+            flushes = self.flushes
+            total = await self._read(user_id, epoch_id)
+            if flushes == self.flushes and self.flushed.is_set():
+                break
+
+        # Usage of this process that is not flushed yet
+        key = (user_id, epoch_id)
+        if key in self.pending:
+            total.add(self.pending[key])
+
+        self.totals.set(key, total)
+        return total
+
+    @staticmethod
+    async def _read(user_id: int, epoch_id: int) -> Usage:
+        total = Usage()
+        async for session in get_session():
+            stmt = select(
+                TokenUsage.requests,
+                TokenUsage.request_tokens,
+                TokenUsage.response_tokens,
+            ).where(TokenUsage.user_id == user_id, TokenUsage.epoch_id == epoch_id)
+            row = (await session.execute(stmt)).one_or_none()
+            if row is not None:
+                total.add(Usage(*row))
+        return total
+
+    async def check_quota(self, user_id: int, epoch_id: int) -> QuotaStatus:
+        """
+        Check the user token quota and register the request.
+
+        Over the soft quota a user may send one request per cooldown, over the
+        hard quota requests are rejected until the next epoch.
+
+        Returns
+            Quota status of the request.
+        """
+        hard = settings.USAGE_HARD_QUOTA_TOKENS
+        soft = settings.USAGE_SOFT_QUOTA_TOKENS
+        if not hard and not soft:
+            return QuotaStatus.OK
+
+        tokens = (await self.get_usage(user_id, epoch_id)).tokens
+        if hard and tokens >= hard:
+            return QuotaStatus.HARD
+
+        if soft and tokens >= soft:
+            if self.last_request.get(user_id) is not None:
+                return QuotaStatus.SOFT
+            self.last_request.set(user_id, time.monotonic())
+
+        return QuotaStatus.OK
+
+    async def flush(self) -> None:
+        """Persist pending usage in one statement."""
+        async with self.lock:
+            if not self.pending:
+                return
+            deltas, self.pending = self.pending, {}
+            self.flushes += 1
+            self.flushed.clear()
+
+            try:
+                stmt = insert(TokenUsage).values(
+                    [
+                        {
+                            "user_id": user_id,
+                            "epoch_id": epoch_id,
+                            "requests": usage.requests,
+                            "request_tokens": usage.request_tokens,
+                            "response_tokens": usage.response_tokens,
+                        }
+                        for (user_id, epoch_id), usage in sorted(deltas.items())
+                    ]
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[TokenUsage.user_id, TokenUsage.epoch_id],
+                    set_={
+                        "requests": TokenUsage.requests + stmt.excluded.requests,
+                        "request_tokens": TokenUsage.request_tokens
+                        + stmt.excluded.request_tokens,
+                        "response_tokens": TokenUsage.response_tokens
+                        + stmt.excluded.response_tokens,
+                        "updated_at": func.now(),
+                    },
+                )
+
+                async for session in get_session():
+                    await session.execute(stmt)
+                    await commit(session)
+            except Exception:
+                # Keep the usage for the next flush
+                for key, usage in deltas.items():
+                    self.pending.setdefault(key, Usage()).add(usage)
+                raise
+            finally:
+                self.flushed.set()
+
+        logger.debug("Token usage flushed for %s user(s)", len(deltas))
+
+    def start(self) -> None:
+        """Start the background task flushing the usage."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(
+                self._flush_loop(), name="usage_flush", context=Context()
+            )
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.error("Token usage flush failed. Details:\n%s", format_exc())
+
+    async def close(self) -> None:
+        """Stop the background task and persist the rest of the usage."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        try:
+            await self.flush()
+        except Exception:
+            logger.error("Token usage flush failed. Details:\n%s", format_exc())
+
+
+USAGE = UsageMeter()
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+from core.settings import settings
+
+
+def get_epoch_id(dt: datetime | None = None) -> int:
+    """
+    Get epoch id for the given date and time.
+
+    Epochs are numbered from 1, starting at `APP_EPOCH_START`
+    and lasting `APP_EPOCH_LENGTH_DAYS` days each.
+
+    Parameters
+        dt: Date and time (UTC). Current time if not set.
+
+    Returns
+        Epoch id.
+    """
+    dt = dt or settings.NOW_DT_UTC()
+    return (dt - settings.APP_EPOCH_START).days // settings.APP_EPOCH_LENGTH_DAYS + 1
+
+
+def get_epoch_bounds(epoch_id: int) -> tuple[datetime, datetime]:
+    """Get start (inclusive) and end (exclusive) of the epoch."""
+    length = timedelta(days=settings.APP_EPOCH_LENGTH_DAYS)
+    start = settings.APP_EPOCH_START + length * (epoch_id - 1)
+    return start, start + length
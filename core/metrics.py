@@ -0,0 +1,364 @@
+import asyncio
+import math
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable
+from traceback import format_exc
+from typing import TypeVar
+
+from core.logger import get_logger
+from core.settings import settings
+
+logger = get_logger(__name__)
+
+# Seconds, from a fast DB query to a slow LLM call
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = tuple[str, ...]
+Callback = Callable[[], float | dict[Labels, float]]
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [
+        '{}="{}"'.format(
+            name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    Base metric with optional labels (Prometheus text format).
+
+    Attributes
+        name (str): Metric name.
+        help (str): Metric description.
+        labelnames (Labels): Label names.
+        callback (Callback | None): Reads the value(s) on collection instead of
+            keeping them, e.g. for counters kept by other components.
+        values (dict[Labels, float]): Values by label values.
+    """
+
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        callback: Callback | None = None,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.callback = callback
+        self.values: dict[Labels, float] = {}
+
+    def _key(self, labels: dict[str, str]) -> Labels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> list[str]:
+        values = self.values
+        if self.callback is not None:
+            value = self.callback()
+            values = value if isinstance(value, dict) else {(): value}
+
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+    def collect(self) -> list[str]:
+        """Render the metric in Prometheus text format."""
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(),
+        ]
+
+
+class Counter(Metric):
+    """Monotonic counter."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that goes up and down."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+
+    Attributes
+        buckets (tuple[float, ...]): Upper bounds of the buckets.
+        counts (dict[Labels, list[int]]): Observations per bucket (last is +Inf).
+        sums (dict[Labels, float]): Sum of the observed values.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts: dict[Labels, list[int]] = {}
+        self.sums: dict[Labels, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        counts = self.counts.get(key)
+        if counts is None:
+            counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+            self.sums[key] = 0.0
+
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, counts in self.counts.items():
+            total = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                total += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {total}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self.sums[key])}")
+            lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class MetricsRegistry:
+    """
+    In-process metrics registry.
+
+    NOTE: Metrics are per process, every bot process serves its own endpoint.
+
+    Attributes
+        prefix (str): Prefix of all metric names.
+        metrics (dict[str, Metric]): Registered metrics by name.
+    """
+
+    def __init__(self, prefix: str = "aiko_"):
+        self.prefix = prefix
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        """Register the metric under the prefixed name."""
+        metric.name = self.prefix + metric.name
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        callback: Callback | None = None,
+    ) -> Counter:
+        return self.register(Counter(name, help, labelnames, callback))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        callback: Callback | None = None,
+    ) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, callback))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text format."""
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                lines.extend(metric.collect())
+            except Exception:
+                logger.error(
+                    "Error collecting metric %s. Details:\n%s",
+                    metric.name,
+                    format_exc(),
+                )
+        return "\n".join(lines) + "\n"
+
+
+ReadinessCheck = Callable[[], Awaitable[bool]]
+
+
+class MetricsServer:
+    """
+    Minimal HTTP server for the metrics and the health probes.
+
+    Routes
+        /metrics: Metrics in Prometheus text format.
+        /healthz: Liveness. Answered by the event loop itself, so a blocked loop
+            fails it.
+        /readyz: Readiness. All registered checks must pass (e.g. the database).
+
+    Attributes
+        registry (MetricsRegistry): The metrics.
+        host (str): Listen host.
+        port (int): Listen port.
+        checks (dict[str, ReadinessCheck]): Readiness checks by name.
+        ready (bool): Set when the application has started.
+        server (asyncio.Server | None): The running server.
+    """
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        host: str = settings.METRICS_HOST,
+        port: int = settings.METRICS_PORT,
+    ):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.checks: dict[str, ReadinessCheck] = {}
+        self.ready = False
+        self.server: asyncio.Server | None = None
+
+    def add_check(self, name: str, check: ReadinessCheck) -> None:
+        """Add a readiness check."""
+        self.checks[name] = check
+
+    async def readiness(self) -> tuple[bool, str]:
+        """Run the readiness checks."""
+        if not self.ready:
+            return False, "starting"
+
+        failed = []
+        for name, check in self.checks.items():
+            try:
+                ok = await asyncio.wait_for(
+                    check(), timeout=settings.METRICS_READINESS_TIMEOUT
+                )
+            except Exception:
+                logger.warning("Readiness check %s failed:\n%s", name, format_exc())
+                ok = False
+            if not ok:
+                failed.append(name)
+
+        if failed:
+            return False, "failed: " + ", ".join(failed)
+        return True, "ok"
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Skip the headers, the routes do not need them
+            while (await asyncio.wait_for(reader.readline(), timeout=5)).strip():
+                pass
+
+            parts = request.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) > 1 else ""
+            content_type = "text/plain; charset=utf-8"
+
+            if path == "/metrics":
+                status, body = 200, self.registry.render()
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/healthz":
+                status, body = 200, "ok\n"
+            elif path == "/readyz":
+                ready, reason = await self.readiness()
+                status, body = (200 if ready else 503), reason + "\n"
+            else:
+                status, body = 404, "not found\n"
+
+            data = body.encode()
+            reasons = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}
+            writer.write(
+                f"HTTP/1.1 {status} {reasons[status]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                "Connection: close\r\n\r\n".encode()
+                + data
+            )
+            await writer.drain()
+        except Exception:
+            logger.debug("Metrics request failed:\n%s", format_exc())
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        """
+        Start serving.
+
+        A busy port (e.g. a second bot process on the host) is logged and the
+        application runs without the endpoint.
+        """
+        try:
+            self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        except OSError as exc:
+            logger.error(
+                "Metrics server could not listen on %s:%s. %s: %s",
+                self.host,
+                self.port,
+                exc.__class__.__name__,
+                str(exc),
+            )
+            return
+        logger.info("Metrics server started on %s:%s", self.host, self.port)
+
+    async def close(self) -> None:
+        """Stop serving."""
+        self.ready = False
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+
+METRICS = MetricsRegistry()
+METRICS_SERVER = MetricsServer(METRICS)
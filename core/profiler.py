@@ -0,0 +1,225 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from traceback import format_exc
+from typing import Any, Iterator
+
+from core.logger import get_logger
+from core.metrics import METRICS
+from core.settings import settings
+
+logger = get_logger(__name__)
+
+UPDATE_SECONDS = METRICS.histogram(
+    "update_seconds", "Update handling latency by handler (profiled)", ("handler",)
+)
+STAGE_SECONDS = METRICS.histogram(
+    "update_stage_seconds", "Time spent in the update stages (profiled)", ("stage",)
+)
+SLOW_UPDATES = METRICS.counter(
+    "slow_updates_total", "Updates slower than the profiler threshold", ("handler",)
+)
+
+
+def await_chain(task: asyncio.Task, max_depth: int) -> list[str]:
+    """
+    Get the await chain of the task, outermost first.
+
+    Unlike `Task.get_stack`, it follows the awaited coroutines, so a suspended
+    task shows where exactly it waits (pool, DB, HTTP call).
+    """
+    frames = []
+    awaitable: Any = task.get_coro()
+    while awaitable is not None and len(frames) < max_depth:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(
+            awaitable, "gi_frame", None
+        )
+        if frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_filename}:{frame.f_lineno}:{code.co_name}")
+        awaitable = (
+            getattr(awaitable, "cr_await", None)
+            or getattr(awaitable, "gi_yieldfrom", None)
+            or getattr(awaitable, "ag_await", None)
+        )
+    return frames
+
+
+@dataclass(slots=True)
+class UpdateProfile:
+    """
+    Profile of one update.
+
+    Attributes
+        handler (str): Handler name.
+        update_id (int): Telegram update id.
+        started (float): Start time (monotonic).
+        duration (float | None): Duration in seconds, once finished.
+        stages (dict[str, list[float]]): Total seconds and calls by stage.
+        samples (Counter[str]): Sampled await chains (";"-joined frames).
+    """
+
+    handler: str
+    update_id: int
+    started: float = field(default_factory=time.perf_counter)
+    duration: float | None = None
+    stages: dict[str, list[float]] = field(default_factory=dict)
+    samples: Counter[str] = field(default_factory=Counter)
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        if self.duration is not None:
+            # Side effects of the update that outlive it (pipeline tasks)
+            return
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += 1
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "handler": self.handler,
+            "update_id": self.update_id,
+            "duration": self.duration,
+            "stages": {
+                name: {"seconds": seconds, "calls": calls}
+                for name, (seconds, calls) in sorted(
+                    self.stages.items(), key=lambda item: item[1][0], reverse=True
+                )
+            },
+            "samples": [
+                {"count": count, "stack": stack.split(";")}
+                for stack, count in self.samples.most_common()
+            ],
+        }
+
+
+CURRENT_PROFILE: ContextVar[UpdateProfile | None] = ContextVar(
+    "current_profile", default=None
+)
+
+
+class UpdateProfiler:
+    """
+    Opt-in profiler of the update handlers.
+
+    Records per-stage timings (the tracing spans) of every update. Once an update
+    runs longer than the threshold, its task await chain is sampled by event loop
+    callbacks, so fast updates pay nothing for sampling. Profiles of slow updates
+    are saved as JSON files, and only the newest `max_files` are kept.
+
+    Attributes
+        enabled (bool): Profile the updates.
+        threshold (float): Latency of a slow update in seconds.
+        interval (float): Seconds between stack samples.
+        max_depth (int): Max frames of a sample.
+        directory (Path): Directory of the slow update profiles.
+        max_files (int): Max number of kept profiles.
+        tasks (set[asyncio.Task]): Profiles being saved.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.PROFILER_ENABLED,
+        threshold: float = settings.PROFILER_SLOW_THRESHOLD,
+        interval: float = settings.PROFILER_SAMPLE_INTERVAL,
+        max_depth: int = settings.PROFILER_MAX_STACK_DEPTH,
+        directory: Path = settings.PROFILER_DIR,
+        max_files: int = settings.PROFILER_MAX_FILES,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.interval = interval
+        self.max_depth = max_depth
+        self.directory = directory
+        self.max_files = max_files
+        self.tasks: set[asyncio.Task] = set()
+
+    @staticmethod
+    def record_stage(name: str, seconds: float) -> None:
+        """Add the stage time to the profile of the current update."""
+        profile = CURRENT_PROFILE.get()
+        if profile is not None:
+            profile.add_stage(name, seconds)
+
+    def _sample(
+        self,
+        profile: UpdateProfile,
+        task: asyncio.Task,
+        handles: list[asyncio.TimerHandle],
+    ) -> None:
+        if task.done() or profile.duration is not None:
+            return
+        profile.samples[";".join(await_chain(task, self.max_depth))] += 1
+        handles[0] = asyncio.get_running_loop().call_later(
+            self.interval, self._sample, profile, task, handles
+        )
+
+    @contextmanager
+    def profile(self, handler: str, update_id: int) -> Iterator[UpdateProfile | None]:
+        """Profile the update handled in the current task."""
+        task = asyncio.current_task()
+        if not self.enabled or task is None:
+            yield None
+            return
+
+        profile = UpdateProfile(handler, update_id)
+        token = CURRENT_PROFILE.set(profile)
+        # The sampler starts only if the update gets slow. Each sample schedules
+        # the next one in place of the handle, so it can be cancelled at the end
+        handles: list[asyncio.TimerHandle] = []
+        handles.append(
+            asyncio.get_running_loop().call_later(
+                self.threshold, self._sample, profile, task, handles
+            )
+        )
+        try:
+            yield profile
+        finally:
+            handles[0].cancel()
+            CURRENT_PROFILE.reset(token)
+            self._finish(profile)
+
+    def _finish(self, profile: UpdateProfile) -> None:
+        profile.duration = time.perf_counter() - profile.started
+
+        UPDATE_SECONDS.observe(profile.duration, handler=profile.handler)
+        for name, (seconds, _) in profile.stages.items():
+            STAGE_SECONDS.observe(seconds, stage=name)
+
+        if profile.duration < self.threshold:
+            return
+
+        SLOW_UPDATES.inc(handler=profile.handler)
+        logger.warning(
+            "Slow update %s (%s) took %.2fs",
+            profile.update_id,
+            profile.handler,
+            profile.duration,
+        )
+        task = asyncio.create_task(asyncio.to_thread(self.save, profile))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def save(self, profile: UpdateProfile) -> Path | None:
+        """Save the profile and remove the oldest ones over the limit."""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%S%f")
+            path = self.directory / f"slow-{stamp}-{profile.update_id}.json"
+            path.write_text(json.dumps(profile.to_dict(), indent=2), encoding="utf-8")
+
+            files = sorted(self.directory.glob("slow-*.json"))
+            for old in files[: max(len(files) - self.max_files, 0)]:
+                old.unlink(missing_ok=True)
+            return path
+        except Exception:
+            logger.error("Error saving update profile. Details:\n%s", format_exc())
+            return None
+
+
+PROFILER = UpdateProfiler()
@@ -1,10 +1,15 @@
 from core.schema.ai.fields import MessageRole, LLM, Provider
-from core.schema.ai.models import AgentDependencies, SupervisorResponseModel
+from core.schema.ai.models import (
+    AgentDependencies,
+    AgentResponse,
+    SupervisorResponseModel,
+)
 
 __all__ = [
     "MessageRole",
     "LLM",
     "Provider",
     "AgentDependencies",
+    "AgentResponse",
     "SupervisorResponseModel",
 ]
@@ -13,6 +13,7 @@ class LLM(CEnum):
     """Available LLMs."""
 
     GPT_5_MINI = "gpt-5-mini"
+    GPT_5_NANO = "gpt-5-nano"
 
 
 class Provider(CEnum):
@@ -13,6 +13,20 @@ class AgentDependencies:
     username: str
     conversation_id: UUID
     message_history: list[ModelMessage] = field(default_factory=list)
+    summary: str | None = None  # Summary of the turns before the message history
+    recalled: list[tuple[str, str]] = field(
+        default_factory=list
+    )  # Relevant past turns (user message, Aiko's response)
+
+
+@dataclass
+class AgentResponse:
+    """Agent response with the token usage reported by the provider."""
+
+    text: str
+    request_tokens: int = 0
+    response_tokens: int = 0
+    ok: bool = True  # False if the agent failed and the text is the error message
 
 
 class SupervisorResponseModel(BaseModel):
@@ -21,6 +35,12 @@ class SupervisorResponseModel(BaseModel):
     score: int = Field(
         ...,
         description="Score for the user's love experience and how Aiko reacted to it",
-        gt=0,
-        lt=100,
+        ge=0,
+        le=100,
+    )
+    confidence: float = Field(
+        1.0,
+        description="Confidence in the score from 0 (a guess) to 1 (certain)",
+        ge=0,
+        le=1,
     )
@@ -1,4 +1,4 @@
-from core.schema.bot.fields import Command, ChatAction
+from core.schema.bot.fields import Command, ChatAction, FilterReason
 from core.schema.bot.model import FAQ
 
-__all__ = ["Command", "ChatAction", "FAQ"]
+__all__ = ["Command", "ChatAction", "FilterReason", "FAQ"]
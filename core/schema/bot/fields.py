@@ -7,6 +7,10 @@ class Command(CEnum):
     START = "start"
     CALL = "call"
     FAQ = "faq"
+    LEADERBOARD = "leaderboard"
+    USERS = "users"
+    SEARCH = "search"
+    STATS = "stats"
 
     @property
     def desc(self) -> str:
@@ -15,9 +19,28 @@ class Command(CEnum):
             return "Call Aiko"
         elif self == self.FAQ:
             return "Frequently Asked Questions"
+        elif self == self.LEADERBOARD:
+            return "Epoch leaderboard"
+        elif self == self.USERS:
+            return "Find users by username (admin)"
+        elif self == self.SEARCH:
+            return "Search conversation messages (admin)"
+        elif self == self.STATS:
+            return "Score distribution of the epoch (admin)"
 
 
 class ChatAction(CEnum):
     """Available chat actions."""
 
     TYPING = "typing"
+
+
+class FilterReason(CEnum):
+    """Reasons to reject a message by the local prefilter."""
+
+    TOO_SHORT = "too_short"
+    NO_LETTERS = "no_letters"
+    REPEATED_CHARS = "repeated_chars"
+    LOW_ENTROPY = "low_entropy"
+    UNSUPPORTED_SCRIPT = "unsupported_script"
+    JUNK = "junk"
@@ -1,6 +1,15 @@
-from core.schema.db.fields import UserStatus, DBInitStrategy
+from core.schema.db.fields import (
+    UserStatus,
+    DBInitStrategy,
+    QuotaStatus,
+    RateLimitBackend,
+    PartitionState,
+)
 
 __all__ = [
     "UserStatus",
     "DBInitStrategy",
+    "QuotaStatus",
+    "RateLimitBackend",
+    "PartitionState",
 ]
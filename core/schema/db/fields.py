@@ -14,3 +14,25 @@ class DBInitStrategy(CEnum):
 
     CREATE = "create"
     RECREATE = "recreate"
+
+
+class QuotaStatus(CEnum):
+    """User token quota statuses."""
+
+    OK = "ok"
+    SOFT = "soft"  # Over the soft quota, requests are throttled
+    HARD = "hard"  # Over the hard quota, requests are rejected
+
+
+class RateLimitBackend(CEnum):
+    """Storage backends of the request rate limiter."""
+
+    MEMORY = "memory"  # Per process, for a single bot process
+    POSTGRES = "postgres"  # Shared by all bot processes
+
+
+class PartitionState(CEnum):
+    """States of an epoch partition table."""
+
+    ATTACHED = "attached"
+    DETACHED = "detached"  # Standalone table left by closing the epoch without drop
@@ -6,7 +6,7 @@ from typing import Any, Callable
 
 import yaml
 from pydantic_settings import BaseSettings
-from core.schema.db import DBInitStrategy
+from core.schema.db import DBInitStrategy, RateLimitBackend
 from core.schema.ai import LLM
 
 
@@ -28,7 +28,10 @@ class Settings(BaseSettings):
     APP_TOKEN_BUY_URL: str = "https://coinmarketcap\\.com/"
     APP_EPOCH_WINNERS_COUNT: int = 5
     APP_EPOCH_LENGTH_DAYS: int = 7
+    APP_LEADERBOARD_SIZE: int = 10  # Number of top users shown in the leaderboard
+    APP_EPOCH_START: datetime = datetime(2025, 9, 1, tzinfo=UTC)  # Start of epoch 1
     APP_SUPPORT_EMAIL: str = "support@aiko\\.ai"
+    APP_ADMIN_IDS: list[int] = []  # Telegram IDs of the bot administrators
 
     # AGENT (LLM)
     AGENT_LLM: LLM = LLM.GPT_5_MINI
@@ -46,21 +49,143 @@ class Settings(BaseSettings):
     AGENT_CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5  # Trip after 5 failures
     AGENT_CIRCUIT_BREAKER_RECOVERY_TIMEOUT: int = 60  # Stay open for 60 seconds
 
+    # SUPERVISOR (LLM)
+    # Scoring cascade: the fast model scores every submission, borderline results
+    # (low confidence or near the leaderboard cutoff) are re-scored by the strong one
+    SUPERVISOR_LLM: LLM = LLM.GPT_5_NANO
+    SUPERVISOR_ESCALATION_LLM: LLM | None = LLM.GPT_5_MINI  # None to disable
+    SUPERVISOR_ESCALATION_MARGIN: int = 5  # Score points around the cutoff
+    SUPERVISOR_ESCALATION_MIN_CONFIDENCE: float = 0.6  # Escalate below this
+
+    # POST-RESPONSE PIPELINE
+    # Side effects (DB writes, scoring) that run after the reply is sent
+    PIPELINE_CONCURRENCY: int = 20  # Max number of side-effect tasks running at once
+    PIPELINE_MAX_PENDING: int = 1000  # Max unfinished side-effect tasks (backpressure)
+    PIPELINE_TASK_TIMEOUT: int = 300  # Timeout for a single side-effect task in seconds
+    PIPELINE_SHUTDOWN_TIMEOUT: int = 30  # Time to drain pending tasks on shutdown
+
+    # PREFILTER
+    # Cheap local checks that reject junk messages before any LLM call
+    PREFILTER_ENABLED: bool = True
+    PREFILTER_MIN_LETTERS: int = 3  # Min letters in a message
+    PREFILTER_MIN_LETTER_RATIO: float = 0.5  # Min share of letters in non-space chars
+    PREFILTER_MAX_REPEATED_RATIO: float = 0.5  # Max share of chars in 3+ char runs
+    PREFILTER_MIN_ENTROPY: float = 2.5  # Min char entropy in bits (text is ~4)
+    PREFILTER_ENTROPY_MIN_CHARS: int = 16  # Entropy is checked from n chars
+    PREFILTER_SCRIPTS: list[str] = []  # Allowed scripts, e.g. ["LATIN"]. Any if empty
+    PREFILTER_JUNK_THRESHOLD: float = 0.9  # Min junk probability to reject
+
+    # TOKENIZER
+    TOKENIZER_DEFAULT_ENCODING: str = "o200k_base"  # If a model has no encoding
+
     # AGENT MEMORY
+    # The agent gets the conversation summary and the recent messages after it
     AGENT_MEMORY_MAX_MESSAGES: int = 15
     AGENT_MEMORY_MAX_TOKENS: int = 4000
 
+    # Retrieval of the past turns relevant to the message (hashed n-gram vectors)
+    RETRIEVAL_ENABLED: bool = True
+    RETRIEVAL_TOP_K: int = 3  # Max past turns added to the instructions
+    RETRIEVAL_MIN_SCORE: float = 0.2  # Min cosine similarity of a past turn
+    RETRIEVAL_MAX_TURNS: int = 200  # Max indexed turns per conversation
+    RETRIEVAL_MAX_CHARS: int = 500  # Max characters of a past message sent
+    RETRIEVAL_CACHE_MAX_TURNS: int = (
+        20_000  # Max indexed turns in memory (~3-9 KB each)
+    )
+
+    # SUMMARIZER (LLM)
+    # Older turns are folded into the conversation summary in the background
+    SUMMARIZER_ENABLED: bool = True
+    SUMMARIZER_LLM: LLM = LLM.GPT_5_NANO
+    SUMMARIZER_TRIGGER_TOKENS: int = 3000  # Summarize when unsummarized tokens exceed
+    SUMMARIZER_KEEP_MESSAGES: int = 6  # Recent messages left out of the summary
+    SUMMARIZER_MAX_MESSAGES: int = 200  # Max messages folded at once
+    SUMMARIZER_MAX_WORDS: int = 200  # Max words of the summary
+
     # DATES
     NOW_DT_UTC: Callable[[], datetime] = lambda: datetime.now(UTC)
 
     # DATABASE
     SQL_ECHO: bool = False if ENV == "prod" else True
-    DATABASE_POOL_SIZE: int = 40
-    DATABASE_MAX_OVERFLOW: int = 60
+    # One connection per update (unit of work) instead of one per manager call
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 10
     DATABASE_POOL_TIMEOUT: int = 30
     DATABASE_CONNECT_ARGS: dict = {"connect_timeout": 10, "options": "-c timezone=UTC"}
     DATABASE_INIT_STRATEGY: DBInitStrategy = DBInitStrategy.RECREATE
 
+    # Epoch partitions of messages and scores
+    DATABASE_PARTITIONS_AHEAD: int = 4  # Number of future epochs with partitions
+    DATABASE_PARTITION_CHECK_INTERVAL: int = 3600  # Seconds between partition checks
+
+    # Cold archive of closed epochs (compressed JSONL chunks)
+    DATABASE_ARCHIVE_DIR: Path = Path(PROJECT_DIR, "archive")
+    DATABASE_ARCHIVE_CHUNK_ROWS: int = 100_000  # Max rows in one archive file
+    DATABASE_ARCHIVE_BATCH_SIZE: int = 5000  # Rows fetched/restored at once
+    DATABASE_EXPORT_DIR: Path = Path(PROJECT_DIR, "export")
+    DATABASE_EXPORT_PAGE_SIZE: int = 50_000  # Rows per page (Parquet row group)
+
+    # In-process cache of user rows. It is per process, so changes made by other
+    # processes become visible after the TTL expires.
+    USER_CACHE_MAX_SIZE: int = 100_000
+    USER_CACHE_TTL: int = 300  # Seconds
+    USER_SEARCH_LIMIT: int = 10  # Users per page of admin username search
+    USER_SEARCH_CACHE_MAX_SIZE: int = 1000
+    USER_SEARCH_CACHE_TTL: int = 60  # Seconds
+    MESSAGE_SEARCH_LIMIT: int = 10  # Messages per page of admin message search
+    MESSAGE_SEARCH_PREVIEW_LENGTH: int = 200  # Max message characters shown
+
+    # Write-behind buffer to group-commit conversation messages
+    DATABASE_MESSAGE_BUFFER_ENABLED: bool = True
+    DATABASE_MESSAGE_BUFFER_BATCH_SIZE: int = 500  # Flush when n rows are buffered
+    DATABASE_MESSAGE_BUFFER_FLUSH_INTERVAL_MS: int = 200  # Flush at least every n ms
+    DATABASE_MESSAGE_BUFFER_MAX_SIZE: int = 10000  # Producers wait when buffer is full
+
+    # Near-duplicate submission detection (SimHash)
+    DEDUP_ENABLED: bool = True
+    DEDUP_MIN_WORDS: int = 12  # Shorter messages are not checked
+    DEDUP_MAX_DISTANCE: int = 5  # Max differing bits of near-duplicates (< 6)
+
+    # LLM token usage per user and epoch, persisted as deltas
+    USAGE_FLUSH_INTERVAL: int = 10  # Seconds between flushes
+    USAGE_CACHE_MAX_SIZE: int = 100_000
+    USAGE_CACHE_TTL: int = 60  # Seconds before totals are reloaded from Postgres
+    USAGE_SOFT_QUOTA_TOKENS: int = 200_000  # Throttled above it per epoch, 0 to disable
+    USAGE_HARD_QUOTA_TOKENS: int = (
+        1_000_000  # Rejected above it per epoch, 0 to disable
+    )
+    USAGE_SOFT_QUOTA_COOLDOWN: int = 60  # Seconds between requests above soft quota
+
+    # Per-user request rate limit (token bucket). The Postgres backend shares the
+    # buckets between several bot processes
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: RateLimitBackend = RateLimitBackend.MEMORY
+    RATE_LIMIT_CAPACITY: int = 5  # Burst of requests
+    RATE_LIMIT_REFILL_RATE: float = 0.2  # Requests per second in the long run
+    RATE_LIMIT_CACHE_MAX_SIZE: int = 100_000  # Buckets of the memory backend
+    RATE_LIMIT_NOTIFY_INTERVAL: int = 10  # Seconds between "slow down" replies
+
+    # Score distribution per epoch, persisted as deltas
+    SCORE_STATS_FLUSH_INTERVAL: int = 60  # Seconds between flushes
+
+    # METRICS
+    # HTTP endpoint with the metrics (/metrics) and health probes (/healthz, /readyz)
+    METRICS_ENABLED: bool = True
+    METRICS_HOST: str = "127.0.0.1"  # No auth, expose only to trusted networks
+    METRICS_PORT: int = 9090
+    METRICS_READINESS_TIMEOUT: float = 2.0  # Seconds for each readiness check
+
+    # PROFILER
+    # Opt-in per-stage timings of every update and stack samples of slow ones
+    PROFILER_ENABLED: bool = False
+    PROFILER_SLOW_THRESHOLD: float = (
+        5.0  # Seconds. Slower updates are sampled and saved
+    )
+    PROFILER_SAMPLE_INTERVAL: float = 0.05  # Seconds between stack samples
+    PROFILER_MAX_STACK_DEPTH: int = 40  # Max frames of a stack sample
+    PROFILER_DIR: Path = Path(PROJECT_DIR, "profiles")
+    PROFILER_MAX_FILES: int = 200  # Oldest slow update profiles are removed
+
     # LOGGING
     LOG_LEVEL: int = logging.INFO if ENV == "prod" else logging.DEBUG
 
@@ -68,6 +193,7 @@ class Settings(BaseSettings):
     OTEL_ENABLED: bool = True
     OTEL_CONSOLE_OUTPUT: bool = True
     OTEL_OTLP_ENDPOINT: str | None = None
+    OTEL_SAMPLE_RATE: float = 1.0  # Share of traced updates, from 0 to 1
 
     # Config for ENV_VAR_* variables from .env file
     model_config: dict[str, Any] = {
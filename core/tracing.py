@@ -0,0 +1,110 @@
+import time
+from collections.abc import Callable
+from functools import wraps
+from typing import Any
+
+import logfire
+from core.logger import get_logger
+from core.profiler import CURRENT_PROFILE, PROFILER
+from core.settings import settings
+
+logger = get_logger(__name__)
+
+_CONFIGURED = False
+
+
+def setup_tracing() -> None:
+    """
+    Configure OpenTelemetry tracing (via logfire) from the OTEL_* settings.
+
+    Spans are sent to Logfire if LOGFIRE_TOKEN is set, to the OTLP endpoint if it
+    is set and printed to the console if enabled. Head sampling keeps or drops a
+    whole trace (one Telegram update with all its child spans).
+    """
+    global _CONFIGURED
+    if _CONFIGURED:
+        return
+
+    processors = []
+    if settings.OTEL_ENABLED and settings.OTEL_OTLP_ENDPOINT:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        processors.append(
+            BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.OTEL_OTLP_ENDPOINT))
+        )
+
+    logfire.configure(
+        service_name=settings.APP_TITLE,
+        service_version=settings.APP_VERSION,
+        environment=settings.ENV,
+        token=settings.model_extra.get("LOGFIRE_TOKEN"),
+        send_to_logfire="if-token-present" if settings.OTEL_ENABLED else False,
+        console=None
+        if settings.OTEL_ENABLED and settings.OTEL_CONSOLE_OUTPUT
+        else False,
+        additional_span_processors=processors,
+        sampling=logfire.SamplingOptions(
+            head=settings.OTEL_SAMPLE_RATE if settings.OTEL_ENABLED else 0.0
+        ),
+    )
+    if settings.OTEL_ENABLED:
+        logfire.instrument_pydantic_ai()
+
+    _CONFIGURED = True
+    logger.info(
+        "Tracing configured. Enabled: %s. Sample rate: %s",
+        settings.OTEL_ENABLED,
+        settings.OTEL_SAMPLE_RATE,
+    )
+
+
+class ProfiledSpan:
+    """Span that also adds its duration to the profile of the current update."""
+
+    __slots__ = ("span", "name", "started")
+
+    def __init__(self, span: logfire.LogfireSpan, name: str):
+        self.span = span
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self) -> logfire.LogfireSpan:
+        self.started = time.perf_counter()
+        return self.span.__enter__()
+
+    def __exit__(self, *exc_info) -> None:
+        self.span.__exit__(*exc_info)
+        PROFILER.record_stage(self.name, time.perf_counter() - self.started)
+
+
+def span(name: str, **attributes: Any) -> logfire.LogfireSpan | ProfiledSpan:
+    """
+    Start a span as a child of the current one.
+
+    Parameters
+        name: Span name (also the message template, e.g. "agent run {user_id}").
+        attributes: Span attributes.
+    """
+    logfire_span = logfire.span(name, _span_name=name, **attributes)
+    if CURRENT_PROFILE.get() is not None:
+        return ProfiledSpan(logfire_span, name)
+    return logfire_span
+
+
+def traced(name: str | None = None) -> Callable[[Callable], Callable]:
+    """Run the async function in a span named after it (e.g. DB manager calls)."""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(span_name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,45 @@
+from core.ai.dedup import DedupIndex, to_signed, to_unsigned
+
+STORY = (
+    "When I was seven my grandmother taught me to bake bread every Sunday morning "
+    "and the smell of warm crust still reminds me of her soft voice and gentle hands"
+)
+
+
+def test_dedup_finds_near_duplicates():
+    index = DedupIndex(min_words=12)
+    fingerprint = index.fingerprint(STORY)
+    index.add(1, fingerprint, user_id=1)
+
+    edited = index.fingerprint(STORY.replace("seven", "eight").upper() + "!!!")
+    assert index.find(1, edited).user_id == 1
+    assert index.find(2, edited) is None
+
+    other = index.fingerprint(
+        "Yesterday I missed the last train home so I walked across the sleeping city "
+        "counting bridges and talking to a stray cat about my strange new job"
+    )
+    assert index.find(1, other) is None
+    assert index.fingerprint("hi Aiko") is None
+
+
+def test_fingerprint_fits_bigint():
+    fingerprint = (1 << 64) - 1
+    assert to_signed(fingerprint) == -1
+    assert to_unsigned(to_signed(fingerprint)) == fingerprint
+
+
+def test_dedup_removes_unscored_submissions():
+    index = DedupIndex(min_words=12)
+    fingerprint = index.fingerprint(STORY)
+    index.add(1, fingerprint, user_id=1)
+    index.add(1, fingerprint, user_id=2)
+
+    index.remove(1, fingerprint, user_id=1)
+    assert index.find(1, fingerprint).user_id == 2
+    assert index.get(1).size == 1
+
+    index.remove(1, fingerprint, user_id=2)
+    assert index.find(1, fingerprint) is None
+    assert index.get(1).size == 0
+    assert not any(index.get(1).buckets)
@@ -0,0 +1,56 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+from core.ai.memory import Summarizer, to_model_messages
+from core.db.manager import ConversationManager
+from core.db.schema import ConversationMessage
+from core.schema.ai import MessageRole
+from pydantic_ai.messages import ModelRequest, ModelResponse
+from pydantic_ai.models.test import TestModel
+
+
+def make_messages(count: int, tokens: int) -> list[ConversationMessage]:
+    start = datetime(2025, 9, 1, tzinfo=UTC)
+    return [
+        ConversationMessage(
+            id=uuid4(),
+            role=MessageRole.USER if i % 2 == 0 else MessageRole.AGENT,
+            message=f"message {i}",
+            tokens=tokens,
+            created_at=start + timedelta(seconds=i),
+        )
+        for i in range(count)
+    ]
+
+
+def test_to_model_messages():
+    history = to_model_messages(make_messages(3, tokens=1))
+    assert [type(message) for message in history] == [
+        ModelRequest,
+        ModelResponse,
+        ModelRequest,
+    ]
+
+
+def test_summarizer_folds_old_messages(monkeypatch):
+    messages = make_messages(10, tokens=100)
+    updates = []
+
+    async def get_history(conversation_id, max_messages, max_tokens):
+        return None, messages
+
+    async def update_summary(conversation_id, summary, until=None):
+        updates.append((summary, until))
+        return True
+
+    monkeypatch.setattr(ConversationManager, "get_history", get_history)
+    monkeypatch.setattr(ConversationManager, "update_summary", update_summary)
+
+    summarizer = Summarizer(trigger_tokens=2000, keep_messages=4)
+    assert not asyncio.run(summarizer.summarize(1, uuid4(), 1))
+
+    summarizer.trigger_tokens = 500
+    with summarizer.agent.override(model=TestModel(custom_output_text="summary")):
+        assert asyncio.run(summarizer.summarize(1, uuid4(), 1))
+    assert updates == [("summary", messages[5].created_at)]
@@ -0,0 +1,52 @@
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+from core.ai.retrieval import ConversationIndex, RetrievalIndex, embed, similarity
+
+
+def test_embed_similarity():
+    a = embed("I loved baking bread with my grandmother")
+    b = embed("My grandmother and I were baking bread together")
+    c = embed("The train was late and it rained all day")
+
+    assert abs(similarity(a, a) - 1) < 1e-9
+    assert similarity(a, b) > similarity(a, c)
+    assert embed("!!!") == {}
+
+
+def test_conversation_index_search():
+    start = datetime(2025, 9, 1, tzinfo=UTC)
+    index = ConversationIndex(max_turns=3)
+    turns = [
+        ("My first love was a girl from the summer camp", "What was she like?"),
+        ("I hate rainy mornings", "Rain can feel heavy."),
+        ("My grandmother baked bread every Sunday", "That sounds warm."),
+        ("I like trains", "Where do they take you?"),
+    ]
+    for i, (message, response) in enumerate(turns):
+        index.add(message, response, start + timedelta(minutes=i))
+
+    # The oldest turn is dropped
+    assert len(index.turns) == 3
+    assert not index.search("summer camp love", min_score=0.2)
+
+    [(turn, _)] = index.search("baking bread with grandma", k=1)
+    assert turn.message == turns[2][0]
+    assert not index.search("grandmother bread", before=start + timedelta(minutes=2))
+
+
+def test_retrieval_index_is_bounded_by_total_turns():
+    start = datetime(2025, 9, 1, tzinfo=UTC)
+    retrieval = RetrievalIndex(max_turns=5, max_turns_per_conversation=3)
+    conversations = [uuid4() for _ in range(3)]
+    for conversation_id in conversations:
+        retrieval._set(conversation_id, ConversationIndex(max_turns=3))
+        for i in range(3):
+            retrieval.add(conversation_id, f"message {i}", "response", start)
+
+    # The least recently used conversations are evicted until 5 turns are left
+    assert list(retrieval.conversations) == [conversations[2]]
+    assert retrieval.total_turns == 3
+
+    [turn] = retrieval.conversations[conversations[2]].turns[:1]
+    assert turn.indexes.typecode == "I" and turn.values.typecode == "f"
@@ -0,0 +1,40 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from core.bot import pipeline
+from core.bot.pipeline import PostResponsePipeline
+
+
+@asynccontextmanager
+async def no_unit_of_work(new: bool = False):
+    yield None
+
+
+def test_submit_waits_while_the_pipeline_is_full(monkeypatch):
+    monkeypatch.setattr(pipeline, "unit_of_work", no_unit_of_work)
+    pipe = PostResponsePipeline(concurrency=2, max_pending=2, timeout=5)
+
+    async def run():
+        release = asyncio.Event()
+        done = []
+
+        async def side_effect(n):
+            await release.wait()
+            done.append(n)
+
+        await pipe.submit(side_effect(1), name="first", key="a")
+        await pipe.submit(side_effect(2), name="second", key="a")
+
+        third = asyncio.create_task(pipe.submit(side_effect(3), name="third"))
+        await asyncio.sleep(0.01)
+        assert not third.done()
+        assert pipe.pending == 2
+        assert pipe.throttled == 1
+
+        release.set()
+        await third
+        await pipe.close()
+        assert sorted(done) == [1, 2, 3]
+        assert pipe.completed == 3
+
+    asyncio.run(run())
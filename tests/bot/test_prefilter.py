@@ -0,0 +1,19 @@
+from core.bot.prefilter import PREFILTER, Prefilter
+from core.schema.bot import FilterReason
+
+
+def test_prefilter_rejects_junk():
+    prefilter = Prefilter(PREFILTER.checks)
+
+    assert prefilter.check("ok") == FilterReason.TOO_SHORT
+    assert prefilter.check("😀😀😀😀") == FilterReason.NO_LETTERS
+    assert prefilter.check("aaaaaaaaaaa!!!!!!!") == FilterReason.REPEATED_CHARS
+    assert prefilter.check("hahahahahahahahahaha") == FilterReason.LOW_ENTROPY
+    assert prefilter.check("sdfg hjkl qwrt zxcv") == FilterReason.JUNK
+
+    assert prefilter.check("Nooooo way, that's sooo cool") is None
+    assert prefilter.check("Привет, Айко! Как дела?") is None
+    assert prefilter.check("My gf and I went to NYC 💖💖") is None
+
+    assert prefilter.checked == 8
+    assert sum(prefilter.rejected.values()) == 5
@@ -0,0 +1,23 @@
+import asyncio
+import time
+
+from core.bot.ratelimit import MemoryBackend, RateLimiter
+
+
+def test_rate_limiter_token_bucket():
+    limiter = RateLimiter(MemoryBackend(capacity=3, rate=1))
+
+    async def burst(tg_id: int) -> list[bool]:
+        return [await limiter.allow(tg_id) for _ in range(4)]
+
+    assert asyncio.run(burst(1)) == [True, True, True, False]
+    assert asyncio.run(burst(2))[0]
+
+    # Half a second refills half a token, a second refills a whole one
+    limiter.backend.buckets.set(1, (0.0, time.monotonic() - 0.5))
+    assert not asyncio.run(limiter.allow(1))
+    limiter.backend.buckets.set(1, (0.0, time.monotonic() - 1.1))
+    assert asyncio.run(limiter.allow(1))
+
+    assert limiter.should_notify(1)
+    assert not limiter.should_notify(1)
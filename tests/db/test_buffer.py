@@ -0,0 +1,32 @@
+import asyncio
+from uuid import uuid4
+
+from core.db.buffer import MessageBuffer
+
+
+def test_buffer_drops_only_poison_rows_on_last_attempt(monkeypatch):
+    buffer = MessageBuffer(batch_size=8, flush_interval_ms=60_000, max_size=100)
+    conversation_id = uuid4()
+    rows = [{"id": i, "conversation_id": conversation_id} for i in range(8)]
+    written = []
+
+    async def write(batch):
+        if any(row["id"] == 5 for row in batch):
+            return False
+        written.extend(row["id"] for row in batch)
+        return True
+
+    monkeypatch.setattr(buffer, "_write", write)
+    monkeypatch.setattr(buffer, "_ensure_started", lambda: None)
+
+    async def run():
+        await buffer.put(rows)
+        for _ in range(MessageBuffer._MAX_ATTEMPTS):
+            await buffer.flush()
+
+    asyncio.run(run())
+
+    assert written == [0, 1, 2, 3, 4, 6, 7]
+    assert not buffer.retry_batch
+    assert not buffer.pending
+    assert buffer.failed_attempts == 0
@@ -0,0 +1,34 @@
+from core.db.cache import UserCache, UserState
+from core.db.schema import User
+from core.schema.db import UserStatus
+
+
+def test_user_cache_keeps_compact_bounded_state():
+    cache = UserCache(maxsize=2, ttl=60)
+    state = cache.set(
+        User(id=1, tg_id=101, tg_username="aiko", status=UserStatus.ACTIVE)
+    )
+
+    assert isinstance(state, UserState)
+    assert not hasattr(state, "__dict__")
+    assert cache.get(101) == UserState(1, 101, "aiko", UserStatus.ACTIVE)
+
+    cache.set(UserState(2, 102, None, UserStatus.INACTIVE))
+    cache.set(UserState(3, 103, None, UserStatus.INACTIVE))
+    assert cache.get(101) is None
+    assert len(cache.users) == 2
+
+    cache.invalidate(3)
+    assert cache.get(103) is None
+
+
+def test_user_cache_update_status_marks_revoked_user():
+    cache = UserCache(maxsize=2, ttl=60)
+    cache.set(UserState(1, 101, "aiko", UserStatus.ACTIVE))
+
+    cache.update_status(1, UserStatus.INACTIVE)
+    assert cache.get(101).status == UserStatus.INACTIVE
+
+    # Unknown users are ignored
+    cache.update_status(2, UserStatus.INACTIVE)
+    assert cache.get(101) is not None
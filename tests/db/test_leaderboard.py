@@ -0,0 +1,30 @@
+from core.db.leaderboard import EpochLeaderboard
+
+
+def test_leaderboard_top_and_rank():
+    board = EpochLeaderboard(epoch_id=1, size=3)
+    board.update(1, 50, "alice")
+    board.update(2, 70, "bob")
+    board.update(3, 70, "carol")
+    board.update(4, 10, "dave")
+
+    assert [entry.user_id for entry in board.get_top()] == [2, 3, 1]
+    assert board.rank(2) == board.rank(3) == 1
+    assert board.rank(1) == 3
+    assert board.rank(4) == 4
+    assert board.rank(5) is None
+    assert board.participants == 4
+
+
+def test_leaderboard_keeps_best_score():
+    board = EpochLeaderboard(epoch_id=1, size=2)
+    board.update(1, 40)
+    board.update(2, 30)
+    board.update(3, 20)
+    board.update(3, 90, "carol")
+    board.update(3, 10)
+
+    assert [entry.user_id for entry in board.get_top()] == [3, 1]
+    assert board.get_top()[0].username == "carol"
+    assert board.best[3] == 90
+    assert board.rank(2) == 3
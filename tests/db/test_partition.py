@@ -0,0 +1,110 @@
+import re
+
+import pytest
+
+from core.db.partition import PARTITIONED_TABLES, PartitionManager
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def one(self):
+        return self.row
+
+    def scalar(self):
+        return self.row
+
+
+class FakeConnection:
+    """Tracks partition tables by name: True if attached, False if detached."""
+
+    def __init__(self, partitioned: bool = True):
+        self.partitioned = partitioned
+        self.tables: dict[str, bool] = {}
+        self.statements: list[str] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+    def connect(self):
+        return self
+
+    def execution_options(self, **options):
+        return self
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if sql.startswith("SELECT to_regclass"):
+            name = params["partition"]
+            return FakeResult((name in self.tables, self.tables.get(name, False)))
+        if "pg_partitioned_table" in sql:
+            return FakeResult(self.partitioned)
+
+        name = re.search(r"(?:PARTITION|EXISTS) (raw\.\w+)", sql).group(1)
+        if "CREATE TABLE IF NOT EXISTS" in sql:
+            self.tables.setdefault(name, True)
+        elif "ATTACH PARTITION" in sql:
+            self.tables[name] = True
+        elif "DETACH PARTITION" in sql:
+            self.tables[name] = False
+        elif sql.startswith("DROP TABLE"):
+            self.tables.pop(name, None)
+        return FakeResult(None)
+
+
+def test_restore_attaches_partitions_detached_without_drop():
+    partitions = PartitionManager()
+    conn = FakeConnection()
+    partitions.create_partitions(conn, [1])
+    assert len(conn.tables) == len(PARTITIONED_TABLES)
+
+    partitions.close_epoch(conn, 1, drop=False)
+    assert not any(conn.tables.values())
+
+    conn.statements.clear()
+    partitions.attach_partitions(conn, [1])
+    assert all(conn.tables.values())
+    assert sum("ATTACH PARTITION" in sql for sql in conn.statements) == len(
+        PARTITIONED_TABLES
+    )
+
+
+def test_restore_recreates_dropped_partitions():
+    partitions = PartitionManager()
+    conn = FakeConnection()
+    partitions.create_partitions(conn, [1])
+    partitions.close_epoch(conn, 1, drop=True)
+    assert not conn.tables
+
+    conn.statements.clear()
+    partitions.attach_partitions(conn, [1])
+    assert len(conn.tables) == len(PARTITIONED_TABLES)
+    assert all(conn.tables.values())
+    assert not any("ATTACH PARTITION" in sql for sql in conn.statements)
+
+
+def test_detach_drops_only_the_given_tables():
+    partitions = PartitionManager()
+    conn = FakeConnection()
+    partitions.create_partitions(conn, [1])
+
+    messages = PARTITIONED_TABLES[0]
+    partitions.detach_partitions(conn, 1, drop=True, tables=(messages,))
+    assert sorted(conn.tables) == sorted(
+        f"{table.schema}.{partitions.partition_name(table, 1)}"
+        for table in PARTITIONED_TABLES[1:]
+    )
+    assert all(conn.tables.values())
+
+
+def test_plain_tables_fail_with_a_migration_hint():
+    partitions = PartitionManager()
+    partitions.check_partitioned(FakeConnection())
+
+    with pytest.raises(RuntimeError, match="not partitioned by epoch_id"):
+        partitions.check_partitioned(FakeConnection(partitioned=False))
@@ -0,0 +1,17 @@
+from core.db.stats import ScoreHistogram
+
+
+def test_score_histogram_quantiles():
+    histogram = ScoreHistogram()
+    assert histogram.quantile(0.5) is None
+
+    for score in range(1, 101):
+        histogram.add(score)
+    histogram.add(150)
+
+    assert histogram.total == 101
+    assert histogram.quantile(0.5) == 51
+    assert histogram.quantile(0.9) == 91
+    assert histogram.quantile(0.99) == 100
+    assert histogram.percentile(1) == 0
+    assert histogram.count_above(99) == 2
@@ -0,0 +1,35 @@
+import asyncio
+
+from core.db.usage import Usage, UsageMeter
+
+
+def test_usage_loads_are_shared_and_not_serialized_by_flushes(monkeypatch):
+    meter = UsageMeter(maxsize=10, ttl=60, flush_interval=60)
+    reads = []
+
+    async def read(user_id, epoch_id):
+        reads.append(user_id)
+        await asyncio.sleep(0.01)
+        return Usage(1, 10, 10)
+
+    monkeypatch.setattr(meter, "_read", read)
+
+    async def run():
+        # Concurrent checks of one user share one query, other users do not wait
+        totals = await asyncio.gather(
+            meter.get_usage(1, 1), meter.get_usage(1, 1), meter.get_usage(2, 1)
+        )
+        assert sorted(reads) == [1, 2]
+        assert all(total.tokens == 20 for total in totals)
+
+        # A flush started during the read makes the load read again
+        async def flush_during_read():
+            await asyncio.sleep(0.005)
+            meter.flushes += 1
+
+        meter.add(3, 1, 5, 5)
+        await asyncio.gather(meter.get_usage(3, 1), flush_during_read())
+        assert reads.count(3) == 2
+        assert meter.totals.get((3, 1)).tokens == 30
+
+    asyncio.run(run())
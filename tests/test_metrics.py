@@ -0,0 +1,91 @@
+import asyncio
+
+from core.metrics import MetricsRegistry, MetricsServer
+
+
+def test_render_counters_gauges_and_escaped_labels():
+    registry = MetricsRegistry(prefix="test_")
+    counter = registry.counter("requests_total", "Requests.", ("path",))
+    counter.inc(path="/a")
+    counter.inc(2, path="/a")
+    counter.inc(path='say "hi"\\\n')
+    registry.gauge("queue_size", "Queue size.", callback=lambda: 1.5)
+
+    assert registry.render() == (
+        "# HELP test_requests_total Requests.\n"
+        "# TYPE test_requests_total counter\n"
+        'test_requests_total{path="/a"} 3\n'
+        'test_requests_total{path="say \\"hi\\"\\\\\\n"} 1\n'
+        "# HELP test_queue_size Queue size.\n"
+        "# TYPE test_queue_size gauge\n"
+        "test_queue_size 1.5\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry(prefix="test_")
+    histogram = registry.histogram("latency", "Latency.", ("op",), buckets=(1, 0.1))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value, op="read")
+
+    assert registry.render().splitlines()[2:] == [
+        'test_latency_bucket{op="read",le="0.1"} 2',
+        'test_latency_bucket{op="read",le="1"} 3',
+        'test_latency_bucket{op="read",le="+Inf"} 4',
+        'test_latency_sum{op="read"} 5.65',
+        'test_latency_count{op="read"} 4',
+    ]
+
+
+def test_readyz_reports_starting_and_failed_checks():
+    async def request(server: MetricsServer, path: str) -> str:
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: test\r\n\r\n".encode())
+        await writer.drain()
+        response = (await reader.read()).decode()
+        writer.close()
+        return response
+
+    async def run():
+        database_ok = True
+
+        async def database():
+            return database_ok
+
+        server = MetricsServer(MetricsRegistry(), host="127.0.0.1", port=0)
+        server.add_check("database", database)
+        await server.start()
+        server.port = server.server.sockets[0].getsockname()[1]
+        try:
+            response = await request(server, "/readyz")
+            assert response.startswith("HTTP/1.1 503 ")
+            assert response.endswith("starting\n")
+
+            server.ready = True
+            response = await request(server, "/readyz")
+            assert response.startswith("HTTP/1.1 200 ")
+            assert response.endswith("ok\n")
+
+            database_ok = False
+            response = await request(server, "/readyz")
+            assert response.startswith("HTTP/1.1 503 ")
+            assert response.endswith("failed: database\n")
+        finally:
+            await server.close()
+
+    asyncio.run(run())
+
+
+def test_busy_port_does_not_fail_start():
+    async def run():
+        first = MetricsServer(MetricsRegistry(), host="127.0.0.1", port=0)
+        await first.start()
+        port = first.server.sockets[0].getsockname()[1]
+        second = MetricsServer(MetricsRegistry(), host="127.0.0.1", port=port)
+        try:
+            await second.start()
+            assert second.server is None
+        finally:
+            await first.close()
+
+    asyncio.run(run())
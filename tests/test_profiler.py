@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from core.profiler import UpdateProfile, UpdateProfiler, await_chain
+
+
+async def wait_in_query():
+    await asyncio.sleep(0.06)
+
+
+def test_slow_update_writes_one_profile(tmp_path):
+    profiler = UpdateProfiler(
+        enabled=True,
+        threshold=0.02,
+        interval=0.005,
+        max_depth=10,
+        directory=tmp_path,
+        max_files=10,
+    )
+
+    async def run():
+        with profiler.profile("fast", 1):
+            profiler.record_stage("db", 0.001)
+        with profiler.profile("slow", 2):
+            profiler.record_stage("db", 0.01)
+            await wait_in_query()
+        await asyncio.gather(*profiler.tasks)
+
+    asyncio.run(run())
+
+    files = list(tmp_path.glob("slow-*.json"))
+    assert len(files) == 1
+    data = json.loads(files[0].read_text(encoding="utf-8"))
+    assert data["handler"] == "slow"
+    assert data["update_id"] == 2
+    assert data["duration"] >= 0.06
+    assert data["stages"] == {"db": {"seconds": 0.01, "calls": 1}}
+    # Sampled only after the threshold, inside the awaited coroutine
+    assert data["samples"]
+    assert all(
+        any(frame.endswith(":wait_in_query") for frame in sample["stack"])
+        for sample in data["samples"]
+    )
+
+
+def test_save_keeps_newest_profiles(tmp_path):
+    profiler = UpdateProfiler(directory=tmp_path, max_files=3)
+    paths = [profiler.save(UpdateProfile("slow", update_id)) for update_id in range(5)]
+
+    assert sorted(tmp_path.glob("slow-*.json")) == paths[2:]
+
+
+def test_await_chain_follows_awaited_coroutines():
+    async def inner(event):
+        await event.wait()
+
+    async def outer(event):
+        await inner(event)
+
+    async def run():
+        event = asyncio.Event()
+        task = asyncio.create_task(outer(event))
+        await asyncio.sleep(0)
+        frames = await_chain(task, max_depth=10)
+        event.set()
+        await task
+        return frames
+
+    frames = asyncio.run(run())
+    assert [frame.rsplit(":", 1)[1] for frame in frames[:3]] == [
+        "outer",
+        "inner",
+        "wait",
+    ]
+    assert len(frames) <= 10